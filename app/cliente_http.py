@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""
+cliente_http.py
+
+Motor de descarga alternativo a Selenium: reproduce directamente los postbacks
+del ReportViewer de ASP.NET y la petición de exportación a CSV.
+
+Por cada mes:
+- Reutiliza el último formulario recibido (o hace un GET inicial a la página).
+- Rellena los parámetros del reporte (fechas, checkboxes de categorías, clases,
+  países, año y mes) sobre los campos ocultos (__VIEWSTATE, __EVENTVALIDATION...).
+- Envía el postback de 'Ver informe' y extrae el ExportUrlBase del reporte.
+- Descarga el CSV y lo escribe directamente en su carpeta de /data.
+
+Cada hilo del pool usa su propia sesión HTTP con conexiones persistentes, de modo
+que la cookie de sesión de ASP.NET no se comparte entre descargas simultáneas.
+
+Los pasos de cada mes se registran como tramos "descarga.paso" con los mismos
+nombres que el backend de Selenium (navegar, seleccionar, renderizar, exportar,
+renombrar; ver pronosticos/telemetria.py).
+
+Para pruebas sin conexión, ver servidor_simulado.py y la variable CRT_BASE_URL.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import re
+import json
+import calendar
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pronosticos.telemetria import Cronometro
+
+# URL base del sitio de estadísticas del CRT (se sobreescribe para el servidor simulado)
+CRT_BASE_URL = os.getenv("CRT_BASE_URL", "https://old.crt.org.mx/EstadisticasCRTweb")
+
+# Página .aspx de cada reporte
+PAGINAS_ASPX = {
+    "ExportacionesPais": "ExportacionesPorPais.aspx",
+    "ProduccionTotalTequila": "ProduccionTotalTequila.aspx",
+    "ConsumodeAgaveTotal": "ConsumodeAgaveTotal.aspx",
+    "ExportacionesTotalCategoria": "ExportacionesTotalCategoria.aspx",
+    "ExportacionesTotalForma": "ExportacionesTotalForma.aspx",
+}
+
+# Controles del ReportViewer (mismos IDs que usa la versión con Selenium)
+BOTON_VER_INFORME = "ReportViewer1$ctl04$ctl00"
+FECHA_INICIAL = "ReportViewer1$ctl04$ctl03$txtValue"
+FECHA_FINAL = "ReportViewer1$ctl04$ctl05$txtValue"
+DROPDOWNS_PAIS = ["ReportViewer1$ctl04$ctl07", "ReportViewer1$ctl04$ctl09", "ReportViewer1$ctl04$ctl11"]
+DROPDOWN_ANIO = "ReportViewer1$ctl04$ctl03"
+DROPDOWN_MES = "ReportViewer1$ctl04$ctl05"
+
+FORMATO_EXPORTACION = "CSV"
+SIN_DATOS = "No se encontro"
+
+
+class Formulario(HTMLParser):
+    """
+    Extrae del HTML los campos del formulario de ASP.NET y el texto de cada <label>.
+
+    - campos: lista de diccionarios {name, id, type, value, checked}
+    - etiquetas: {id del input: texto de su label}
+    """
+
+    def __init__(self, html):
+        super().__init__(convert_charrefs=True)
+        self.campos = []
+        self.etiquetas = {}
+        self._label_for = None
+        self._label_texto = []
+        self.feed(html)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "input" and attrs.get("name"):
+            self.campos.append({
+                "name": attrs["name"],
+                "id": attrs.get("id", ""),
+                "type": (attrs.get("type") or "text").lower(),
+                "value": attrs.get("value", ""),
+                "checked": "checked" in attrs,
+            })
+        elif tag == "label":
+            self._label_for = attrs.get("for")
+            self._label_texto = []
+
+    def handle_data(self, data):
+        if self._label_for is not None:
+            self._label_texto.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "label" and self._label_for is not None:
+            self.etiquetas[self._label_for] = "".join(self._label_texto).strip()
+            self._label_for = None
+
+    def checkboxes(self, dropdown):
+        """
+        Devuelve los checkboxes que pertenecen al divDropDown de un parámetro.
+        """
+        prefijo = f"{dropdown}$divDropDown$"
+        return [c for c in self.campos if c["type"] == "checkbox" and c["name"].startswith(prefijo)]
+
+    def marcar(self, dropdown, etiquetas=None):
+        """
+        Marca los checkboxes de un parámetro: todos, o sólo los de `etiquetas`.
+        """
+        for cb in self.checkboxes(dropdown):
+            texto = self.etiquetas.get(cb["id"], "")
+            cb["checked"] = etiquetas is None or texto in etiquetas
+
+    def asignar(self, nombre, valor):
+        """
+        Asigna el valor de un campo de texto u oculto.
+        """
+        for campo in self.campos:
+            if campo["name"] == nombre:
+                campo["value"] = valor
+                return
+        self.campos.append({"name": nombre, "id": "", "type": "text", "value": valor, "checked": False})
+
+    def datos_post(self, event_target="", boton=None):
+        """
+        Construye el cuerpo del postback tal como lo enviaría el navegador.
+        """
+        datos = {"__EVENTTARGET": event_target, "__EVENTARGUMENT": ""}
+        for campo in self.campos:
+            if campo["name"] in datos:
+                continue
+            if campo["type"] == "checkbox":
+                if campo["checked"]:
+                    datos[campo["name"]] = campo["value"] or "on"
+            elif campo["type"] in ("submit", "button", "image"):
+                continue
+            else:
+                datos[campo["name"]] = campo["value"]
+        if boton:
+            datos[boton] = "Ver informe"
+        return datos
+
+
+def extraer_export_url(html):
+    """
+    Obtiene el ExportUrlBase que el ReportViewer publica en su script de inicialización.
+
+    :param html: HTML del reporte renderizado
+    :return: URL relativa de exportación (terminada en 'Format=') o None
+    """
+    m = re.search(r'"ExportUrlBase"\s*:\s*"([^"]+)"', html)
+    if not m:
+        return None
+    return json.loads(f'"{m.group(1)}"')
+
+
+class SesionReportViewer:
+    """
+    Trabajador HTTP del pool: sesión persistente contra el ReportViewer del CRT.
+
+    Expone la misma interfaz que un Navegador del pool (indice, estado, cerrar)
+    para poder usarse como backend intercambiable.
+    """
+
+    def __init__(self, indice, base_url=None, timeout=60):
+        self.indice = indice
+        self.base_url = (base_url or CRT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.estado = {}
+
+        self.sesion = requests.Session()
+        reintentos = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=reintentos)
+        self.sesion.mount("http://", adapter)
+        self.sesion.mount("https://", adapter)
+
+    def cerrar(self):
+        """
+        Cierra las conexiones de la sesión.
+        """
+        self.sesion.close()
+
+    def _url_pagina(self, reporte):
+        return f"{self.base_url}/Informes/{PAGINAS_ASPX[reporte]}"
+
+    def _formulario(self, reporte):
+        """
+        Devuelve el último formulario de la página; sólo hace GET la primera vez.
+        """
+        formularios = self.estado.setdefault("formularios", {})
+        if reporte not in formularios:
+            resp = self.sesion.get(self._url_pagina(reporte), timeout=self.timeout)
+            resp.raise_for_status()
+            formularios[reporte] = Formulario(resp.text)
+        return formularios[reporte]
+
+    def _postback(self, reporte, formulario, event_target="", boton=None):
+        """
+        Envía el postback y guarda el nuevo formulario (con su __VIEWSTATE) para la siguiente tarea.
+        """
+        resp = self.sesion.post(self._url_pagina(reporte),
+                                data=formulario.datos_post(event_target, boton),
+                                timeout=self.timeout)
+        resp.raise_for_status()
+        self.estado["formularios"][reporte] = Formulario(resp.text)
+        return resp.text
+
+    def _exportar(self, html, ruta_destino, pasos):
+        """
+        Descarga el CSV del reporte renderizado y lo escribe en `ruta_destino`.
+
+        :param pasos: Cronometro del mes (marca "exportar" y "renombrar")
+        """
+        export_url = extraer_export_url(html)
+        if not export_url:
+            print("  No se encontró el ExportUrlBase en el reporte.")
+            return False
+
+        resp = self.sesion.get(requests.compat.urljoin(self.base_url + "/", export_url) + FORMATO_EXPORTACION,
+                               timeout=self.timeout)
+        resp.raise_for_status()
+        pasos.marca("exportar")
+
+        # Escritura atómica: nunca queda un CSV a medias con el nombre final
+        temporal = ruta_destino + ".part"
+        with open(temporal, "wb") as f:
+            f.write(resp.content)
+        os.replace(temporal, ruta_destino)
+        pasos.marca("renombrar")
+        return True
+
+    def descargar_exportaciones_pais(self, anio, mes, ruta_destino):
+        """
+        Descarga el reporte de exportaciones por país de un mes.
+
+        :param anio: Año (int)
+        :param mes: Mes (int)
+        :param ruta_destino: Ruta final del CSV
+        :return: True si el archivo quedó guardado
+        """
+        reporte = "ExportacionesPais"
+        mes_str = f"{mes:02d}"
+        pasos = Cronometro("descarga.paso", {"reporte": reporte, "backend": "http"}, mes=f"{anio}-{mes_str}")
+        formulario = self._formulario(reporte)
+        pasos.marca("navegar")
+
+        ultimo_dia = calendar.monthrange(anio, mes)[1]
+        formulario.asignar(FECHA_INICIAL, f"01/{mes_str}/{anio}")
+        formulario.asignar(FECHA_FINAL, f"{ultimo_dia:02d}/{mes_str}/{anio}")
+        for dropdown in DROPDOWNS_PAIS:
+            formulario.marcar(dropdown)
+        pasos.marca("seleccionar")
+
+        html = self._postback(reporte, formulario, boton=BOTON_VER_INFORME)
+        pasos.marca("renderizar")
+        if SIN_DATOS in html:
+            print(f"  {anio}-{mes_str} no contiene datos.")
+            return False
+        return self._exportar(html, ruta_destino, pasos)
+
+    def descargar_categoria(self, reporte, anio, mes, mes_nombre, ruta_destino):
+        """
+        Descarga el reporte de una página de categorías para un año y mes.
+
+        :param reporte: Clave del reporte (p. ej. 'ProduccionTotalTequila')
+        :param anio: Año (int)
+        :param mes: Mes (int); sólo para la telemetría, igual que en los demás backends
+        :param mes_nombre: Nombre del mes tal como aparece en el visor ('Enero', ...)
+        :param ruta_destino: Ruta final del CSV
+        :return: True si el archivo quedó guardado
+        """
+        pasos = Cronometro("descarga.paso", {"reporte": reporte, "backend": "http"}, mes=f"{anio}-{mes:02d}")
+        formulario = self._formulario(reporte)
+        pasos.marca("navegar")
+
+        # El año es un parámetro en cascada: al cambiarlo se recarga la lista de meses
+        if self.estado.get(("anio", reporte)) != anio:
+            formulario.marcar(DROPDOWN_ANIO, {str(anio)})
+            self._postback(reporte, formulario, event_target=DROPDOWN_ANIO)
+            formulario = self.estado["formularios"][reporte]
+            if not any(cb["checked"] for cb in formulario.checkboxes(DROPDOWN_ANIO)):
+                print(f"  No disponible el año {anio}, continuando...")
+                return False
+            self.estado[("anio", reporte)] = anio
+
+        formulario.marcar(DROPDOWN_MES, {mes_nombre})
+        pasos.marca("seleccionar")
+
+        html = self._postback(reporte, formulario, boton=BOTON_VER_INFORME)
+        pasos.marca("renderizar")
+        if SIN_DATOS in html:
+            print(f"  {anio}-{mes_nombre} no contiene datos.")
+            return False
+        return self._exportar(html, ruta_destino, pasos)
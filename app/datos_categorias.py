@@ -11,17 +11,26 @@ del Consejo Regulador del Tequila (CRT) para los siguientes módulos:
 - Exportaciones Totales por Forma
 
 Cada archivo se guarda en la carpeta /data/{nombre_categoria}/{año}-{nombre_categoria}.
+Sólo se descargan los meses faltantes, fallidos o vacíos según el manifiesto (ver manifiesto.py).
+
+Los meses se reparten entre un pool de navegadores headless (ver pool_navegadores.py).
+Con backend="http" se usa el cliente directo del ReportViewer (ver cliente_http.py).
+
+Los pasos de cada mes (navegar al año, seleccionar, renderizar, exportar, renombrar)
+se registran como tramos "descarga.paso" (ver pronosticos/telemetria.py).
+
+Selenium y el cliente HTTP se importan al descargar, no al importar el módulo: la
+API sólo planifica y no los carga.
 
 Autor: Francisco Enríquez
 """
 
 import os
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import shutil
+from app.pool_navegadores import N_NAVEGADORES, PoolNavegadores, generar_tareas
+from app.manifiesto import Manifiesto
+from pronosticos.telemetria import Cronometro
 
 # Ruta al ejecutable de ChromeDriver
 CHROME_DRIVER_PATH = "C:/Users/franc/Downloads/chromedriver-win64/chromedriver-win64/chromedriver.exe"
@@ -29,10 +38,17 @@ CHROME_DRIVER_PATH = "C:/Users/franc/Downloads/chromedriver-win64/chromedriver-w
 # Directorio base donde se almacenarán los archivos descargados
 BASE_DOWNLOAD_DIR = r"C:\Users\franc\Downloads\Modelo_Pronosticos\data"
 
+# Manifiesto de la ingesta incremental y primer mes disponible
+MANIFIESTO_PATH = os.path.join(BASE_DOWNLOAD_DIR, "manifiesto_descargas.sqlite")
+DESDE = "1995-01"
+
 # Formato de exportación en el visor del CRT
 FORMATO_EXPORTACION = "CSV (delimitado por comas)"
 EXTENSION = ".csv"
 
+# Motor de descarga por defecto: 'selenium' o 'http'
+BACKEND = os.getenv("CRT_BACKEND", "selenium")
+
 # Mapeo de nombres de meses
 meses = {
     "01": "Enero", "02": "Febrero", "03": "Marzo", "04": "Abril",
@@ -49,7 +65,8 @@ PAGINAS = {
 }
 
 
-def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=EXTENSION, timeout=1):
+def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=EXTENSION, timeout=1,
+                        destino_dir=None):
     """
     Espera a que se complete la descarga y renombra el archivo al formato deseado.
 
@@ -58,6 +75,7 @@ def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=
     :param download_dir: directorio de descarga.
     :param extension: extensión del archivo esperado.
     :param timeout: tiempo máximo de espera en segundos.
+    :param destino_dir: carpeta final del archivo (por defecto, el mismo download_dir).
     :return: True si la descarga fue exitosa y se renombró el archivo.
     """
     print("  Esperando descarga completa...")
@@ -78,12 +96,12 @@ def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=
         tiempo += 0.2
 
     if archivo_nuevo and os.path.exists(archivo_nuevo):
-        nuevo_path = os.path.join(download_dir, nombre_destino + extension)
+        nuevo_path = os.path.join(destino_dir or download_dir, nombre_destino + extension)
         try:
             if os.path.exists(nuevo_path):
                 print(f"  Eliminando archivo existente: {nuevo_path}")
                 os.remove(nuevo_path)
-            os.rename(archivo_nuevo, nuevo_path)
+            shutil.move(archivo_nuevo, nuevo_path)
             print(f"  Renombrado como: {nuevo_path}")
             return True
         except Exception as e:
@@ -98,6 +116,9 @@ def esperar_renderizado(wait):
     """
     Espera a que el informe esté completamente cargado en el visor.
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
     try:
         print(" Esperando que el informe se cargue completamente...")
         wait.until(EC.presence_of_element_located((By.ID, "VisibleReportContentReportViewer1_ctl09")))
@@ -107,117 +128,225 @@ def esperar_renderizado(wait):
         print(f" Error: el informe no terminó de cargar ({type(e).__name__})")
 
 
-def descargar_datos_categorias():
-    """
-    Función principal que itera sobre cada página, año y mes
-    para automatizar la descarga y renombrar los reportes.
-    """
-    for nombre_pagina, url in PAGINAS.items():
-        print(f"\n######## INICIANDO: {nombre_pagina} ########")
-
-        for anio in range(1995, 2025):
-            print(f"\n==============================")
-            print(f"Descargando archivos del año {anio} - {nombre_pagina}")
-            print(f"==============================")
-
-            folder_name = f"{anio}-{nombre_pagina}"
-            download_dir = os.path.join(BASE_DOWNLOAD_DIR, nombre_pagina, folder_name)
-            os.makedirs(download_dir, exist_ok=True)
-
-            prefs = {
-                "download.default_directory": download_dir,
-                "download.prompt_for_download": False,
-                "directory_upgrade": True,
-                "profile.default_content_setting_values.automatic_downloads": 1
-            }
-
-            options = webdriver.ChromeOptions()
-            options.add_experimental_option("prefs", prefs)
-            options.add_argument("--start-maximized")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-
-            service = Service(CHROME_DRIVER_PATH)
-            driver = webdriver.Chrome(service=service, options=options)
-            wait = WebDriverWait(driver, 120)
-
-            driver.get(url)
-
-            try:
-                wait.until(EC.presence_of_element_located((By.ID, "ReportViewer1_ctl04_ctl03_ddDropDownButton")))
-                driver.find_element(By.ID, "ReportViewer1_ctl04_ctl03_ddDropDownButton").click()
-                time.sleep(1)
-
-                year_option = wait.until(EC.element_to_be_clickable((By.XPATH, f"//label[normalize-space(text())='{anio}']")))
-                year_option.click()
-                time.sleep(0.5)
-            except Exception as e:
-                print(f"  No disponible el año {anio}, continuando...")
-                driver.quit()
-                continue
-
-            for mes_num, mes_nombre in meses.items():
-                print(f"\n Procesando {anio}-{mes_nombre}...")
-
-                try:
-                    driver.find_element(By.ID, "ReportViewer1_ctl04_ctl05_ddDropDownButton").click()
-                    time.sleep(1)
-
-                    # Desmarcar checkboxes activos
-                    for cb in driver.find_elements(By.XPATH, "//div[@id='ReportViewer1_ctl04_ctl05_divDropDown']//input[@type='checkbox']"):
-                        if cb.is_selected():
-                            cb.click()
-                            time.sleep(0.2)
-
-                    # Seleccionar mes
-                    label_mes = wait.until(EC.element_to_be_clickable((By.XPATH, f"//label[normalize-space(text())='{mes_nombre}']")))
-                    label_mes.click()
-                    time.sleep(0.5)
-
-                    # Clic en botón 'Ver Informe'
-                    driver.find_element(By.ID, "ReportViewer1_ctl04_ctl00").click()
-                    esperar_renderizado(wait)
-                    time.sleep(1.5)
-
-                    if "No se encontro" in driver.page_source:
-                        print(f" {anio}-{mes_nombre} no contiene datos.")
-                        continue
-
-                    archivos_antes = set(os.listdir(download_dir))
-
-                    try:
-                        print(" Abriendo menú de exportación...")
-                        driver.find_element(By.ID, "ReportViewer1_ctl05_ctl04_ctl00_ButtonLink").click()
-                        time.sleep(0.5)
-
-                        print(f" Buscando opción de exportación: {FORMATO_EXPORTACION}")
-                        export_link = wait.until(EC.element_to_be_clickable((By.XPATH, f"//a[normalize-space(text())='{FORMATO_EXPORTACION}']")))
-                        export_link.click()
-                    except Exception as e:
-                        print(f" No se encontró la opción de exportación para {anio}-{mes_nombre} ({type(e).__name__})")
-                        continue
-
-                    nombre_destino = f"{anio}-{mes_num}-{nombre_pagina}"
-                    if esperar_y_renombrar(nombre_destino, archivos_antes, download_dir):
-                        print(f"  Descarga completada para {anio}-{mes_num}")
-                    else:
-                        print(f"  Fallo en descarga de {anio}-{mes_num}")
-
-                except Exception as e:
-                    try:
-                        driver.switch_to.alert.accept()
-                        print(" Alerta aceptada")
-                    except:
-                        pass
-
-                    try:
-                        driver.switch_to.default_content()
-                    except:
-                        print(f" No se puede cambiar al contenido principal.")
-
-                    print(f"  Error durante {anio}-{mes_nombre}: {str(e)}")
-                    continue
-
-            driver.quit()
+def ruta_destino(tarea):
+    """
+    Ruta final del CSV de una tarea: /data/{pagina}/{año}-{pagina}/{año}-{mes}-{pagina}.csv
+    """
+    return os.path.join(BASE_DOWNLOAD_DIR, tarea.reporte, f"{tarea.anio}-{tarea.reporte}",
+                        f"{tarea.anio}-{tarea.mes:02d}-{tarea.reporte}{EXTENSION}")
+
+
+def seleccionar_anio(navegador, nombre_pagina, anio):
+    """
+    Carga la página del reporte y selecciona el año, salvo que el navegador ya lo tenga cargado.
+
+    :param navegador: Navegador del pool
+    :param nombre_pagina: clave del reporte en PAGINAS
+    :param anio: año a seleccionar
+    :return: True si el año quedó seleccionado
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    if navegador.estado.get("pagina_anio") == (nombre_pagina, anio):
+        return True
+
+    # Evita esperar de nuevo por un año que este navegador ya encontró sin datos
+    no_disponibles = navegador.estado.setdefault("no_disponibles", set())
+    if (nombre_pagina, anio) in no_disponibles:
+        return False
+
+    driver, wait = navegador.driver, navegador.wait
+    navegador.estado["pagina_anio"] = None
+    driver.get(PAGINAS[nombre_pagina])
+
+    try:
+        wait.until(EC.presence_of_element_located((By.ID, "ReportViewer1_ctl04_ctl03_ddDropDownButton")))
+        driver.find_element(By.ID, "ReportViewer1_ctl04_ctl03_ddDropDownButton").click()
+        time.sleep(1)
+
+        year_option = wait.until(EC.element_to_be_clickable((By.XPATH, f"//label[normalize-space(text())='{anio}']")))
+        year_option.click()
+        time.sleep(0.5)
+    except Exception:
+        print(f"  No disponible el año {anio}, continuando...")
+        no_disponibles.add((nombre_pagina, anio))
+        return False
+
+    navegador.estado["pagina_anio"] = (nombre_pagina, anio)
+    return True
+
+
+def procesar_mes_categoria(navegador, tarea):
+    """
+    Descarga el reporte de una página para un año y mes, y lo guarda en su carpeta final.
+
+    :param navegador: Navegador del pool
+    :param tarea: TareaDescarga(reporte, anio, mes)
+    :return: True si el archivo quedó guardado
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    nombre_pagina, anio = tarea.reporte, tarea.anio
+    mes_num = f"{tarea.mes:02d}"
+    mes_nombre = meses[mes_num]
+    driver, wait = navegador.driver, navegador.wait
+    download_dir = navegador.download_dir
+
+    destino_dir = os.path.dirname(ruta_destino(tarea))
+    os.makedirs(destino_dir, exist_ok=True)
+
+    print(f"\n Procesando {nombre_pagina} {anio}-{mes_nombre}...")
+
+    pasos = Cronometro("descarga.paso", {"reporte": nombre_pagina, "backend": "selenium"}, mes=f"{anio}-{mes_num}")
+    if not seleccionar_anio(navegador, nombre_pagina, anio):
+        return False
+    pasos.marca("navegar")
+
+    try:
+        driver.find_element(By.ID, "ReportViewer1_ctl04_ctl05_ddDropDownButton").click()
+        time.sleep(1)
+
+        # Desmarcar checkboxes activos
+        for cb in driver.find_elements(By.XPATH, "//div[@id='ReportViewer1_ctl04_ctl05_divDropDown']//input[@type='checkbox']"):
+            if cb.is_selected():
+                cb.click()
+                time.sleep(0.2)
+
+        # Seleccionar mes
+        label_mes = wait.until(EC.element_to_be_clickable((By.XPATH, f"//label[normalize-space(text())='{mes_nombre}']")))
+        label_mes.click()
+        time.sleep(0.5)
+        pasos.marca("seleccionar")
+
+        # Clic en botón 'Ver Informe'
+        driver.find_element(By.ID, "ReportViewer1_ctl04_ctl00").click()
+        esperar_renderizado(wait)
+        time.sleep(1.5)
+        pasos.marca("renderizar")
+
+        if "No se encontro" in driver.page_source:
+            print(f" {anio}-{mes_nombre} no contiene datos.")
+            return False
+
+        archivos_antes = set(os.listdir(download_dir))
+
+        try:
+            print(" Abriendo menú de exportación...")
+            driver.find_element(By.ID, "ReportViewer1_ctl05_ctl04_ctl00_ButtonLink").click()
+            time.sleep(0.5)
+
+            print(f" Buscando opción de exportación: {FORMATO_EXPORTACION}")
+            export_link = wait.until(EC.element_to_be_clickable((By.XPATH, f"//a[normalize-space(text())='{FORMATO_EXPORTACION}']")))
+            export_link.click()
+            pasos.marca("exportar")
+        except Exception as e:
+            print(f" No se encontró la opción de exportación para {anio}-{mes_nombre} ({type(e).__name__})")
+            return False
+
+        nombre_destino = f"{anio}-{mes_num}-{nombre_pagina}"
+        renombrado = esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, destino_dir=destino_dir)
+        pasos.marca("renombrar")
+        if renombrado:
+            print(f"  Descarga completada para {anio}-{mes_num}")
+            return True
+
+        print(f"  Fallo en descarga de {anio}-{mes_num}")
+        return False
+
+    except Exception as e:
+        try:
+            driver.switch_to.alert.accept()
+            print(" Alerta aceptada")
+        except:
+            pass
+
+        try:
+            driver.switch_to.default_content()
+        except:
+            print(f" No se puede cambiar al contenido principal.")
+
+        # La página quedó en un estado desconocido: forzar recarga en la siguiente tarea
+        navegador.estado["pagina_anio"] = None
+        print(f"  Error durante {anio}-{mes_nombre}: {str(e)}")
+        return False
+
+
+def procesar_mes_categoria_http(sesion, tarea):
+    """
+    Descarga el reporte de una página para un año y mes con el cliente HTTP,
+    escribiendo el CSV directo en su carpeta final.
+
+    :param sesion: SesionReportViewer del pool
+    :param tarea: TareaDescarga(reporte, anio, mes)
+    :return: True si el archivo quedó guardado
+    """
+    nombre_pagina, anio = tarea.reporte, tarea.anio
+    mes_num = f"{tarea.mes:02d}"
+
+    ruta = ruta_destino(tarea)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    try:
+        if sesion.descargar_categoria(nombre_pagina, anio, tarea.mes, meses[mes_num], ruta):
+            print(f"  Descarga completada para {nombre_pagina} {anio}-{mes_num}")
+            return True
+    except Exception as e:
+        # El formulario guardado puede haber quedado inconsistente: empezar de cero
+        sesion.estado.clear()
+        print(f"  Error durante {nombre_pagina} {anio}-{mes_num}: {str(e)}")
+        return False
+
+    print(f"  Fallo en descarga de {nombre_pagina} {anio}-{mes_num}")
+    return False
+
+
+def planificar_descarga_categorias(desde=DESDE, hasta=None, refrescar_anio_actual=False, completo=False):
+    """
+    Calcula qué meses de cada página hay que descargar según el manifiesto.
+
+    :param desde: 'AAAA-MM' inicial.
+    :param hasta: 'AAAA-MM' final (por defecto, el mes en curso).
+    :param refrescar_anio_actual: vuelve a descargar el año en curso aunque ya esté completo.
+    :param completo: ignora el manifiesto y descarga todo el rango.
+    :return: lista de (TareaDescarga, motivo).
+    """
+    tareas = generar_tareas(list(PAGINAS), desde or DESDE, hasta)
+    return Manifiesto(MANIFIESTO_PATH).planificar(tareas, ruta_destino, refrescar_anio_actual, completo)
+
+
+def descargar_datos_categorias(n_navegadores=N_NAVEGADORES, backend=BACKEND, desde=DESDE, hasta=None,
+                               refrescar_anio_actual=False, completo=False, al_avance=None, debe_cancelar=None):
+    """
+    Función principal que reparte entre el pool de navegadores los meses de cada página
+    que falten en el manifiesto, para automatizar la descarga y renombrar los reportes.
+
+    :param n_navegadores: número de navegadores headless (o sesiones HTTP) que trabajan en paralelo.
+    :param backend: 'selenium' (navegador) o 'http' (postbacks directos al ReportViewer).
+    :param desde: 'AAAA-MM' inicial (por defecto, 1995-01).
+    :param hasta: 'AAAA-MM' final (por defecto, el mes en curso).
+    :param refrescar_anio_actual: vuelve a descargar el año en curso aunque ya esté completo.
+    :param completo: ignora el manifiesto y descarga todo el rango.
+    :param al_avance: función opcional (resumen) llamada después de cada mes.
+    :param debe_cancelar: función opcional () -> bool para detener la descarga.
+    :return: resumen del pool (meses, exitosos, fallidos, segundos, meses_por_minuto, cancelado).
+    """
+    plan = planificar_descarga_categorias(desde, hasta, refrescar_anio_actual, completo)
+    tareas = [tarea for tarea, _ in plan]
+    manifiesto = Manifiesto(MANIFIESTO_PATH)
+
+    if backend == "http":
+        from app.cliente_http import SesionReportViewer
+
+        pool = PoolNavegadores(manifiesto.envolver(procesar_mes_categoria_http, ruta_destino), CHROME_DRIVER_PATH,
+                               n_navegadores=n_navegadores, crear_navegador=SesionReportViewer,
+                               al_avance=al_avance, debe_cancelar=debe_cancelar)
+    else:
+        pool = PoolNavegadores(manifiesto.envolver(procesar_mes_categoria, ruta_destino), CHROME_DRIVER_PATH,
+                               n_navegadores=n_navegadores, timeout=120,
+                               al_avance=al_avance, debe_cancelar=debe_cancelar)
+    resumen = pool.ejecutar(tareas)
 
     print("\n Proceso de descarga finalizado.")
+    return resumen
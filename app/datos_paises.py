@@ -6,32 +6,48 @@ datos_paises.py
 Este script automatiza mediante Selenium la descarga de reportes mensuales 
 de exportaciones por país desde el sitio del CRT.
 
-Para cada mes y año desde 1997 hasta 2024:
+Para cada mes y año desde 1997 hasta el mes en curso (o el rango solicitado):
 - Selecciona todas las categorías, clases y países.
 - Establece el rango de fechas para el mes correspondiente.
 - Descarga el reporte en formato CSV.
 - Renombra y guarda el archivo en la carpeta /data/{año}-ExportacionesPais/.
 
+Sólo se descargan los meses faltantes, fallidos o vacíos según el manifiesto
+(ver manifiesto.py). Los meses se reparten entre un pool de navegadores headless (ver pool_navegadores.py).
+Con backend="http" se usa el cliente directo del ReportViewer (ver cliente_http.py).
+
+Los pasos de cada mes (navegar, seleccionar, renderizar, exportar, renombrar) se
+registran como tramos "descarga.paso" (ver pronosticos/telemetria.py).
+
+Selenium y el cliente HTTP se importan al descargar, no al importar el módulo: la
+API sólo planifica y no los carga.
+
 Autor: Francisco Enríquez
 """
 
 import os
 import time
+import shutil
 import calendar
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from app.pool_navegadores import N_NAVEGADORES, PoolNavegadores, generar_tareas
+from app.manifiesto import Manifiesto
+from pronosticos.telemetria import Cronometro
 
 # Configuraciones globales
 CHROME_DRIVER_PATH = "C:/Users/franc/Downloads/chromedriver-win64/chromedriver-win64/chromedriver.exe"
 BASE_DOWNLOAD_DIR = r"C:\Users\franc\Downloads\Modelo_Pronosticos\data"
 FORMATO_EXPORTACION = "CSV (delimitado por comas)"
 EXTENSION = ".csv"
+REPORTE = "ExportacionesPais"
+DESDE = "1997-01"
+MANIFIESTO_PATH = os.path.join(BASE_DOWNLOAD_DIR, "manifiesto_descargas.sqlite")
 
+# Motor de descarga por defecto: 'selenium' o 'http'
+BACKEND = os.getenv("CRT_BACKEND", "selenium")
 
-def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=EXTENSION, timeout=20):
+
+def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=EXTENSION, timeout=20,
+                        destino_dir=None):
     """
     Espera a que el archivo sea descargado y lo renombra con un nombre específico.
 
@@ -40,6 +56,7 @@ def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=
     :param download_dir: Directorio de descarga
     :param extension: Extensión esperada
     :param timeout: Tiempo máximo de espera en segundos
+    :param destino_dir: Carpeta final del archivo (por defecto, el mismo download_dir)
     :return: True si se completó y renombró, False si no
     """
     print("  Esperando descarga completa...")
@@ -60,12 +77,12 @@ def esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, extension=
         tiempo += 0.5
 
     if archivo_nuevo and os.path.exists(archivo_nuevo):
-        nuevo_path = os.path.join(download_dir, nombre_destino + extension)
+        nuevo_path = os.path.join(destino_dir or download_dir, nombre_destino + extension)
         try:
             if os.path.exists(nuevo_path):
                 print(f"  Eliminando archivo existente: {nuevo_path}")
                 os.remove(nuevo_path)
-            os.rename(archivo_nuevo, nuevo_path)
+            shutil.move(archivo_nuevo, nuevo_path)
             print(f"  Renombrado como: {nuevo_path}")
             return True
         except Exception as e:
@@ -80,11 +97,14 @@ def esperar_renderizado(wait):
     """
     Espera a que el informe esté completamente renderizado.
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
     wait.until(EC.presence_of_element_located((By.ID, "VisibleReportContentReportViewer1_ctl09")))
     wait.until(EC.element_to_be_clickable((By.ID, "ReportViewer1_ctl05_ctl04_ctl00_ButtonLink")))
 
 
-def procesar_mes(driver, wait, anio, mes, download_dir):
+def procesar_mes(driver, wait, anio, mes, download_dir, destino_dir=None):
     """
     Descarga y guarda el informe del CRT para un año y mes específico.
 
@@ -93,18 +113,25 @@ def procesar_mes(driver, wait, anio, mes, download_dir):
     :param anio: Año (int)
     :param mes: Mes (int)
     :param download_dir: Carpeta de descarga
+    :param destino_dir: Carpeta final del archivo (por defecto, download_dir)
+    :return: True si el archivo quedó guardado, False si no
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
     mes_str = f"{mes:02d}"
-    nombre_destino = f"{anio}-{mes_str}-ExportacionesPais"
+    nombre_destino = f"{anio}-{mes_str}-{REPORTE}"
 
     print(f"\n==============================")
     print(f"Descargando informe de {nombre_destino}")
     print(f"==============================")
 
+    pasos = Cronometro("descarga.paso", {"reporte": REPORTE, "backend": "selenium"}, mes=f"{anio}-{mes_str}")
     try:
         # Navegar al visor de exportaciones por país
         driver.get("https://old.crt.org.mx/EstadisticasCRTweb/Informes/ExportacionesPorPais.aspx")
         wait.until(EC.presence_of_element_located((By.ID, "ReportViewer1_ctl04_ctl07_ddDropDownButton")))
+        pasos.marca("navegar")
 
         # Establecer fechas (formato: dd/mm/yyyy)
         fecha_inicial = f"01/{mes_str}/{anio}"
@@ -146,23 +173,30 @@ def procesar_mes(driver, wait, anio, mes, download_dir):
             if not cb.is_selected():
                 cb.click()
                 time.sleep(0.1)
+        pasos.marca("seleccionar")
 
         # Ejecutar informe
         print("  Ejecutando informe...")
         driver.find_element(By.ID, "ReportViewer1_ctl04_ctl00").click()
         time.sleep(6)
         esperar_renderizado(wait)
+        pasos.marca("renderizar")
 
         archivos_antes = set(os.listdir(download_dir))
         driver.find_element(By.ID, "ReportViewer1_ctl05_ctl04_ctl00_ButtonLink").click()
         time.sleep(0.2)
 
         wait.until(EC.element_to_be_clickable((By.XPATH, f"//a[normalize-space(text())='{FORMATO_EXPORTACION}']"))).click()
+        pasos.marca("exportar")
 
-        if esperar_y_renombrar(nombre_destino, archivos_antes, download_dir):
+        renombrado = esperar_y_renombrar(nombre_destino, archivos_antes, download_dir, destino_dir=destino_dir)
+        pasos.marca("renombrar")
+        if renombrado:
             print(f" ✅ Descarga completada para {nombre_destino}")
-        else:
-            print(f" ❌ Fallo en descarga de {nombre_destino}")
+            return True
+
+        print(f" ❌ Fallo en descarga de {nombre_destino}")
+        return False
 
     except Exception as e:
         try:
@@ -171,35 +205,101 @@ def procesar_mes(driver, wait, anio, mes, download_dir):
         except:
             pass
         print(f" ⚠ Error durante {nombre_destino}: {str(e)}")
+        return False
 
 
-def descargar_datos_paises():
+def ruta_destino(tarea):
     """
-    Ejecuta la descarga de todos los informes mensuales de exportación por país desde 1997 hasta 2024.
+    Ruta final del CSV de una tarea: /data/{año}-ExportacionesPais/{año}-{mes}-ExportacionesPais.csv
     """
-    for anio in range(1997, 2025):
-        folder_name = f"{anio}-ExportacionesPais"
-        download_dir = os.path.join(BASE_DOWNLOAD_DIR, folder_name)
-        os.makedirs(download_dir, exist_ok=True)
+    return os.path.join(BASE_DOWNLOAD_DIR, f"{tarea.anio}-{REPORTE}",
+                        f"{tarea.anio}-{tarea.mes:02d}-{REPORTE}{EXTENSION}")
 
-        prefs = {
-            "download.default_directory": download_dir,
-            "download.prompt_for_download": False,
-            "directory_upgrade": True,
-            "profile.default_content_setting_values.automatic_downloads": 1
-        }
 
-        options = webdriver.ChromeOptions()
-        options.add_experimental_option("prefs", prefs)
-        options.add_argument("--start-maximized")
+def procesar_tarea_pais(navegador, tarea):
+    """
+    Procesa una TareaDescarga con un navegador del pool y mueve el CSV a su carpeta final.
 
-        service = Service(CHROME_DRIVER_PATH)
-        driver = webdriver.Chrome(service=service, options=options)
-        wait = WebDriverWait(driver, 180)
+    :param navegador: Navegador del pool
+    :param tarea: TareaDescarga(reporte, anio, mes)
+    :return: True si el archivo quedó guardado
+    """
+    destino_dir = os.path.dirname(ruta_destino(tarea))
+    os.makedirs(destino_dir, exist_ok=True)
+    return procesar_mes(navegador.driver, navegador.wait, tarea.anio, tarea.mes,
+                        navegador.download_dir, destino_dir=destino_dir)
 
-        for mes in range(1, 13):
-            procesar_mes(driver, wait, anio, mes, download_dir)
 
-        driver.quit()
+def procesar_tarea_pais_http(sesion, tarea):
+    """
+    Procesa una TareaDescarga con el cliente HTTP, escribiendo el CSV directo en su carpeta final.
+
+    :param sesion: SesionReportViewer del pool
+    :param tarea: TareaDescarga(reporte, anio, mes)
+    :return: True si el archivo quedó guardado
+    """
+    ruta = ruta_destino(tarea)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    nombre_destino = f"{tarea.anio}-{tarea.mes:02d}-{REPORTE}"
+
+    try:
+        if sesion.descargar_exportaciones_pais(tarea.anio, tarea.mes, ruta):
+            print(f" ✅ Descarga completada para {nombre_destino}")
+            return True
+    except Exception as e:
+        # El formulario guardado puede haber quedado inconsistente: empezar de cero
+        sesion.estado.clear()
+        print(f" ⚠ Error durante {nombre_destino}: {str(e)}")
+        return False
+
+    print(f" ❌ Fallo en descarga de {nombre_destino}")
+    return False
+
+
+def planificar_descarga_paises(desde=DESDE, hasta=None, refrescar_anio_actual=False, completo=False):
+    """
+    Calcula qué meses hay que descargar según el manifiesto.
+
+    :param desde: 'AAAA-MM' inicial
+    :param hasta: 'AAAA-MM' final (por defecto, el mes en curso)
+    :param refrescar_anio_actual: Vuelve a descargar el año en curso aunque ya esté completo
+    :param completo: Ignora el manifiesto y descarga todo el rango
+    :return: Lista de (TareaDescarga, motivo)
+    """
+    tareas = generar_tareas([REPORTE], desde or DESDE, hasta)
+    return Manifiesto(MANIFIESTO_PATH).planificar(tareas, ruta_destino, refrescar_anio_actual, completo)
+
+
+def descargar_datos_paises(n_navegadores=N_NAVEGADORES, backend=BACKEND, desde=DESDE, hasta=None,
+                           refrescar_anio_actual=False, completo=False, al_avance=None, debe_cancelar=None):
+    """
+    Ejecuta la descarga de los informes mensuales de exportación por país que falten en el manifiesto.
+
+    :param n_navegadores: Número de navegadores headless (o sesiones HTTP) que trabajan en paralelo
+    :param backend: 'selenium' (navegador) o 'http' (postbacks directos al ReportViewer)
+    :param desde: 'AAAA-MM' inicial (por defecto, 1997-01)
+    :param hasta: 'AAAA-MM' final (por defecto, el mes en curso)
+    :param refrescar_anio_actual: Vuelve a descargar el año en curso aunque ya esté completo
+    :param completo: Ignora el manifiesto y descarga todo el rango
+    :param al_avance: Función opcional (resumen) llamada después de cada mes
+    :param debe_cancelar: Función opcional () -> bool para detener la descarga
+    :return: Resumen del pool (meses, exitosos, fallidos, segundos, meses_por_minuto, cancelado)
+    """
+    plan = planificar_descarga_paises(desde, hasta, refrescar_anio_actual, completo)
+    tareas = [tarea for tarea, _ in plan]
+    manifiesto = Manifiesto(MANIFIESTO_PATH)
+
+    if backend == "http":
+        from app.cliente_http import SesionReportViewer
+
+        pool = PoolNavegadores(manifiesto.envolver(procesar_tarea_pais_http, ruta_destino), CHROME_DRIVER_PATH,
+                               n_navegadores=n_navegadores, crear_navegador=SesionReportViewer,
+                               al_avance=al_avance, debe_cancelar=debe_cancelar)
+    else:
+        pool = PoolNavegadores(manifiesto.envolver(procesar_tarea_pais, ruta_destino), CHROME_DRIVER_PATH,
+                               n_navegadores=n_navegadores, timeout=180,
+                               al_avance=al_avance, debe_cancelar=debe_cancelar)
+    resumen = pool.ejecutar(tareas)
 
     print("\n✅ Proceso de descarga por país finalizado.")
+    return resumen
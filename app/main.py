@@ -2,26 +2,75 @@
 main.py
 
 Este script lanza una API con FastAPI que permite iniciar la descarga automatizada
-de reportes del Consejo Regulador del Tequila (CRT), ejecutando tareas en segundo plano.
+de reportes del Consejo Regulador del Tequila (CRT). Las descargas se encolan como
+trabajos y las ejecuta un proceso aparte (python -m app.trabajador).
 
 Rutas principales:
 - /health: Verifica el estado del servicio.
-- /descargar?tipo=categorias|paises: Inicia la descarga por categorías o países.
+- /descargar?tipo=categorias|paises&navegadores=N&backend=selenium|http: Inicia la
+  descarga por categorías o países con un pool de N navegadores headless o, con
+  backend=http, con postbacks directos al ReportViewer. Acepta un rango desde/hasta
+  (AAAA-MM) y sólo descarga los meses faltantes, fallidos o vacíos del manifiesto;
+  con solo_plan=true devuelve el plan de trabajo sin ejecutarlo.
+- /jobs/{id}: Avance de un trabajo (meses hechos, ritmo, ETA). DELETE lo cancela.
+- /forecast: Pronósticos por lote (modelos × años × meses) con los pipelines entrenados.
+- /forecast/stats: Aciertos/fallos del caché de modelos y latencias p50/p99.
+- /diagnosticos/{modelo}/{tipo}: Importancias o curva de aprendizaje (PNG) de un
+  modelo; si aún no existe para la versión actual del modelo, encola su generación.
+- /series: Historia mensual de exportaciones por país, categoría y clase (una serie o
+  un lote), recortada y remuestreada a trimestre o año, desde un almacén en memoria
+  que se recarga cuando cambia el consolidado. Responde con ETag y 304 a los GET
+  condicionales. /series/catalogo lista los nombres disponibles.
+- /metrics: Contadores e histogramas de los tramos de descarga, parseo, características
+  y entrenamiento (de todos los procesos, vía el log de telemetría), en formato Prometheus.
 
 Autor: Francisco Enríquez
 """
 
-from fastapi import FastAPI, BackgroundTasks
-from app.datos_categorias import descargar_datos_categorias
-from app.datos_paises import descargar_datos_paises
+import time
+from contextlib import asynccontextmanager
+from email.utils import formatdate
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel
+from typing import List, Optional
+from app.datos_categorias import planificar_descarga_categorias
+from app.datos_paises import planificar_descarga_paises
+from app.pool_navegadores import N_NAVEGADORES
+from app.manifiesto import resumir_plan
+from app.trabajos import ColaTrabajos
+from pronosticos.servicio import (
+    ModeloNoEncontrado, cache_modelos, latencias, medir, modelos_a_precargar,
+    modelos_disponibles, pronosticar,
+)
+from pronosticos import diagnosticos
+from pronosticos import series
+from pronosticos.telemetria import Agregador, contador, registrar
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """
+    Precarga los modelos indicados en PRONOSTICO_PRECARGAR antes de recibir solicitudes.
+    """
+    cache_modelos.precargar(modelos_a_precargar())
+    yield
+
 
 # Crear instancia de la aplicación FastAPI con metadatos
 app = FastAPI(
     title="API de Descarga de Reportes del CRT",
     description="Esta API permite automatizar la descarga de reportes mensuales del Consejo Regulador del Tequila.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=ciclo_de_vida,
 )
 
+# Cola de trabajos compartida con los procesos trabajadores
+cola_trabajos = ColaTrabajos()
+
+# Tramos que escriben este servidor, los trabajadores y los entrenamientos (log compartido)
+agregador_tramos = Agregador()
+
 @app.get("/health")
 def health_check():
     """
@@ -32,30 +81,269 @@ def health_check():
     return {"status": "ok"}
 
 @app.post("/descargar")
-def iniciar_descarga(bg: BackgroundTasks, tipo: str = "categorias"):
+def iniciar_descarga(tipo: str = "categorias", navegadores: int = N_NAVEGADORES,
+                     backend: str = "selenium", desde: Optional[str] = None, hasta: Optional[str] = None,
+                     refrescar_actual: bool = False, completo: bool = False, solo_plan: bool = False):
     """
-    Inicia la descarga automatizada de reportes del CRT en segundo plano.
+    Encola la descarga automatizada de reportes del CRT.
 
     Parámetros:
     - tipo (str): Tipo de descarga a realizar. Puede ser:
         * 'categorias': descarga Producción Total, Consumo de Agave Total,
                         Exportaciones Totales por Categoría y por Forma.
         * 'paises': descarga Exportaciones por País.
+    - navegadores (int): Número de navegadores headless en paralelo. El avance
+      se reporta en meses por minuto para ajustarlo a lo que tolera el CRT.
+    - backend (str): 'selenium' (navegador) o 'http' (cliente directo del ReportViewer,
+      sin navegador; mucho más rápido por mes).
+    - desde / hasta (str): Rango de meses 'AAAA-MM'. Por defecto, desde el primer
+      mes disponible hasta el mes en curso.
+    - refrescar_actual (bool): Vuelve a descargar el año en curso aunque ya esté completo.
+    - completo (bool): Ignora el manifiesto y descarga todo el rango.
+    - solo_plan (bool): Sólo devuelve el plan de trabajo, sin descargar.
 
-    El proceso se ejecuta en segundo plano para no bloquear la respuesta HTTP.
+    Sólo se descargan los meses faltantes, fallidos o vacíos según el manifiesto.
+    La descarga la ejecuta un proceso trabajador, no el servidor. Si ya hay un trabajo
+    idéntico (mismo tipo y rango) pendiente o en curso, se devuelve ese mismo id.
 
     Retorna:
-        Mensaje informativo sobre el estado de la solicitud.
+        Id del trabajo, si fue deduplicado y el plan de trabajo.
     """
+    if backend not in ("selenium", "http"):
+        return {"error": "Backend no válido. Usa 'selenium' o 'http'."}
+
     if tipo == "categorias":
-        bg.add_task(descargar_datos_categorias)
-        return {"msg": "Descarga de categorías iniciada en segundo plano."}
-    
+        planificar = planificar_descarga_categorias
+        msg = "Descarga de categorías encolada."
     elif tipo == "paises":
-        bg.add_task(descargar_datos_paises)
-        return {"msg": "Descarga por país iniciada en segundo plano."}
-    
+        planificar = planificar_descarga_paises
+        msg = "Descarga por país encolada."
     else:
         return {
             "error": "Tipo no válido. Usa 'categorias' o 'paises'."
         }
+
+    try:
+        plan = planificar(desde=desde, hasta=hasta, refrescar_anio_actual=refrescar_actual, completo=completo)
+    except ValueError as e:
+        return {"error": f"Rango no válido: {str(e)}"}
+
+    if solo_plan:
+        return {"plan": resumir_plan(plan)}
+
+    if not plan:
+        return {"msg": "No hay meses pendientes de descarga.", "plan": resumir_plan(plan)}
+
+    trabajo_id, nuevo = cola_trabajos.encolar(tipo, {
+        "n_navegadores": navegadores, "backend": backend, "desde": desde, "hasta": hasta,
+        "refrescar_anio_actual": refrescar_actual, "completo": completo,
+    })
+    if not nuevo:
+        msg = "Ya hay un trabajo idéntico pendiente o en curso."
+    return {"msg": msg, "job_id": trabajo_id, "deduplicado": not nuevo, "plan": resumir_plan(plan)}
+
+
+@app.get("/jobs")
+def listar_trabajos(limite: int = 20):
+    """
+    Lista los trabajos de descarga más recientes con su avance.
+    """
+    return {"jobs": cola_trabajos.listar(limite)}
+
+
+@app.get("/jobs/{job_id}")
+def estado_trabajo(job_id: str):
+    """
+    Devuelve el avance de un trabajo: estado, meses hechos / total, meses por minuto y ETA.
+    """
+    trabajo = cola_trabajos.obtener(job_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return trabajo
+
+
+@app.delete("/jobs/{job_id}")
+def cancelar_trabajo(job_id: str):
+    """
+    Cancela un trabajo. Si ya está en curso, el trabajador se detiene al terminar
+    los meses que tiene en proceso.
+    """
+    estado = cola_trabajos.solicitar_cancelacion(job_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return {"job_id": job_id, "estado": estado}
+
+
+class SolicitudPronostico(BaseModel):
+    """
+    Lote de pronósticos: cada modelo se evalúa en todas las combinaciones año × mes.
+    """
+    modelos: List[str]
+    anios: List[int]
+    meses: Optional[List[int]] = None
+
+
+@app.post("/forecast")
+def pronostico(solicitud: SolicitudPronostico):
+    """
+    Devuelve los pronósticos de varios modelos (p. ej. 'pais_total_japon',
+    'Exportaciones Total Forma') para varios años y, opcionalmente, meses.
+
+    Los modelos se cargan en un caché LRU y cada uno se evalúa con un único
+    `predict` sobre el lote completo.
+    """
+    if solicitud.meses and any(not 1 <= m <= 12 for m in solicitud.meses):
+        raise HTTPException(status_code=422, detail="Los meses deben estar entre 1 y 12.")
+
+    try:
+        predicciones, ms = medir(pronosticar, cache_modelos, solicitud.modelos, solicitud.anios, solicitud.meses)
+    except ModeloNoEncontrado as e:
+        raise HTTPException(status_code=404, detail=f"Modelo no encontrado: {e.args[0]}")
+
+    registrar("api.forecast", ms / 1000, modelos=len(solicitud.modelos))
+    return {"predicciones": predicciones, "latencia_ms": round(ms, 3)}
+
+
+@app.get("/forecast/stats")
+def estadisticas_pronostico():
+    """
+    Estadísticas del servicio de pronósticos: caché de modelos y latencias p50/p99.
+    """
+    return {
+        "cache": cache_modelos.estadisticas(),
+        "latencia": latencias.resumen(),
+        "modelos_disponibles": modelos_disponibles(),
+    }
+
+
+@app.get("/diagnosticos/{modelo}/{tipo}")
+def diagnostico(modelo: str, tipo: str):
+    """
+    Gráfica de diagnóstico de un modelo: 'importancias' o 'curva_aprendizaje'.
+
+    Las gráficas se guardan por huella del modelo. Si ya existe para la versión
+    actual, se devuelve el PNG; si no, se encola un trabajo 'diagnostico' (lo ejecuta
+    el trabajador, fuera del servidor) y se responde 202 con su id: al completarse
+    /jobs/{id}, la misma solicitud devuelve la imagen. Si la generación ya falló para
+    esta versión del modelo se responde 422 con el error.
+    """
+    if tipo not in diagnosticos.TIPOS:
+        raise HTTPException(status_code=404, detail=f"Tipo no válido. Usa {' o '.join(diagnosticos.TIPOS)}.")
+    try:
+        ruta = diagnosticos.diagnostico_en_cache(modelo, tipo)
+    except diagnosticos.ModeloNoEncontrado:
+        raise HTTPException(status_code=404, detail=f"Modelo no encontrado: {modelo}")
+    if ruta is not None:
+        return FileResponse(ruta, media_type="image/png")
+    # Un fallo ya registrado para esta versión del modelo se repetiría: no se vuelve a encolar
+    error = diagnosticos.error_registrado(modelo, tipo)
+    if error is not None:
+        raise HTTPException(status_code=422, detail=f"No se pudo generar '{tipo}' para {modelo}: {error}")
+
+    trabajo_id, nuevo = cola_trabajos.encolar("diagnostico", {"modelo": modelo,
+                                                              "tipos": list(diagnosticos.TIPOS)})
+    return JSONResponse(status_code=202, content={
+        "msg": "Generación encolada." if nuevo else "La generación ya está pendiente o en curso.",
+        "job_id": trabajo_id,
+        "deduplicado": not nuevo,
+    })
+
+
+def _respuesta_condicional(request, inst, etiqueta, contenido):
+    """
+    304 si el cliente ya tiene esta versión (If-None-Match); si no, el JSON con su ETag.
+
+    `contenido` se llama sólo cuando hay que construir la respuesta.
+    """
+    cabeceras = {
+        "ETag": etiqueta,
+        "Last-Modified": formatdate(inst.firma[0] / 1e9, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    enviadas = request.headers.get("if-none-match", "")
+    if any(e.strip().removeprefix("W/") in (etiqueta, "*") for e in enviadas.split(",")):
+        return Response(status_code=304, headers=cabeceras)
+    return JSONResponse(content=contenido(), headers=cabeceras)
+
+
+def _instantanea_series():
+    try:
+        return series.almacen_series.instantanea()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=f"Series no disponibles: {e}")
+
+
+@app.get("/series")
+def consultar_series(request: Request, serie: Optional[List[str]] = Query(None),
+                     pais: Optional[str] = None, categoria: Optional[str] = None, clase: Optional[str] = None,
+                     desde: Optional[str] = None, hasta: Optional[str] = None, frecuencia: str = "mes"):
+    """
+    Historia de exportaciones (litros a 40 % Alc. Vol.) por país, categoría y clase.
+
+    Parámetros:
+    - pais / categoria / clase (str): Una serie; las dimensiones omitidas se suman
+      (sólo país = total del país; ninguna = total de exportaciones).
+    - serie (str, repetible): Lote de series 'PAIS|CATEGORIA|CLASE' (componentes
+      vacíos = todos); si se da, se ignoran pais/categoria/clase.
+    - desde / hasta (str): Rango 'AAAA-MM' o 'AAAA'.
+    - frecuencia (str): 'mes', 'trimestre' o 'anio'. Al remuestrear, cada periodo
+      suma sus meses con reporte y `meses` indica cuántos son.
+
+    Los datos salen de un almacén en memoria que se recarga en su lugar cuando la
+    consolidación escribe un consolidado nuevo. El ETag cambia con la versión de los
+    datos y con la consulta: con If-None-Match se responde 304 sin recalcular.
+    """
+    try:
+        consultas = ([series.interpretar_serie(s) for s in serie] if serie
+                     else [{"pais": pais, "categoria": categoria, "clase": clase}])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    inicio = time.perf_counter()
+    inst = _instantanea_series()
+    etiqueta = series.etag(inst.version, consultas, desde, hasta, frecuencia)
+
+    def contenido():
+        return {"version": inst.version, "frecuencia": frecuencia,
+                **inst.consultar(consultas, desde, hasta, frecuencia)}
+
+    try:
+        respuesta = _respuesta_condicional(request, inst, etiqueta, contenido)
+    except series.SerieNoEncontrada as e:
+        raise HTTPException(status_code=404, detail=f"Serie no encontrada: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    registrar("api.series", time.perf_counter() - inicio, {"estado_http": respuesta.status_code},
+              series=len(consultas))
+    return respuesta
+
+
+@app.get("/series/catalogo")
+def catalogo_series(request: Request):
+    """
+    Países, categorías y clases del consolidado, rango de meses disponible y versión de los datos.
+    """
+    inst = _instantanea_series()
+    return _respuesta_condicional(request, inst, series.etag(inst.version, "catalogo"), inst.catalogo)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metricas():
+    """
+    Métricas en el formato de texto de Prometheus.
+
+    - pronostico_tramos_total / pronostico_tramo_segundos: conteo por estado e
+      histograma de duración de cada etapa instrumentada (descarga.mes, descarga.paso,
+      consolidacion.parseo, caracteristicas.paso, entrenamiento.*, api.forecast),
+      agregados del log de telemetría que escriben todos los procesos.
+    - Aciertos/fallos del caché de modelos, solicitudes de /forecast y cargas del
+      almacén de series de este proceso.
+    """
+    cache = cache_modelos.estadisticas()
+    cuerpo = agregador_tramos.exposicion()
+    cuerpo += contador("cache_modelos_aciertos_total", cache["aciertos"], "Aciertos del caché de modelos.")
+    cuerpo += contador("cache_modelos_fallos_total", cache["fallos"], "Fallos del caché de modelos.")
+    cuerpo += contador("forecast_solicitudes_total", latencias.solicitudes, "Solicitudes a /forecast.")
+    cuerpo += contador("series_recargas_total", series.almacen_series.recargas,
+                       "Cargas del almacén de series (una por versión del consolidado).")
+    return PlainTextResponse(cuerpo, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+manifiesto.py
+
+Manifiesto persistente de descargas del CRT para la ingesta incremental.
+
+Por cada (reporte, año, mes) se guarda en SQLite la ruta del CSV, su tamaño,
+checksum SHA-256 y estado:
+- 'ok':      el archivo existe y contiene datos.
+- 'vacio':   el archivo existe pero sólo trae '#Error' o filas vacías (',,').
+- 'fallido': el último intento de descarga no produjo archivo.
+
+Con esto los descargadores sólo piden los meses faltantes, fallidos o vacíos.
+Los meses históricos no cambian, así que un mes 'ok' no se vuelve a descargar
+salvo que se pida refrescar el año en curso o una descarga completa.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date, datetime
+
+ESTADO_OK = "ok"
+ESTADO_VACIO = "vacio"
+ESTADO_FALLIDO = "fallido"
+
+# Encabezado de la tabla de datos dentro de cada CSV exportado
+ENCABEZADOS = {
+    "ExportacionesPais": "NombrePais,textbox11,Categoria,textbox14,Clase,textbox17",
+}
+ENCABEZADO_CATEGORIAS = "SubCategoria,Year,Valor"
+
+
+def clasificar_archivo(ruta, reporte):
+    """
+    Determina si un CSV descargado contiene datos.
+
+    :param ruta: Ruta al CSV
+    :param reporte: Clave del reporte (define el encabezado esperado)
+    :return: ESTADO_OK o ESTADO_VACIO
+    """
+    encabezado = ENCABEZADOS.get(reporte, ENCABEZADO_CATEGORIAS)
+    with open(ruta, encoding="utf-8-sig", errors="replace") as f:
+        lineas = [l.strip() for l in f]
+
+    if encabezado not in lineas:
+        return ESTADO_VACIO
+
+    # Basta una fila con contenido después del encabezado ('#Error' y ',,' no cuentan)
+    for linea in lineas[lineas.index(encabezado) + 1:]:
+        if linea and not linea.startswith("#") and linea.strip(",").strip():
+            return ESTADO_OK
+    return ESTADO_VACIO
+
+
+def calcular_checksum(ruta):
+    """
+    Calcula el SHA-256 de un archivo.
+    """
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+class Manifiesto:
+    """
+    Registro SQLite de los meses descargados. Es seguro usarlo desde los hilos del pool.
+
+    :param ruta: Archivo SQLite del manifiesto
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with closing(self._conectar()) as con, con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS descargas (
+                    reporte     TEXT    NOT NULL,
+                    anio        INTEGER NOT NULL,
+                    mes         INTEGER NOT NULL,
+                    ruta        TEXT,
+                    tamano      INTEGER,
+                    checksum    TEXT,
+                    estado      TEXT    NOT NULL,
+                    actualizado TEXT    NOT NULL,
+                    PRIMARY KEY (reporte, anio, mes)
+                )
+            """)
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.row_factory = sqlite3.Row
+        return con
+
+    def obtener(self, reporte, anio, mes):
+        """
+        Devuelve el registro de un mes (sqlite3.Row) o None si nunca se registró.
+        """
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM descargas WHERE reporte = ? AND anio = ? AND mes = ?",
+                (reporte, anio, mes),
+            ).fetchone()
+
+    def registrar(self, tarea, ruta):
+        """
+        Registra el resultado de una descarga a partir del archivo en disco.
+
+        :param tarea: TareaDescarga(reporte, anio, mes)
+        :param ruta: Ruta donde debió quedar el CSV
+        :return: Estado registrado
+        """
+        if os.path.exists(ruta):
+            tamano = os.path.getsize(ruta)
+            checksum = calcular_checksum(ruta)
+            estado = clasificar_archivo(ruta, tarea.reporte)
+        else:
+            tamano, checksum, estado = None, None, ESTADO_FALLIDO
+
+        with self._lock, closing(self._conectar()) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO descargas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tarea.reporte, tarea.anio, tarea.mes, ruta, tamano, checksum, estado,
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+        return estado
+
+    def motivo_descarga(self, tarea, ruta):
+        """
+        Indica por qué hay que descargar un mes, o None si ya está completo.
+
+        Si el manifiesto no conoce el mes pero el archivo existe (descargas previas
+        al manifiesto), se clasifica y registra sin volver a descargarlo.
+        """
+        registro = self.obtener(tarea.reporte, tarea.anio, tarea.mes)
+
+        if not os.path.exists(ruta):
+            return ESTADO_FALLIDO if registro and registro["estado"] == ESTADO_FALLIDO else "faltante"
+
+        if registro is None or registro["tamano"] != os.path.getsize(ruta):
+            estado = self.registrar(tarea, ruta)
+        else:
+            estado = registro["estado"]
+
+        return None if estado == ESTADO_OK else estado
+
+    def planificar(self, tareas, ruta_destino, refrescar_anio_actual=False, completo=False):
+        """
+        Calcula el plan de trabajo: qué meses descargar y por qué.
+
+        :param tareas: TareaDescarga candidatas (ya filtradas por rango de fechas)
+        :param ruta_destino: Función tarea -> ruta final del CSV
+        :param refrescar_anio_actual: Vuelve a descargar los meses del año en curso aunque estén 'ok'
+        :param completo: Ignora el manifiesto y descarga todo el rango
+        :return: Lista de (tarea, motivo)
+        """
+        anio_actual = date.today().year
+        plan = []
+        for tarea in tareas:
+            if completo:
+                motivo = "completo"
+            else:
+                motivo = self.motivo_descarga(tarea, ruta_destino(tarea))
+                if motivo is None and refrescar_anio_actual and tarea.anio == anio_actual:
+                    motivo = "anio_actual"
+            if motivo:
+                plan.append((tarea, motivo))
+        return plan
+
+    def envolver(self, procesar_tarea, ruta_destino):
+        """
+        Envuelve la función de descarga del pool para registrar cada resultado.
+
+        :param procesar_tarea: Función (navegador, tarea) -> bool
+        :param ruta_destino: Función tarea -> ruta final del CSV
+        :return: Función con la misma firma que además actualiza el manifiesto
+        """
+        def procesar_y_registrar(navegador, tarea):
+            exito = procesar_tarea(navegador, tarea)
+            return self.registrar(tarea, ruta_destino(tarea)) == ESTADO_OK and exito
+
+        return procesar_y_registrar
+
+
+def resumir_plan(plan):
+    """
+    Convierte un plan en un diccionario serializable para la API.
+    """
+    motivos = {}
+    for _, motivo in plan:
+        motivos[motivo] = motivos.get(motivo, 0) + 1
+    return {
+        "meses": len(plan),
+        "por_motivo": motivos,
+        "tareas": [
+            {"reporte": t.reporte, "anio": t.anio, "mes": t.mes, "motivo": motivo}
+            for t, motivo in plan
+        ],
+    }
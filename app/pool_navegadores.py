@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""
+pool_navegadores.py
+
+Pool de navegadores Chrome en modo headless para descargar en paralelo los
+reportes mensuales del CRT.
+
+- Cada navegador se lanza una sola vez y se reutiliza para todas sus tareas.
+- Cada navegador descarga en su propia carpeta temporal, de modo que la
+  detección del archivo nuevo no se mezcla entre navegadores.
+- Las tareas (reporte, año, mes) se reparten desde una cola compartida.
+- Al terminar se reporta el throughput en meses por minuto para ajustar N
+  contra lo que tolera el servidor del CRT.
+- Cada mes se registra como tramo "descarga.mes" (ver pronosticos/telemetria.py).
+- Selenium se importa al crear el primer navegador, no al importar el módulo.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from pronosticos.telemetria import tramo
+
+# Número de navegadores por defecto (se puede sobreescribir con CRT_NAVEGADORES)
+N_NAVEGADORES = int(os.getenv("CRT_NAVEGADORES", "4"))
+
+# Unidad de trabajo: un mes de un reporte
+TareaDescarga = namedtuple("TareaDescarga", ["reporte", "anio", "mes"])
+
+
+def parsear_mes(valor):
+    """
+    Convierte 'AAAA-MM' (o 'AAAA') en una tupla (año, mes).
+
+    :param valor: Texto con el año y, opcionalmente, el mes
+    :return: (anio, mes)
+    """
+    partes = str(valor).split("-")
+    anio = int(partes[0])
+    mes = int(partes[1]) if len(partes) > 1 else 1
+    if not 1 <= mes <= 12:
+        raise ValueError(f"Mes inválido en '{valor}'")
+    return anio, mes
+
+
+def generar_tareas(reportes, desde, hasta=None):
+    """
+    Genera las tareas (reporte, año, mes) de un rango de meses, sin pasar del mes en curso.
+
+    :param reportes: Lista de claves de reporte
+    :param desde: 'AAAA-MM' inicial (inclusive)
+    :param hasta: 'AAAA-MM' final (inclusive); por defecto, el mes en curso
+    :return: Lista de TareaDescarga ordenada por reporte, año y mes
+    """
+    hoy = date.today()
+    inicio = parsear_mes(desde)
+    fin = min(parsear_mes(hasta) if hasta else (hoy.year, hoy.month), (hoy.year, hoy.month))
+    if hasta and len(str(hasta).split("-")) == 1:
+        fin = min((int(hasta), 12), (hoy.year, hoy.month))
+
+    return [
+        TareaDescarga(reporte, anio, mes)
+        for reporte in reportes
+        for anio in range(inicio[0], fin[0] + 1)
+        for mes in range(1, 13)
+        if inicio <= (anio, mes) <= fin
+    ]
+
+
+class Navegador:
+    """
+    Navegador del pool: driver de Chrome, espera explícita y carpeta de descarga propia.
+
+    El diccionario `estado` permite a cada reporte recordar lo que ya está cargado
+    en la página (p. ej. el año seleccionado) para no repetir la navegación.
+    """
+
+    def __init__(self, indice, chrome_driver_path, timeout=180, headless=True):
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.indice = indice
+        self.download_dir = tempfile.mkdtemp(prefix=f"crt_navegador_{indice}_")
+        try:
+            self.driver = crear_driver(chrome_driver_path, self.download_dir, headless=headless)
+        except Exception:
+            # Sin driver no habrá cerrar(): la carpeta se borra aquí
+            shutil.rmtree(self.download_dir, ignore_errors=True)
+            raise
+        self.wait = WebDriverWait(self.driver, timeout)
+        self.estado = {}
+
+    def cerrar(self):
+        """
+        Cierra el navegador y elimina su carpeta temporal de descarga.
+        """
+        try:
+            self.driver.quit()
+        finally:
+            shutil.rmtree(self.download_dir, ignore_errors=True)
+
+
+def crear_driver(chrome_driver_path, download_dir, headless=True):
+    """
+    Crea un Chrome configurado para descargar sin confirmación en `download_dir`.
+
+    :param chrome_driver_path: Ruta al ejecutable de ChromeDriver
+    :param download_dir: Carpeta donde Chrome guardará las descargas
+    :param headless: Si es True, el navegador se lanza sin ventana
+    :return: Objeto WebDriver
+    """
+    # Importación diferida: planificar descargas (lo único que hace la API) no carga Selenium
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "directory_upgrade": True,
+        "profile.default_content_setting_values.automatic_downloads": 1
+    }
+
+    options = webdriver.ChromeOptions()
+    options.add_experimental_option("prefs", prefs)
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    else:
+        options.add_argument("--start-maximized")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+
+    service = Service(chrome_driver_path)
+    return webdriver.Chrome(service=service, options=options)
+
+
+class PoolNavegadores:
+    """
+    Reparte tareas de descarga entre N navegadores que consumen una cola compartida.
+
+    :param procesar_tarea: Función (navegador, tarea) -> bool que descarga un mes
+    :param chrome_driver_path: Ruta al ejecutable de ChromeDriver
+    :param n_navegadores: Número de navegadores simultáneos
+    :param timeout: Tiempo máximo de espera de cada WebDriverWait
+    :param headless: Si es True, los navegadores se lanzan sin ventana
+    :param crear_navegador: Fábrica opcional (indice) -> trabajador con `estado` y `cerrar()`;
+                            permite usar otro backend (p. ej. SesionReportViewer) con la misma cola
+    :param al_avance: Función opcional (resumen) llamada después de cada mes procesado
+    :param debe_cancelar: Función opcional () -> bool; si devuelve True no se toman más tareas
+    """
+
+    def __init__(self, procesar_tarea, chrome_driver_path, n_navegadores=N_NAVEGADORES,
+                 timeout=180, headless=True, crear_navegador=None, al_avance=None, debe_cancelar=None):
+        self.procesar_tarea = procesar_tarea
+        self.chrome_driver_path = chrome_driver_path
+        self.n_navegadores = max(1, int(n_navegadores))
+        self.timeout = timeout
+        self.headless = headless
+        self.crear_navegador = crear_navegador or (
+            lambda indice: Navegador(indice, self.chrome_driver_path, self.timeout, self.headless)
+        )
+        self.al_avance = al_avance
+        self.debe_cancelar = debe_cancelar or (lambda: False)
+        self._lock = threading.Lock()
+
+    def ejecutar(self, tareas):
+        """
+        Procesa todas las tareas y devuelve un resumen con el throughput obtenido.
+
+        :param tareas: Iterable de TareaDescarga
+        :return: Diccionario con meses totales, exitosos, fallidos, segundos y meses por minuto
+        """
+        cola = queue.Queue()
+        for tarea in tareas:
+            cola.put(tarea)
+
+        self._total = cola.qsize()
+        self._exitosos = 0
+        self._fallidos = 0
+        self._descartados = 0
+        self._cancelado = False
+        self._inicio = time.monotonic()
+
+        n_hilos = min(self.n_navegadores, self._total)
+        print(f"\n Iniciando pool de {n_hilos} navegadores para {self._total} meses...")
+        if self.al_avance:
+            self.al_avance(self._resumen())
+
+        hilos = [
+            threading.Thread(target=self._trabajar, args=(i, cola), name=f"navegador-{i}", daemon=True)
+            for i in range(n_hilos)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        if not self._cancelado:
+            self._descartar_pendientes(cola)
+
+        resumen = self._resumen()
+        resumen["cancelado"] = self._cancelado
+        print(f"\n Pool finalizado: {resumen['exitosos']}/{resumen['meses']} meses "
+              f"en {resumen['segundos']:.0f} s ({resumen['meses_por_minuto']:.2f} meses/min)")
+        return resumen
+
+    def _trabajar(self, indice, cola):
+        """
+        Ciclo de un navegador: toma tareas de la cola hasta vaciarla.
+        """
+        try:
+            navegador = self.crear_navegador(indice)
+        except Exception as e:
+            print(f" ⚠ No se pudo iniciar el navegador {indice}: {str(e)}")
+            return
+
+        try:
+            while True:
+                if self.debe_cancelar():
+                    self._cancelado = True
+                    print(f" Navegador {indice}: cancelación solicitada, se detiene.")
+                    break
+
+                try:
+                    tarea = cola.get_nowait()
+                except queue.Empty:
+                    break
+
+                with tramo("descarga.mes", {"reporte": tarea.reporte},
+                           mes=f"{tarea.anio}-{tarea.mes:02d}", navegador=indice) as t:
+                    try:
+                        exito = self.procesar_tarea(navegador, tarea)
+                    except Exception as e:
+                        print(f" ⚠ Error no controlado en {tarea}: {str(e)}")
+                        exito = False
+                        t["estado"] = "error"
+                    if not exito:
+                        t.setdefault("estado", "fallo")
+
+                self._registrar(exito)
+        finally:
+            navegador.cerrar()
+
+    def _descartar_pendientes(self, cola):
+        """
+        Cuenta como fallidas las tareas que quedaron en la cola porque ningún
+        navegador pudo iniciarse (o todos los que lo hicieron terminaron antes).
+        """
+        pendientes = 0
+        while True:
+            try:
+                cola.get_nowait()
+            except queue.Empty:
+                break
+            pendientes += 1
+        if not pendientes:
+            return
+
+        print(f" ⚠ {pendientes} meses sin navegador disponible se cuentan como fallidos")
+        with self._lock:
+            self._fallidos += pendientes
+            self._descartados += pendientes
+            if self.al_avance:
+                self.al_avance(self._resumen())
+
+    def _registrar(self, exito):
+        """
+        Actualiza contadores y reporta el avance en meses por minuto.
+        """
+        with self._lock:
+            if exito:
+                self._exitosos += 1
+            else:
+                self._fallidos += 1
+            resumen = self._resumen()
+            print(f"  Avance: {resumen['exitosos'] + resumen['fallidos']}/{resumen['meses']} meses "
+                  f"| {resumen['meses_por_minuto']:.2f} meses/min")
+            if self.al_avance:
+                self.al_avance(resumen)
+
+    def _resumen(self):
+        segundos = time.monotonic() - self._inicio
+        # Los meses descartados sin navegador no cuentan para el throughput
+        procesados = self._exitosos + self._fallidos - self._descartados
+        return {
+            "meses": self._total,
+            "exitosos": self._exitosos,
+            "fallidos": self._fallidos,
+            "segundos": round(segundos, 1),
+            "meses_por_minuto": round(procesados / (segundos / 60), 2) if segundos > 0 else 0.0,
+        }
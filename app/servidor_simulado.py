@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+servidor_simulado.py
+
+Servidor local que imita las páginas ReportViewer del CRT para probar el cliente
+HTTP (cliente_http.py) sin conexión.
+
+- GET  /EstadisticasCRTweb/Informes/<pagina>.aspx: formulario con los parámetros
+  del reporte y sus campos ocultos (__VIEWSTATE, __EVENTVALIDATION).
+- POST a la misma ruta: postback. Con el botón 'Ver informe' devuelve el reporte
+  renderizado con su ExportUrlBase; sin él, sólo recarga los parámetros en cascada.
+- GET  /EstadisticasCRTweb/Reserved.ReportViewerWebControl.axd?...&Format=CSV:
+  devuelve el CSV grabado del mes solicitado.
+
+Los CSV grabados son las descargas reales ya guardadas en /data, con la misma
+estructura de carpetas que usan los descargadores.
+
+Uso:
+    python -m app.servidor_simulado --puerto 8765
+    CRT_BASE_URL=http://127.0.0.1:8765/EstadisticasCRTweb
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import re
+import uuid
+import argparse
+import threading
+from datetime import datetime
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from app.cliente_http import PAGINAS_ASPX, BOTON_VER_INFORME, FECHA_INICIAL, FECHA_FINAL, \
+    DROPDOWNS_PAIS, DROPDOWN_ANIO, DROPDOWN_MES
+
+# Carpeta con los CSV grabados (por defecto, /data del proyecto)
+GRABACIONES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+PREFIJO = "/EstadisticasCRTweb"
+MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+         "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+# Opciones de los parámetros multivalor del reporte por país
+OPCIONES_PAIS = {
+    DROPDOWNS_PAIS[0]: ["TEQUILA", "TEQUILA 100% DE AGAVE"],
+    DROPDOWNS_PAIS[1]: ["BLANCO", "JOVEN", "REPOSADO", "AÑEJO", "EXTRA AÑEJO"],
+    DROPDOWNS_PAIS[2]: ["ALEMANIA", "CANADA", "ESPAÑA", "ESTADOS UNIDOS DE AMERICA", "JAPON"],
+}
+ANIOS = [str(a) for a in range(1995, 2026)]
+
+
+def _checkboxes(dropdown, opciones, marcados):
+    """
+    Renderiza el divDropDown de un parámetro multivalor como lo hace el ReportViewer.
+    """
+    div_id = dropdown.replace("$", "_") + "_divDropDown"
+    filas = []
+    for i, opcion in enumerate(opciones, start=1):
+        nombre = f"{dropdown}$divDropDown$ctl{i:02d}"
+        cb_id = nombre.replace("$", "_")
+        checked = " checked=\"checked\"" if opcion in marcados else ""
+        filas.append(f'<span><input id="{cb_id}" type="checkbox" name="{nombre}"{checked} />'
+                     f'<label for="{cb_id}">{escape(opcion)}</label></span><br />')
+    return (f'<input id="{dropdown.replace("$", "_")}_ddDropDownButton" type="image" '
+            f'name="{dropdown}$ddDropDownButton" />'
+            f'<div id="{div_id}">{"".join(filas)}</div>')
+
+
+class ServidorSimulado:
+    """
+    Estado del servidor: view states emitidos y sesiones de reporte renderizadas.
+    """
+
+    def __init__(self, grabaciones_dir=GRABACIONES_DIR):
+        self.grabaciones_dir = grabaciones_dir
+        self.view_states = set()
+        self.reportes = {}
+        self._lock = threading.Lock()
+
+    def nuevo_view_state(self):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self.view_states.add(token)
+        return token
+
+    def ruta_grabacion(self, reporte, anio, mes):
+        nombre = f"{anio}-{mes:02d}-{reporte}.csv"
+        return os.path.join(self.grabaciones_dir, reporte, f"{anio}-{reporte}", nombre)
+
+    def pagina(self, reporte, campos=None, reporte_html=""):
+        """
+        Renderiza la página .aspx con el formulario (y el reporte, si ya se ejecutó).
+        """
+        campos = campos or {}
+        view_state = self.nuevo_view_state()
+
+        if reporte == "ExportacionesPais":
+            parametros = "".join(
+                f'<input name="{nombre}" type="text" id="{nombre.replace("$", "_")}" '
+                f'value="{escape(campos.get(nombre, ""))}" />'
+                for nombre in (FECHA_INICIAL, FECHA_FINAL)
+            )
+            for dropdown, opciones in OPCIONES_PAIS.items():
+                parametros += _checkboxes(dropdown, opciones, _marcados(campos, dropdown, opciones))
+        else:
+            anios = _marcados(campos, DROPDOWN_ANIO, ANIOS)
+            parametros = _checkboxes(DROPDOWN_ANIO, ANIOS, anios)
+            # Parámetro en cascada: los meses sólo aparecen después de elegir el año
+            if anios:
+                parametros += _checkboxes(DROPDOWN_MES, MESES, _marcados(campos, DROPDOWN_MES, MESES))
+
+        return f"""<html><body>
+<form method="post" action="./{PAGINAS_ASPX[reporte]}" id="form1">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{view_state}" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{view_state[::-1]}" />
+<div id="ReportViewer1_ctl04">{parametros}
+<input type="submit" name="{BOTON_VER_INFORME}" value="Ver informe" id="{BOTON_VER_INFORME.replace("$", "_")}" />
+</div>
+{reporte_html}
+</form></body></html>"""
+
+    def renderizar(self, reporte, campos):
+        """
+        Ejecuta el reporte: identifica el mes solicitado y publica su ExportUrlBase.
+        """
+        if reporte == "ExportacionesPais":
+            for dropdown, opciones in OPCIONES_PAIS.items():
+                if len(_marcados(campos, dropdown, opciones)) != len(opciones):
+                    return "<div>No se encontro informacion con los parametros seleccionados</div>"
+            ini = datetime.strptime(campos.get(FECHA_INICIAL, ""), "%d/%m/%Y")
+            anio, mes = ini.year, ini.month
+        else:
+            anios = _marcados(campos, DROPDOWN_ANIO, ANIOS)
+            meses = _marcados(campos, DROPDOWN_MES, MESES)
+            if len(anios) != 1 or len(meses) != 1:
+                return "<div>No se encontro informacion con los parametros seleccionados</div>"
+            anio, mes = int(anios[0]), MESES.index(meses[0]) + 1
+
+        ruta = self.ruta_grabacion(reporte, anio, mes)
+        if not os.path.exists(ruta):
+            return "<div>No se encontro informacion con los parametros seleccionados</div>"
+
+        sesion = uuid.uuid4().hex
+        with self._lock:
+            self.reportes[sesion] = ruta
+        export_url = (f"{PREFIJO}/Reserved.ReportViewerWebControl.axd?ReportSession={sesion}"
+                      f"&Culture=2058&ControlID=ReportViewer1&OpType=Export&ContentDisposition=OnlyHtmlInline&Format=")
+        export_url = export_url.replace("/", "\\/").replace("&", "\\u0026")
+        return (f'<div id="VisibleReportContentReportViewer1_ctl09">{escape(os.path.basename(ruta))}</div>'
+                f'<script>$create(Microsoft.Reporting.WebFormsClient.ReportViewer, '
+                f'{{"ExportUrlBase":"{export_url}","id":"ReportViewer1"}});</script>')
+
+
+def _marcados(campos, dropdown, opciones):
+    """
+    Devuelve las opciones marcadas de un parámetro multivalor a partir del postback.
+    """
+    return [op for i, op in enumerate(opciones, start=1) if f"{dropdown}$divDropDown$ctl{i:02d}" in campos]
+
+
+def crear_handler(servidor):
+    """
+    Construye el BaseHTTPRequestHandler ligado a un ServidorSimulado.
+    """
+    paginas = {aspx: reporte for reporte, aspx in PAGINAS_ASPX.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, codigo, cuerpo, tipo="text/html; charset=utf-8"):
+            datos = cuerpo.encode("utf-8") if isinstance(cuerpo, str) else cuerpo
+            self.send_response(codigo)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _reporte(self, ruta):
+            m = re.fullmatch(rf"{PREFIJO}/Informes/([^/]+)", ruta)
+            return paginas.get(m.group(1)) if m else None
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            reporte = self._reporte(url.path)
+            if reporte:
+                return self._responder(200, servidor.pagina(reporte))
+
+            if url.path == f"{PREFIJO}/Reserved.ReportViewerWebControl.axd":
+                qs = parse_qs(url.query)
+                ruta = servidor.reportes.get(qs.get("ReportSession", [""])[0])
+                if ruta and qs.get("Format") == ["CSV"]:
+                    with open(ruta, "rb") as f:
+                        return self._responder(200, f.read(), "text/csv")
+            self._responder(404, "Not Found")
+
+        def do_POST(self):
+            reporte = self._reporte(urlparse(self.path).path)
+            if not reporte:
+                return self._responder(404, "Not Found")
+
+            largo = int(self.headers.get("Content-Length", 0))
+            campos = {k: v[0] for k, v in parse_qs(self.rfile.read(largo).decode("utf-8"),
+                                                   keep_blank_values=True).items()}
+
+            # Igual que ASP.NET: el postback debe traer un __VIEWSTATE emitido por el servidor
+            view_state = campos.get("__VIEWSTATE", "")
+            if view_state not in servidor.view_states or campos.get("__EVENTVALIDATION") != view_state[::-1]:
+                return self._responder(500, "Validation of viewstate MAC failed.")
+
+            reporte_html = servidor.renderizar(reporte, campos) if BOTON_VER_INFORME in campos else ""
+            self._responder(200, servidor.pagina(reporte, campos, reporte_html))
+
+    return Handler
+
+
+def iniciar_servidor(host="127.0.0.1", puerto=0, grabaciones_dir=GRABACIONES_DIR):
+    """
+    Levanta el servidor simulado en un hilo de fondo.
+
+    :param host: Interfaz de escucha
+    :param puerto: Puerto (0 = cualquiera libre)
+    :param grabaciones_dir: Carpeta con los CSV grabados
+    :return: (httpd, base_url) para usar como CRT_BASE_URL; detener con httpd.shutdown()
+    """
+    httpd = ThreadingHTTPServer((host, puerto), crear_handler(ServidorSimulado(grabaciones_dir)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://{host}:{httpd.server_address[1]}{PREFIJO}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor simulado del ReportViewer del CRT")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--grabaciones", default=GRABACIONES_DIR)
+    args = parser.parse_args()
+
+    httpd = ThreadingHTTPServer((args.host, args.puerto), crear_handler(ServidorSimulado(args.grabaciones)))
+    print(f" Servidor simulado en http://{args.host}:{args.puerto}{PREFIJO}")
+    httpd.serve_forever()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+trabajador.py
+
+Proceso trabajador que ejecuta los trabajos de descarga encolados por la API.
+
+Cada proceso toma el trabajo pendiente más antiguo de la cola SQLite, ejecuta la
+descarga correspondiente (con su pool de navegadores o sesiones HTTP), reporta el
+avance en la cola y se detiene entre meses si se solicita la cancelación. Los
+trabajos 'diagnostico' generan las gráficas de un modelo (pronosticos/diagnosticos.py).
+
+Uso:
+    python -m app.trabajador               # un proceso
+    python -m app.trabajador --procesos 2  # dos trabajos simultáneos como máximo
+
+Autor: Francisco Enríquez
+"""
+
+import json
+import time
+import argparse
+import traceback
+from multiprocessing import Process
+
+from app.trabajos import ColaTrabajos, TRABAJOS_PATH, COMPLETADO, FALLIDO, CANCELADO
+
+# Segundos de espera entre consultas cuando la cola está vacía
+INTERVALO_SONDEO = 2.0
+
+
+def ejecutar_trabajo(cola, trabajo):
+    """
+    Ejecuta un trabajo reclamado y registra su resultado en la cola.
+
+    :param cola: ColaTrabajos
+    :param trabajo: Fila del trabajo (ya en curso)
+    """
+    trabajo_id = trabajo["id"]
+    print(f"\n▶ Trabajo {trabajo_id} ({trabajo['tipo']}) iniciado.")
+
+    try:
+        parametros = json.loads(trabajo["parametros"])
+        if trabajo["tipo"] == "diagnostico":
+            # Importación diferida: sklearn y matplotlib sólo para las gráficas
+            from pronosticos.diagnosticos import generar
+            # El avance por gráfica es también el latido: sin él, reencolar_huerfanos
+            # devolvería a la cola una curva de aprendizaje larga que sigue en curso
+            resumen = generar(parametros["modelo"], parametros["tipos"],
+                              al_avance=lambda r: cola.actualizar_avance(trabajo_id, r))
+        else:
+            # Importación diferida: sólo el trabajador carga Selenium y los descargadores
+            from app.datos_categorias import descargar_datos_categorias
+            from app.datos_paises import descargar_datos_paises
+
+            descargas = {"categorias": descargar_datos_categorias, "paises": descargar_datos_paises}
+            resumen = descargas[trabajo["tipo"]](
+                **parametros,
+                al_avance=lambda r: cola.actualizar_avance(trabajo_id, r),
+                debe_cancelar=lambda: cola.cancelacion_solicitada(trabajo_id),
+            )
+        estado = CANCELADO if resumen.get("cancelado") else COMPLETADO
+        cola.finalizar(trabajo_id, estado, resultado=resumen)
+        print(f"■ Trabajo {trabajo_id}: {estado}.")
+    except Exception as e:
+        traceback.print_exc()
+        cola.finalizar(trabajo_id, FALLIDO, error=str(e))
+        print(f"✖ Trabajo {trabajo_id} fallido: {str(e)}")
+
+
+def ciclo_trabajador(ruta=TRABAJOS_PATH, una_vez=False):
+    """
+    Bucle principal de un proceso trabajador.
+
+    :param ruta: Archivo SQLite de la cola
+    :param una_vez: Si es True, termina cuando la cola queda vacía (útil para cron)
+    """
+    cola = ColaTrabajos(ruta)
+    reencolados = cola.reencolar_huerfanos()
+    if reencolados:
+        print(f" Reencolados {reencolados} trabajos huérfanos.")
+
+    while True:
+        trabajo = cola.tomar_siguiente()
+        if trabajo is None:
+            if una_vez:
+                return
+            time.sleep(INTERVALO_SONDEO)
+            continue
+        ejecutar_trabajo(cola, trabajo)
+
+
+def iniciar_trabajadores(n_procesos=1, ruta=TRABAJOS_PATH, una_vez=False):
+    """
+    Lanza N procesos trabajadores y espera a que terminen.
+
+    :param n_procesos: Número de trabajos que se pueden ejecutar a la vez
+    :param ruta: Archivo SQLite de la cola
+    :param una_vez: Si es True, cada proceso termina cuando la cola queda vacía
+    """
+    if n_procesos <= 1:
+        return ciclo_trabajador(ruta, una_vez)
+
+    procesos = [Process(target=ciclo_trabajador, args=(ruta, una_vez), name=f"trabajador-{i}")
+                for i in range(n_procesos)]
+    for p in procesos:
+        p.start()
+    for p in procesos:
+        p.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trabajador de descargas del CRT")
+    parser.add_argument("--procesos", type=int, default=1, help="Trabajos simultáneos")
+    parser.add_argument("--una-vez", action="store_true", help="Termina cuando la cola queda vacía")
+    args = parser.parse_args()
+    iniciar_trabajadores(args.procesos, una_vez=args.una_vez)
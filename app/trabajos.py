@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+"""
+trabajos.py
+
+Cola persistente (SQLite) de trabajos de descarga del CRT y de gráficas de
+diagnóstico de los modelos.
+
+La API sólo encola; los trabajos los ejecuta un proceso aparte (ver trabajador.py),
+de modo que los scrapes de varias horas no corren dentro del servidor.
+
+- Cada trabajo tiene un id, su tipo ('categorias' | 'paises' | 'diagnostico') y sus
+  parámetros.
+- Dos solicitudes idénticas (mismo tipo y mismo rango de meses) mientras una sigue
+  pendiente o en curso se deduplican: se devuelve el trabajo existente.
+- El trabajador reporta avance (meses hechos, ritmo, ETA) y revisa si se pidió cancelar.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+# Base de datos de la cola (por defecto, en /data del proyecto)
+TRABAJOS_PATH = os.getenv(
+    "CRT_TRABAJOS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "trabajos.sqlite"),
+)
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+ACTIVOS = (PENDIENTE, EN_CURSO)
+
+# Parámetros que definen el trabajo a efectos de deduplicación (navegadores y backend
+# sólo cambian cómo se descarga, no qué meses se descargan; en los trabajos
+# 'diagnostico' cuentan el modelo y las gráficas)
+PARAMETROS_CLAVE = ("desde", "hasta", "refrescar_anio_actual", "completo", "modelo", "tipos")
+
+
+def _ahora():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def clave_trabajo(tipo, parametros):
+    """
+    Clave de deduplicación: tipo + parámetros que determinan los meses a descargar.
+    """
+    return json.dumps([tipo, {k: parametros.get(k) for k in PARAMETROS_CLAVE}], sort_keys=True)
+
+
+class ColaTrabajos:
+    """
+    Acceso a la tabla de trabajos. Cada operación abre su propia conexión, por lo que
+    se puede usar desde la API y desde varios procesos trabajadores a la vez.
+
+    :param ruta: Archivo SQLite de la cola
+    """
+
+    def __init__(self, ruta=TRABAJOS_PATH):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with closing(self._conectar()) as con, con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id             TEXT PRIMARY KEY,
+                    tipo           TEXT NOT NULL,
+                    parametros     TEXT NOT NULL,
+                    clave          TEXT NOT NULL,
+                    estado         TEXT NOT NULL,
+                    creado         TEXT NOT NULL,
+                    iniciado       TEXT,
+                    terminado      TEXT,
+                    latido         TEXT,
+                    meses_total    INTEGER,
+                    meses_hechos   INTEGER DEFAULT 0,
+                    meses_exitosos INTEGER DEFAULT 0,
+                    cancelar       INTEGER DEFAULT 0,
+                    resultado      TEXT,
+                    error          TEXT
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado)")
+
+    def _conectar(self):
+        # isolation_level=None: las transacciones se abren explícitamente con BEGIN IMMEDIATE
+        con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.row_factory = sqlite3.Row
+        return con
+
+    def encolar(self, tipo, parametros):
+        """
+        Encola un trabajo salvo que ya haya uno idéntico pendiente o en curso.
+
+        :param tipo: 'categorias', 'paises' o 'diagnostico'
+        :param parametros: Diccionario de argumentos para la función de descarga
+            (o de `pronosticos.diagnosticos.generar`)
+        :return: (id del trabajo, True si es nuevo / False si se deduplicó)
+        """
+        clave = clave_trabajo(tipo, parametros)
+        with closing(self._conectar()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                existente = con.execute(
+                    "SELECT id FROM trabajos WHERE clave = ? AND estado IN (?, ?)",
+                    (clave, *ACTIVOS),
+                ).fetchone()
+                if existente:
+                    con.execute("COMMIT")
+                    return existente["id"], False
+
+                trabajo_id = uuid.uuid4().hex
+                con.execute(
+                    "INSERT INTO trabajos (id, tipo, parametros, clave, estado, creado) VALUES (?, ?, ?, ?, ?, ?)",
+                    (trabajo_id, tipo, json.dumps(parametros), clave, PENDIENTE, _ahora()),
+                )
+                con.execute("COMMIT")
+                return trabajo_id, True
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+
+    def tomar_siguiente(self):
+        """
+        Reclama atómicamente el trabajo pendiente más antiguo.
+
+        :return: sqlite3.Row del trabajo (ya marcado 'en_curso') o None si no hay pendientes
+        """
+        with closing(self._conectar()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                fila = con.execute(
+                    "SELECT * FROM trabajos WHERE estado = ? ORDER BY creado LIMIT 1", (PENDIENTE,)
+                ).fetchone()
+                if fila:
+                    ahora = _ahora()
+                    con.execute(
+                        "UPDATE trabajos SET estado = ?, iniciado = ?, latido = ? WHERE id = ?",
+                        (EN_CURSO, ahora, ahora, fila["id"]),
+                    )
+                con.execute("COMMIT")
+                return fila
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+
+    def actualizar_avance(self, trabajo_id, resumen):
+        """
+        Guarda el avance reportado por el pool (meses, exitosos, fallidos).
+        """
+        with closing(self._conectar()) as con:
+            con.execute(
+                "UPDATE trabajos SET meses_total = ?, meses_hechos = ?, meses_exitosos = ?, latido = ? WHERE id = ?",
+                (resumen["meses"], resumen["exitosos"] + resumen["fallidos"], resumen["exitosos"],
+                 _ahora(), trabajo_id),
+            )
+
+    def finalizar(self, trabajo_id, estado, resultado=None, error=None):
+        """
+        Marca el trabajo como terminado (completado, fallido o cancelado).
+        """
+        with closing(self._conectar()) as con:
+            con.execute(
+                "UPDATE trabajos SET estado = ?, terminado = ?, resultado = ?, error = ? WHERE id = ?",
+                (estado, _ahora(), json.dumps(resultado) if resultado is not None else None, error, trabajo_id),
+            )
+
+    def solicitar_cancelacion(self, trabajo_id):
+        """
+        Cancela un trabajo: si está pendiente se cancela de inmediato; si está en curso,
+        el trabajador se detiene al terminar los meses que ya tiene en proceso.
+
+        :return: Estado resultante o None si el trabajo no existe
+        """
+        with closing(self._conectar()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                fila = con.execute("SELECT estado FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+                if fila is None:
+                    con.execute("COMMIT")
+                    return None
+                if fila["estado"] == PENDIENTE:
+                    con.execute("UPDATE trabajos SET estado = ?, terminado = ? WHERE id = ?",
+                                (CANCELADO, _ahora(), trabajo_id))
+                elif fila["estado"] == EN_CURSO:
+                    con.execute("UPDATE trabajos SET cancelar = 1 WHERE id = ?", (trabajo_id,))
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        return self.obtener(trabajo_id)["estado"]
+
+    def cancelacion_solicitada(self, trabajo_id):
+        """
+        Indica si se pidió cancelar el trabajo (consultado por el pool entre meses).
+        """
+        with closing(self._conectar()) as con:
+            fila = con.execute("SELECT cancelar FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        return bool(fila and fila["cancelar"])
+
+    def reencolar_huerfanos(self, minutos=30):
+        """
+        Devuelve a 'pendiente' los trabajos en curso cuyo trabajador dejó de reportar avance.
+
+        :param minutos: Tiempo sin latido a partir del cual un trabajo se considera huérfano
+        :return: Número de trabajos reencolados
+        """
+        limite = (datetime.now() - timedelta(minutes=minutos)).isoformat(timespec="seconds")
+        with closing(self._conectar()) as con:
+            cursor = con.execute(
+                "UPDATE trabajos SET estado = ?, iniciado = NULL WHERE estado = ? AND latido < ?",
+                (PENDIENTE, EN_CURSO, limite),
+            )
+            return cursor.rowcount
+
+    def obtener(self, trabajo_id):
+        """
+        Devuelve el trabajo con su avance: meses hechos, ritmo (meses/min) y ETA (segundos).
+
+        :return: Diccionario o None si no existe
+        """
+        with closing(self._conectar()) as con:
+            fila = con.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        if fila is None:
+            return None
+
+        trabajo = {
+            "id": fila["id"],
+            "tipo": fila["tipo"],
+            "parametros": json.loads(fila["parametros"]),
+            "estado": fila["estado"],
+            "cancelacion_solicitada": bool(fila["cancelar"]),
+            "creado": fila["creado"],
+            "iniciado": fila["iniciado"],
+            "terminado": fila["terminado"],
+            "meses_total": fila["meses_total"],
+            "meses_hechos": fila["meses_hechos"],
+            "meses_exitosos": fila["meses_exitosos"],
+            "meses_por_minuto": None,
+            "eta_segundos": None,
+            "resultado": json.loads(fila["resultado"]) if fila["resultado"] else None,
+            "error": fila["error"],
+        }
+
+        if fila["iniciado"] and fila["meses_hechos"]:
+            fin = datetime.fromisoformat(fila["terminado"] or fila["latido"])
+            minutos = (fin - datetime.fromisoformat(fila["iniciado"])).total_seconds() / 60
+            if minutos > 0:
+                ritmo = fila["meses_hechos"] / minutos
+                trabajo["meses_por_minuto"] = round(ritmo, 2)
+                if fila["estado"] == EN_CURSO and fila["meses_total"]:
+                    restantes = fila["meses_total"] - fila["meses_hechos"]
+                    trabajo["eta_segundos"] = round(restantes / ritmo * 60)
+
+        return trabajo
+
+    def listar(self, limite=20):
+        """
+        Devuelve los trabajos más recientes.
+        """
+        with closing(self._conectar()) as con:
+            ids = [f["id"] for f in con.execute(
+                "SELECT id FROM trabajos ORDER BY creado DESC LIMIT ?", (limite,)
+            )]
+        return [self.obtener(i) for i in ids]
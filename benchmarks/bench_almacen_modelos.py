@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_almacen_modelos.py
+
+Compara los .pkl de joblib (resultados/models y data/resultados/models) contra el
+almacén de pronosticos/almacen_modelos.py:
+
+- disco: .pkl sin comprimir vs objetos comprimidos + arreglos aplanados, después de
+  deduplicar por contenido;
+- carga en frío: cada modo carga todos los modelos en un proceso nuevo
+  (joblib.load del .pkl, `cargar` del objeto comprimido, `cargar_arboles` con
+  memoria mapeada).
+
+Los modelos se importan a un almacén temporal, así que el de resultados/ no se toca.
+
+Uso:
+    python benchmarks/bench_almacen_modelos.py
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import tempfile
+import warnings
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pronosticos.almacen_modelos import AlmacenModelos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETAS = [os.path.join(RAIZ, "data", "resultados", "models"), os.path.join(RAIZ, "resultados", "models")]
+
+
+def _mb(bytes_):
+    return bytes_ / 1e6
+
+
+def _cargar_todo(modo, directorio, carpeta, salida):
+    warnings.simplefilter("ignore")
+    import joblib
+    from pronosticos.almacen_modelos import AlmacenModelos
+
+    inicio = time.perf_counter()
+    if modo == "pkl":
+        for f in sorted(os.listdir(carpeta)):
+            if f.endswith(".pkl"):
+                joblib.load(os.path.join(carpeta, f))
+    else:
+        almacen = AlmacenModelos(directorio)
+        for nombre in almacen.nombres():
+            if modo == "almacen":
+                almacen.cargar(nombre)
+            else:
+                arboles = almacen.cargar_arboles(nombre)
+                # Se toca un nodo de cada arreglo para forzar el mapeo
+                sum(float(a[0].sum()) for a in arboles.values())
+    salida.put(time.perf_counter() - inicio)
+
+
+def medir(modo, directorio, carpeta):
+    ctx = get_context("spawn")
+    salida = ctx.Queue()
+    proceso = ctx.Process(target=_cargar_todo, args=(modo, directorio, carpeta, salida))
+    proceso.start()
+    segundos = salida.get()
+    proceso.join()
+    return segundos
+
+
+def main():
+    warnings.simplefilter("ignore")
+    pkls = [os.path.join(c, f) for c in CARPETAS if os.path.isdir(c) for f in os.listdir(c) if f.endswith(".pkl")]
+    bytes_pkl = sum(os.path.getsize(f) for f in pkls)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenModelos(directorio)
+        for carpeta in CARPETAS:
+            almacen.importar(carpeta)
+        almacen.eliminar_huerfanos()
+        disco = almacen.uso_disco()
+        indice = almacen.listar()
+
+        print(f"Modelos .pkl: {len(pkls)} archivos, {_mb(bytes_pkl):.1f} MB")
+        print(f"Almacén:      {len(indice)} nombres, {indice['sha256'].nunique()} objetos, "
+              f"{_mb(disco['objetos']):.1f} MB comprimidos + {_mb(disco['arboles']):.1f} MB de arreglos")
+
+        # La carga se mide sobre los mismos modelos: los de resultados/models
+        carpeta = CARPETAS[-1]
+        print(f"\nCarga en frío de {len(indice)} modelos (proceso nuevo):")
+        for modo, etiqueta in (("pkl", "joblib.load .pkl"), ("almacen", "cargar (zlib)"),
+                               ("arboles", "cargar_arboles (mmap)")):
+            print(f"  {etiqueta:24} {medir(modo, directorio, carpeta) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_almacenamiento.py
+
+Compara CSV contra Parquet (pronosticos/almacenamiento.py) al cargar los consolidados
+y las matrices de características: tiempo de carga, memoria del DataFrame y pico de
+memoria residente del proceso.
+
+Cada medición corre en un proceso nuevo para que el pico de RSS no se contamine con
+cargas anteriores. Si falta el Parquet de un dataset, se genera primero.
+
+Uso:
+    python benchmarks/bench_almacenamiento.py [--repeticiones 5]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pronosticos.consolidacion import DATA_DIR
+from pronosticos.almacenamiento import anios_disponibles, csv_a_parquet, ruta_dataset
+
+DATASETS = [
+    "consolidado_exportaciones_pais.csv",
+    "consolidado_exportacionestotalcategoria.csv",
+    "feature-engineering/categoria_features.csv",
+]
+
+# Proyección típica del modelo por país: país, litros y año, últimos 5 años
+COLUMNAS_PAIS = ["NombrePais", "Litros 40 % Alc. Vol", "AñoArchivo"]
+
+
+def _rss_pico_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _medir(formato, nombre, columnas, anios, repeticiones, salida):
+    import pandas as pd
+    from pronosticos.almacenamiento import leer_parquet
+
+    def cargar():
+        if formato == "csv":
+            df = pd.read_csv(os.path.join(DATA_DIR, nombre), encoding="utf-8-sig", usecols=columnas)
+            if anios is not None:
+                df = df[df["AñoArchivo"].isin(anios)]
+            return df
+        return leer_parquet(ruta_dataset(nombre), columnas, anios)
+
+    base = _rss_pico_mb()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        df = cargar()
+        tiempos.append(time.perf_counter() - inicio)
+    salida.put({
+        "ms": min(tiempos) * 1000,
+        "filas": len(df),
+        "df_mb": df.memory_usage(deep=True).sum() / 1e6,
+        "rss_mb": _rss_pico_mb() - base,
+    })
+
+
+def medir(formato, nombre, columnas=None, anios=None, repeticiones=5):
+    """
+    Mide la carga de un dataset en un proceso nuevo.
+    """
+    ctx = get_context("spawn")
+    salida = ctx.Queue()
+    proceso = ctx.Process(target=_medir, args=(formato, nombre, columnas, anios, repeticiones, salida))
+    proceso.start()
+    resultado = salida.get()
+    proceso.join()
+    return resultado
+
+
+def main(repeticiones=5):
+    casos = [(n, None, None) for n in DATASETS]
+    anio_max = max(anios_disponibles(ruta_dataset(DATASETS[0])) or [2025])
+    casos.append((DATASETS[0], COLUMNAS_PAIS, list(range(anio_max - 4, anio_max + 1))))
+
+    print(f"{'dataset':46} {'formato':8} {'filas':>7} {'carga ms':>9} {'df MB':>7} {'RSS MB':>7}")
+    for nombre, columnas, anios in casos:
+        if not anios_disponibles(ruta_dataset(nombre)):
+            csv_a_parquet(os.path.join(DATA_DIR, nombre))
+        etiqueta = os.path.basename(nombre) + (" (proyección)" if columnas else "")
+        for formato in ("csv", "parquet"):
+            r = medir(formato, nombre, columnas, anios, repeticiones)
+            print(f"{etiqueta:46} {formato:8} {r['filas']:>7} {r['ms']:>9.1f} {r['df_mb']:>7.2f} {r['rss_mb']:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga CSV vs Parquet")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    main(parser.parse_args().repeticiones)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_arranque.py
+
+Mide el arranque en frío de los puntos de entrada: cada caso corre en un
+intérprete nuevo (`python -X importtime -c ...`), que es lo que paga un contenedor
+de la API al escalar o un cron que lanza la CLI.
+
+- api: `import app.main` (FastAPI + cola de trabajos + servicio de pronósticos);
+- cli_ayuda: `python -m pronosticos --help`;
+- cli_consolidate / cli_features / cli_train / cli_forecast: la CLI más los
+  módulos que importa cada subcomando al ejecutarse.
+
+Por caso se reporta el tiempo de pared mínimo y la mediana de `--repeticiones`
+corridas, los milisegundos acumulados de importación según `-X importtime` y qué
+módulos pesados (PESADOS) quedaron cargados. La API no debe cargar Selenium,
+scikit-learn, SciPy ni matplotlib: si alguno aparece en `api` o `cli_ayuda` el
+script termina con código 1.
+
+Cada corrida se agrega a HISTORIAL (un renglón por caso, con commit).
+
+Uso:
+    python benchmarks/bench_arranque.py [--repeticiones 5] [--casos api cli_ayuda]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORIAL = Path(RAIZ) / "resultados" / "bench_arranque.csv"
+
+PESADOS = ("selenium", "requests", "sklearn", "scipy", "matplotlib", "pandas", "pyarrow", "joblib")
+# Lo que no puede cargar un arranque ligero
+PROHIBIDOS = ("selenium", "sklearn", "scipy", "matplotlib")
+
+_CLI = "import pronosticos.cli; "
+CASOS = {
+    "api": ("-c", "import app.main"),
+    "cli_ayuda": ("-m", "pronosticos", "--help"),
+    "cli_consolidate": ("-c", _CLI + "import pronosticos.consolidacion"),
+    "cli_features": ("-c", _CLI + "import pronosticos.caracteristicas"),
+    "cli_train": ("-c", _CLI + "import pronosticos.entrenamiento, pronosticos.orquestador"),
+    "cli_forecast": ("-c", _CLI + "import json, pronosticos.servicio"),
+}
+LIGEROS = ("api", "cli_ayuda")
+
+
+def _importtime(stderr):
+    """
+    Milisegundos acumulados de importación y paquetes raíz cargados, según `-X importtime`.
+    """
+    total, paquetes = 0, set()
+    for linea in stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea.split("|")
+        # Sólo los módulos de primer nivel suman al total (el acumulado ya incluye a sus hijos)
+        if not nombre.startswith("  "):
+            total += int(acumulado)
+        paquetes.add(nombre.strip().split(".")[0])
+    return total / 1000, paquetes
+
+
+def medir(caso, repeticiones):
+    """
+    Ejecuta un caso `repeticiones` veces en intérpretes nuevos.
+
+    :return: Diccionario {Min_s, Mediana_s, Import_ms, Pesados}
+    """
+    comando = [sys.executable, "-X", "importtime", *CASOS[caso]]
+    entorno = {**os.environ, "PYTHONPATH": RAIZ, "PRONOSTICO_TELEMETRIA": "0", "PYTHONDONTWRITEBYTECODE": "1"}
+    tiempos, importaciones = [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run(comando, capture_output=True, text=True, cwd=RAIZ, env=entorno)
+        tiempos.append(time.perf_counter() - inicio)
+        if salida.returncode != 0:
+            raise RuntimeError(f"{caso} falló:\n{salida.stderr[-2000:]}")
+        ms, paquetes = _importtime(salida.stderr)
+        importaciones.append(ms)
+    return {
+        "Min_s": min(tiempos),
+        "Mediana_s": float(np.median(tiempos)),
+        "Import_ms": float(np.median(importaciones)),
+        "Pesados": " ".join(p for p in PESADOS if p in paquetes),
+    }
+
+
+def _commit():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=RAIZ, timeout=10)
+        return salida.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío de la API y de la CLI")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--historial", type=Path, default=HISTORIAL)
+    args = parser.parse_args()
+
+    corrida = datetime.now().strftime("%Y%m%d-%H%M%S")
+    comunes = {"Corrida": corrida, "Commit": _commit(), "Repeticiones": args.repeticiones}
+    filas = []
+    for caso in args.casos:
+        fila = {**comunes, "Caso": caso, **medir(caso, args.repeticiones)}
+        print(f"  {caso:16} {fila['Min_s']:7.3f} s  import {fila['Import_ms']:7.0f} ms  [{fila['Pesados']}]")
+        filas.append(fila)
+
+    # entrenamiento.py carga scikit-learn: se importa sólo para escribir el historial
+    sys.path.insert(0, RAIZ)
+    from pronosticos.entrenamiento import guardar_metricas_csv
+    args.historial.parent.mkdir(parents=True, exist_ok=True)
+    for fila in filas:
+        guardar_metricas_csv(fila, args.historial)
+    print(f"\n Corrida {corrida} guardada en {args.historial}")
+
+    fallas = [(f["Caso"], p) for f in filas if f["Caso"] in LIGEROS
+              for p in f["Pesados"].split() if p in PROHIBIDOS]
+    for caso, paquete in fallas:
+        print(f" ✗ {caso} carga {paquete}")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
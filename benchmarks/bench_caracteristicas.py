@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_caracteristicas.py
+
+Compara la matriz de características del dataset por país en su forma original
+(float64 / int64, como el notebook) contra la compacta de
+pronosticos/caracteristicas.py (uint8 + float32):
+
+- variables de fecha: `map(lambda x: x.strftime("%b"))` fila por fila vs vectorizado;
+- ajuste y transformación: tiempo y memoria de la matriz resultante;
+- entrenamiento: split X/y como `split_Xy` + RandomForestRegressor sobre un país,
+  verificando que las predicciones coinciden.
+
+Uso:
+    python benchmarks/bench_caracteristicas.py [--pais "ESTADOS UNIDOS DE AMERICA"]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pronosticos.consolidacion import DATA_DIR
+from pronosticos.caracteristicas import FILES, TransformadorCaracteristicas, variables_temporales
+
+
+def _cronometrar(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def _fechas_notebook(df):
+    # Paso 1 tal como está en feature_engineering.ipynb
+    df = df.copy()
+    df["Fecha"]     = pd.to_datetime(df["AñoArchivo"].astype(str) + "-" + df["Mes"].astype(str).str.zfill(2))
+    df["Mes"]       = df["Fecha"].map(lambda x: x.strftime("%b"))
+    df["Trimestre"] = df["Fecha"].dt.to_period("Q").astype(str)
+    return df
+
+
+def _mb(df, columnas=None):
+    columnas = df.columns if columnas is None else columnas
+    return df[columnas].memory_usage(deep=True, index=False).sum() / 1e6
+
+
+def _entrenar(df, pais, target="Total_Pais_Mes"):
+    # Mismo recorte que run_pais_total + split_Xy (sólo numéricas)
+    df_p = df[df["NombrePais"] == pais]
+    X = df_p.drop(columns=[target]).select_dtypes(include=["number"])
+    y = df_p[target]
+    rf = RandomForestRegressor(n_estimators=100, min_samples_leaf=3, random_state=42, n_jobs=-1)
+    rf.fit(X, y)
+    return rf.predict(X), X
+
+
+def main(pais):
+    crudo = pd.read_csv(os.path.join(DATA_DIR, FILES["paises"]), encoding="utf-8-sig")
+    print(f"Consolidado por país: {len(crudo):,} filas\n")
+
+    _, t_nb = _cronometrar(_fechas_notebook, crudo)
+    base, t_vec = _cronometrar(variables_temporales, crudo, "paises")
+    print(f"Variables de fecha   notebook {t_nb * 1000:8.1f} ms | vectorizado {t_vec * 1000:8.1f} ms\n")
+
+    print(f"{'modo':10} {'ajuste s':>9} {'transf. ms':>11} {'matriz MB':>10} {'banderas MB':>12} "
+          f"{'RF s':>7} {'X MB':>7}")
+    predicciones = {}
+    for modo, compacto in (("original", False), ("compacto", True)):
+        transformador = TransformadorCaracteristicas("paises", compacto=compacto)
+        _, t_fit = _cronometrar(transformador.fit_transform, base)
+        matriz, t_tr = _cronometrar(transformador.transform, base)
+        numericas = matriz.select_dtypes("number")
+        banderas = [c for c in numericas.columns if np.isin(numericas[c].to_numpy(), (0, 1)).all()]
+        (pred, X), t_rf = _cronometrar(_entrenar, matriz, pais)
+        predicciones[modo] = pred
+        print(f"{modo:10} {t_fit:9.1f} {t_tr * 1000:11.1f} {_mb(matriz):10.2f} {_mb(matriz, banderas):12.2f} "
+              f"{t_rf:7.2f} {_mb(X):7.2f}")
+
+    diferencia = np.abs(predicciones["original"] - predicciones["compacto"]).max()
+    print(f"\nMáxima diferencia en predicciones RF ({pais}): {diferencia:.6g}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la matriz de características compacta")
+    parser.add_argument("--pais", default="ESTADOS UNIDOS DE AMERICA")
+    main(parser.parse_args().pais)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_etapas.py
+
+Mide las etapas críticas del pipeline sobre CSV sintéticos con la forma de los
+reportes del CRT (ver datos_sinteticos.py), a la escala que se pida:
+
+- parseo_paises: `consolidar` + `limpiar_exportaciones_pais` (un proceso);
+- parseo_categorias: `consolidar` + `limpiar_csv` sobre las cuatro carpetas;
+- caracteristicas_paises / caracteristicas_forma: `variables_temporales` +
+  `TransformadorCaracteristicas.fit_transform`;
+- gridsearch_rf: búsqueda en malla sobre el mayor destino (`preparar_pais_total`),
+  sin caché de folds para medir el entrenamiento real;
+- proyectar_anyo / backcast_years: LLAMADAS_PREDICCION llamadas con el pipeline
+  de la búsqueda.
+
+Cada etapa se repite `--repeticiones` veces (tiempo mínimo y mediana) y luego una
+vez más con `tracemalloc` para el pico de memoria de Python/NumPy, de modo que el
+rastreo no infle los tiempos. Las etapas de las que depende una etapa pedida con
+`--etapas` se ejecutan una vez sin medir.
+
+Cada corrida se agrega a HISTORIAL (un renglón por etapa, con commit, escala y
+semilla) y se compara contra la corrida anterior con la misma escala y semilla (o
+contra `--base`): un cambio de tiempo mínimo mayor a `--tolerancia` se marca como
+regresión o mejora, y con alguna regresión el script termina con código 1.
+
+Uso:
+    python benchmarks/bench_etapas.py [--escala 10] [--repeticiones 3]
+        [--etapas parseo_paises gridsearch_rf] [--base 20260101-120000]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import warnings
+import contextlib
+import subprocess
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos_sinteticos import asegurar_datos
+from pronosticos import cache_cv
+from pronosticos import entrenamiento as ent
+from pronosticos.consolidacion import CARPETAS_CATEGORIAS, CARPETA_PAISES, RENOMBRES_PAIS, \
+    consolidar, limpiar_csv, limpiar_exportaciones_pais, listar_csv
+from pronosticos.caracteristicas import TransformadorCaracteristicas, variables_temporales
+
+HISTORIAL = ent.RESULT_PATH / "bench_etapas.csv"
+TOLERANCIA = 0.20
+LLAMADAS_PREDICCION = 50
+
+ETAPAS = [
+    "parseo_paises",
+    "parseo_categorias",
+    "caracteristicas_paises",
+    "caracteristicas_forma",
+    "gridsearch_rf",
+    "proyectar_anyo",
+    "backcast_years",
+]
+
+
+def _callado(funcion, *args):
+    # `listar_csv` y `consolidar` imprimen una línea por carpeta / archivo
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        return funcion(*args)
+
+
+def parseo_paises(estado):
+    carpeta = os.path.join(estado["datos"], CARPETA_PAISES)
+    rutas = _callado(listar_csv, carpeta, CARPETA_PAISES)
+    df, _ = _callado(consolidar, rutas, limpiar_exportaciones_pais, 1)
+    estado["paises"] = df.rename(columns=RENOMBRES_PAIS)
+    return len(df), 1
+
+
+def parseo_categorias(estado):
+    filas = 0
+    for carpeta in CARPETAS_CATEGORIAS:
+        rutas = _callado(listar_csv, os.path.join(estado["datos"], carpeta), carpeta)
+        df, _ = _callado(consolidar, rutas, limpiar_csv, 1)
+        estado[carpeta] = df
+        filas += len(df)
+    return filas, 1
+
+
+def caracteristicas_paises(estado):
+    base = variables_temporales(estado["paises"], "paises")
+    estado["features_paises"] = TransformadorCaracteristicas("paises").fit_transform(base)
+    return len(base), 1
+
+
+def caracteristicas_forma(estado):
+    base = variables_temporales(estado["ExportacionesTotalForma"], "forma")
+    TransformadorCaracteristicas("forma").fit_transform(base)
+    return len(base), 1
+
+
+def gridsearch_rf(estado):
+    df = estado["features_paises"]
+    df_p, X, y = ent.preparar_pais_total(df, ent.top_paises(df, 1)[0])
+    estado["pipe"], _ = ent.gridsearch_rf(X, y)
+    estado["pais"] = (df_p, list(X.columns))
+    return len(X), 1
+
+
+def proyectar_anyo(estado):
+    _, columnas = estado["pais"]
+    for _ in range(LLAMADAS_PREDICCION):
+        ent.proyectar_anyo(estado["pipe"], columnas)
+    return 1, LLAMADAS_PREDICCION
+
+
+def backcast_years(estado):
+    df_p, columnas = estado["pais"]
+    for _ in range(LLAMADAS_PREDICCION):
+        ent.backcast_years(estado["pipe"], columnas, df_p, "Total_Pais_Mes", ent.BACKCAST_YEARS)
+    return len(ent.BACKCAST_YEARS), LLAMADAS_PREDICCION
+
+
+def medir(funcion, estado, repeticiones):
+    """
+    Tiempos de `repeticiones` ejecuciones y pico de memoria de una ejecución más.
+
+    :return: Diccionario {Filas, Llamadas, Min_s, Mediana_s, MemoriaPicoMB}
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        filas, llamadas = funcion(estado)
+        tiempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    try:
+        funcion(estado)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "Filas": filas,
+        "Llamadas": llamadas,
+        "Min_s": min(tiempos),
+        "Mediana_s": float(np.median(tiempos)),
+        "MemoriaPicoMB": pico / 1e6,
+    }
+
+
+def _commit():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return salida.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def ejecutar(datos, escala, semilla, repeticiones, etapas=None, historial=HISTORIAL):
+    """
+    Mide las etapas pedidas (todas por omisión) y las agrega a `historial`.
+
+    :return: (id de la corrida, DataFrame de resultados)
+    """
+    etapas = etapas or ETAPAS
+    resumen = asegurar_datos(datos, escala, semilla)
+    print(f" Datos sintéticos en {datos}: {resumen['filas_paises']:,} filas de países, "
+          f"{resumen['archivos_paises'] + resumen['archivos_categorias']} archivos")
+
+    cache_cv.ACTIVO = False
+    ent.configurar_nucleos(1)
+    corrida = datetime.now().strftime("%Y%m%d-%H%M%S")
+    comunes = {"Corrida": corrida, "Commit": _commit(), "Escala": escala, "Semilla": semilla,
+               "Repeticiones": repeticiones}
+
+    estado = {"datos": datos}
+    ultima = max(ETAPAS.index(e) for e in etapas)
+    filas = []
+    historial.parent.mkdir(parents=True, exist_ok=True)
+    for nombre in ETAPAS[:ultima + 1]:
+        funcion = globals()[nombre]
+        if nombre not in etapas:
+            funcion(estado)
+            continue
+        fila = {**comunes, "Etapa": nombre, **medir(funcion, estado, repeticiones)}
+        print(f"  {nombre:24} {fila['Min_s']:9.3f} s  {fila['MemoriaPicoMB']:9.1f} MB")
+        ent.guardar_metricas_csv(fila, historial)
+        filas.append(fila)
+    return corrida, pd.DataFrame(filas)
+
+
+def comparar(historial, corrida, base=None, tolerancia=TOLERANCIA):
+    """
+    Compara `corrida` contra `base` (por omisión, la corrida anterior con la misma
+    escala y semilla) usando el tiempo mínimo de cada etapa.
+
+    :return: DataFrame Etapa | Base_s | Actual_s | Cambio_% | BaseMB | ActualMB | Estado,
+        o None si no hay corrida base
+    """
+    df = pd.read_csv(historial, dtype={"Corrida": str, "Commit": str})
+    actual = df[df["Corrida"] == corrida]
+    if base is None:
+        previas = df[(df["Corrida"] < corrida)
+                     & (df["Escala"] == actual["Escala"].iloc[0])
+                     & (df["Semilla"] == actual["Semilla"].iloc[0])]
+        if previas.empty:
+            return None
+        base = previas["Corrida"].max()
+
+    # Si una etapa se midió más de una vez con el mismo id, cuenta la última
+    unido = (df[df["Corrida"] == base].drop_duplicates("Etapa", keep="last")
+             .merge(actual, on="Etapa", suffixes=("_base", "")))
+    cambio = unido["Min_s"] / unido["Min_s_base"] - 1
+    estado = np.select([cambio > tolerancia, cambio < -tolerancia], ["regresión", "mejora"], "igual")
+    return pd.DataFrame({
+        "Etapa": unido["Etapa"],
+        "Base_s": unido["Min_s_base"],
+        "Actual_s": unido["Min_s"],
+        "Cambio_%": cambio * 100,
+        "BaseMB": unido["MemoriaPicoMB_base"],
+        "ActualMB": unido["MemoriaPicoMB"],
+        "Estado": estado,
+    }).assign(Base=base)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por etapas sobre datos sintéticos del CRT")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplicador del número de países")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=None)
+    parser.add_argument("--datos", default=None, help="Carpeta de los CSV sintéticos (por omisión, en /tmp)")
+    parser.add_argument("--historial", type=Path, default=HISTORIAL)
+    parser.add_argument("--base", default=None, help="Id de la corrida contra la que se compara")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    datos = args.datos or os.path.join(tempfile.gettempdir(), f"crt_sintetico_x{args.escala:g}_s{args.semilla}")
+    corrida, _ = ejecutar(datos, args.escala, args.semilla, args.repeticiones, args.etapas, args.historial)
+    print(f"\n Corrida {corrida} guardada en {args.historial}")
+
+    comparacion = comparar(args.historial, corrida, args.base, args.tolerancia)
+    if comparacion is None:
+        print(" Sin corrida previa con la misma escala y semilla para comparar")
+        return 0
+    print(f"\n Comparación contra {comparacion['Base'].iloc[0]} (tolerancia ±{args.tolerancia:.0%}):")
+    print(comparacion.drop(columns="Base").to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+    return 1 if (comparacion["Estado"] == "regresión").any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
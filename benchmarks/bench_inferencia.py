@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_inferencia.py
+
+Compara `pipe.predict` (sklearn) contra `BosqueCompilado.predict`
+(pronosticos/inferencia.py) sobre los RandomForest de resultados/models:
+
+- una fila (una consulta de un año/mes);
+- el lote típico de la API (17 años × 12 meses = 204 filas);
+- un lote grande (10 000 filas).
+
+Para cada modelo y tamaño se reporta la mediana de varias repeticiones y la máxima
+diferencia relativa entre ambas predicciones.
+
+Uso:
+    python benchmarks/bench_inferencia.py [--repeticiones 20]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pronosticos.servicio import construir_lote, modelos_disponibles, MODELOS_DIR
+from pronosticos.inferencia import BosqueCompilado, compilar
+
+TAMANOS = [("1 fila", 1), ("lote API (204)", 204), ("10k filas", 10_000)]
+
+
+def lote(columnas, n, rng):
+    """
+    Lote de `n` filas con años 2023-2040 y meses al azar (one-hot como en la API).
+    """
+    if n == 204:
+        X, _ = construir_lote(columnas, list(range(2024, 2041)), list(range(1, 13)))
+        return X
+    valores = np.zeros((n, len(columnas)))
+    if "Year" in columnas:
+        valores[:, columnas.index("Year")] = rng.integers(2023, 2041, n)
+    meses = [i for i, c in enumerate(columnas) if c.startswith("Mes_")]
+    if meses:
+        valores[np.arange(n), rng.choice(meses, n)] = 1
+    return pd.DataFrame(valores, columns=columnas)
+
+
+def mediana_ms(funcion, X, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(X)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(tiempos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de inferencia: sklearn vs bosque compilado")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+    import joblib
+
+    rng = np.random.default_rng(0)
+    filas = []
+    for nombre in modelos_disponibles(MODELOS_DIR):
+        pipe = joblib.load(os.path.join(MODELOS_DIR, f"{nombre}.pkl"))
+        bosque = compilar(pipe)
+        if not isinstance(bosque, BosqueCompilado):
+            continue
+        for etiqueta, n in TAMANOS:
+            X = lote(list(pipe.feature_names_in_), n, rng)
+            esperado = pipe.predict(X)
+            diferencia = np.max(np.abs(bosque.predict(X) - esperado) / np.maximum(1.0, np.abs(esperado)))
+            repeticiones = max(3, args.repeticiones // (10 if n > 1000 else 1))
+            filas.append({
+                "Modelo": nombre[:40],
+                "Tamaño": etiqueta,
+                "Árboles": bosque.n_arboles,
+                "sklearn_ms": mediana_ms(pipe.predict, X, repeticiones),
+                "compilado_ms": mediana_ms(bosque.predict, X, repeticiones),
+                "dif_rel_max": diferencia,
+            })
+
+    df = pd.DataFrame(filas)
+    df["aceleracion"] = df["sklearn_ms"] / df["compilado_ms"]
+    pd.set_option("display.width", 160)
+    print(df.to_string(index=False, float_format=lambda v: f"{v:,.3g}"))
+    print("\nMediana por tamaño:")
+    print(df.groupby("Tamaño", sort=False)[["sklearn_ms", "compilado_ms", "aceleracion"]].median()
+          .to_string(float_format=lambda v: f"{v:,.2f}"))
+    print(f"\nDiferencia relativa máxima: {df['dif_rel_max'].max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
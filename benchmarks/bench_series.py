@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_series.py
+
+Compara dos formas de responder consultas de historia sobre el consolidado por país:
+
+- pandas: leer el CSV, filtrar país / categoría / clase y rango, y agrupar por
+  periodo (lo que hacía cualquier consulta antes del almacén);
+- almacén: `pronosticos.series` con la instantánea ya cargada (se reporta aparte
+  el costo de cargarla, que se paga una vez por versión del consolidado).
+
+Se miden una serie mensual, una anual y un lote de `--lote` series (los destinos con
+más volumen, por trimestre), y se verifica que ambos caminos dan los mismos valores.
+
+Uso:
+    python benchmarks/bench_series.py [--repeticiones 5] [--lote 50]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pronosticos import series
+
+# Como llegaría una consulta a mano: leer, filtrar, agrupar
+PASOS_PANDAS = {"mes": ["AñoArchivo", "Mes"], "trimestre": ["AñoArchivo", "Trimestre"], "anio": ["AñoArchivo"]}
+
+
+def con_pandas(ruta, consultas, desde, hasta, frecuencia):
+    df = pd.read_csv(ruta, encoding="utf-8-sig")
+    df["Trimestre"] = (df["Mes"] - 1) // 3 + 1
+    df = df[df["AñoArchivo"].between(desde, hasta)]
+    resultados = []
+    for consulta in consultas:
+        filtro = np.ones(len(df), dtype=bool)
+        for dimension, nombre in consulta.items():
+            if nombre is not None:
+                filtro &= df[series.COLUMNAS[dimension]].to_numpy() == nombre
+        grupos = df[filtro].groupby(PASOS_PANDAS[frecuencia])[series.COLUMNA_VALOR].sum()
+        resultados.append(grupos.round(2).to_numpy())
+    return resultados
+
+
+def con_almacen(instantanea, consultas, desde, hasta, frecuencia):
+    r = instantanea.consultar(consultas, str(desde), str(hasta), frecuencia)
+    return [np.array([v for v in s["valores"] if v is not None]) for s in r["series"]]
+
+
+def tiempo(funcion, repeticiones, *args):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas de historia: pandas contra el almacén de series")
+    parser.add_argument("--fuente", default=series.FUENTE, help="Consolidado por país")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--lote", type=int, default=50)
+    args = parser.parse_args()
+
+    carga, inst = tiempo(series.cargar, args.repeticiones, args.fuente)
+    print(f" Carga del almacén: {carga * 1000:,.0f} ms ({inst.valores.shape[0]} series × {inst.n_meses} meses, "
+          f"{inst.valores.nbytes / 1e6:.1f} MB)")
+
+    df = pd.read_csv(args.fuente, encoding="utf-8-sig", usecols=["NombrePais", series.COLUMNA_VALOR])
+    mayores = df.groupby("NombrePais")[series.COLUMNA_VALOR].sum().nlargest(args.lote).index
+    pais = mayores[min(5, len(mayores) - 1)]
+    casos = [
+        ("una serie, mensual", [{"pais": pais, "categoria": "TEQUILA 100% DE AGAVE", "clase": "AÑEJO"}], "mes"),
+        ("una serie, anual", [{"pais": pais, "categoria": None, "clase": None}], "anio"),
+        (f"lote de {len(mayores)}, trimestral", [{"pais": p, "categoria": None, "clase": None} for p in mayores],
+         "trimestre"),
+    ]
+
+    print(f"\n {'Consulta':28} {'pandas':>10} {'almacén':>10} {'×':>8}")
+    for nombre, consultas, frecuencia in casos:
+        t_pandas, esperado = tiempo(con_pandas, args.repeticiones, args.fuente, consultas, 2015, 2024, frecuencia)
+        t_almacen, obtenido = tiempo(con_almacen, args.repeticiones, inst, consultas, 2015, 2024, frecuencia)
+        # pandas no devuelve los periodos sin filas: se comparan sólo los que tienen valor distinto de 0
+        iguales = all(np.allclose(e[e != 0], o[o != 0]) for e, o in zip(esperado, obtenido))
+        print(f" {nombre:28} {t_pandas * 1000:8.1f} ms {t_almacen * 1000:7.2f} ms {t_pandas / t_almacen:8.0f}"
+              f"{'' if iguales else '  ✗ difieren'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""
+datos_sinteticos.py
+
+Genera un árbol de CSV sintéticos con la misma forma que las descargas del
+ReportViewer del CRT, para medir el parseo y el resto del pipeline a una escala
+mayor que la de los datos reales:
+
+    <destino>/<Carpeta>/<Año>-<Carpeta>/<Año>-<Mes>-<Carpeta>.csv
+
+- ExportacionesPais: BOM, preámbulo `textbox1` + "Exportaciones del … al …", línea
+  vacía y filas NombrePais,textbox11,Categoria,textbox14,Clase,textbox17 con
+  separador de miles entre comillas ("1,234.50"). Los totales por país y por
+  categoría son la suma de sus filas, como en el reporte.
+- Carpetas de categorías: BOM, bloque `textbox2` / `#Error`, bloque del gráfico
+  (chart1_…) y bloque SubCategoria,Year,Valor.
+
+Con escala 1 hay ~150 países, de los que ~60 exportan en cada mes (como en los
+datos reales); `escala` multiplica el número de países y, con él, las filas de
+cada archivo de ExportacionesPais. Los reportes de categorías tienen siempre tres
+filas por archivo (su costo es por archivo, no por fila). Faltan algunos meses al
+azar, como en las descargas reales.
+
+La generación es determinista para una misma semilla; `asegurar_datos` sólo
+regenera si cambió la escala o la semilla (ver sintetico.json en el destino).
+
+Uso:
+    python benchmarks/datos_sinteticos.py /tmp/crt_x10 --escala 10
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import calendar
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pronosticos.consolidacion import CARPETAS_CATEGORIAS, CARPETA_PAISES
+
+PAISES_BASE = 150
+ANIOS_PAISES = range(1997, 2026)
+ANIOS_CATEGORIAS = range(1995, 2026)
+MESES_ULTIMO_ANIO = 3
+PROB_MES_FALTANTE = 0.025
+
+PARES = [
+    ("TEQUILA", "AÑEJO"), ("TEQUILA", "BLANCO"), ("TEQUILA", "EXTRA AÑEJO"),
+    ("TEQUILA", "JOVEN"), ("TEQUILA", "REPOSADO"),
+    ("TEQUILA 100% DE AGAVE", "AÑEJO"), ("TEQUILA 100% DE AGAVE", "BLANCO"),
+    ("TEQUILA 100% DE AGAVE", "EXTRA AÑEJO"), ("TEQUILA 100% DE AGAVE", "JOVEN"),
+    ("TEQUILA 100% DE AGAVE", "REPOSADO"),
+]
+# Frecuencia relativa de cada par en el consolidado real
+PESOS_PARES = np.array([1750, 12084, 107, 7664, 10396, 8657, 9387, 2925, 718, 10593], dtype=float)
+
+SUBCATEGORIAS = {
+    "ConsumodeAgaveTotal": ("Tequila 100%", "Tequila"),
+    "ProduccionTotalTequila": ("Tequila 100%", "Tequila"),
+    "ExportacionesTotalCategoria": ("Tequila 100%", "Tequila"),
+    "ExportacionesTotalForma": ("Granel", "Envasado"),
+}
+
+ENCABEZADO_PAIS = "NombrePais,textbox11,Categoria,textbox14,Clase,textbox17"
+ENCABEZADO_GRAFICO = ("chart1_SeriesGroup1_label,chart1_SeriesGroup1_chart1_CategoryGroup1_label,"
+                      "chart1_SeriesGroup1_chart1_CategoryGroup1_Value_DataValue0")
+MANIFIESTO = "sintetico.json"
+
+
+def _numero(valor):
+    """Cantidad como la exporta el ReportViewer: miles con coma y entre comillas."""
+    texto = f"{valor:,.2f}"
+    return f'"{texto}"' if "," in texto else texto
+
+
+def _meses(anios, rng):
+    ultimo = anios[-1]
+    for anio in anios:
+        for mes in range(1, 13):
+            if anio == ultimo and mes > MESES_ULTIMO_ANIO:
+                return
+            if rng.random() >= PROB_MES_FALTANTE:
+                yield anio, mes
+
+
+def _ruta(destino, carpeta, anio, mes):
+    directorio = os.path.join(destino, carpeta, f"{anio}-{carpeta}")
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, f"{anio}-{mes:02d}-{carpeta}.csv")
+
+
+def _escribir(ruta, lineas):
+    with open(ruta, "w", encoding="utf-8-sig", newline="\n") as f:
+        f.write("\n".join(lineas))
+        f.write("\n\n")
+
+
+def _paises(n, rng):
+    """
+    Perfil fijo de cada país: volumen base (cola pesada, como los destinos reales),
+    crecimiento anual, probabilidad de exportar en un mes y pares que exporta.
+    """
+    base = np.sort(rng.lognormal(mean=8.5, sigma=2.2, size=n))[::-1]
+    crecimiento = rng.normal(0.04, 0.03, size=n)
+    presencia = np.clip(0.15 + 0.12 * np.log10(base / base.min() + 1), 0.15, 0.98)
+    probabilidades = PESOS_PARES / PESOS_PARES.sum()
+    pares = []
+    for _ in range(n):
+        k = rng.integers(1, 7)
+        elegidos = np.sort(rng.choice(len(PARES), size=k, replace=False, p=probabilidades))
+        pares.append((elegidos, rng.dirichlet(np.ones(k))))
+    nombres = [f"PAIS {i:04d}" for i in range(n)]
+    return nombres, base, crecimiento, presencia, pares
+
+
+def generar_paises(destino, escala=1.0, semilla=0, anios=ANIOS_PAISES):
+    """
+    Escribe los CSV mensuales de ExportacionesPais.
+
+    :param destino: Carpeta raíz del árbol sintético
+    :param escala: Multiplicador del número de países
+    :return: (archivos, filas) escritos
+    """
+    rng = np.random.default_rng(semilla)
+    n = max(1, int(round(PAISES_BASE * escala)))
+    nombres, base, crecimiento, presencia, pares = _paises(n, rng)
+
+    archivos = filas = 0
+    for anio, mes in _meses(anios, rng):
+        tendencia = (1 + crecimiento) ** (anio - anios[0])
+        estacional = 1 + 0.25 * np.sin(2 * np.pi * (mes - 3) / 12)
+        activos = np.flatnonzero(rng.random(n) < presencia)
+        volumen = base[activos] * tendencia[activos] * estacional * rng.lognormal(0, 0.35, activos.size)
+
+        dia = calendar.monthrange(anio, mes)[1]
+        lineas = ["textbox1", f"Exportaciones del 01/{mes:02d}/{anio} al {dia:02d}/{mes:02d}/{anio}", "",
+                  ENCABEZADO_PAIS]
+        # Orden del reporte: país, categoría, clase
+        for i, total in sorted(zip(activos, volumen), key=lambda par: nombres[par[0]]):
+            indices, pesos = pares[i]
+            litros = np.maximum(np.round(total * pesos * rng.lognormal(0, 0.2, pesos.size), 2), 0.01)
+            por_categoria = {}
+            for j, l in zip(indices, litros):
+                por_categoria[PARES[j][0]] = por_categoria.get(PARES[j][0], 0.0) + l
+            total_pais = _numero(sum(por_categoria.values()))
+            for j, l in zip(indices, litros):
+                categoria, clase = PARES[j]
+                lineas.append(f"{nombres[i]},{total_pais},{categoria},{_numero(por_categoria[categoria])},"
+                              f"{clase},{_numero(l)}")
+        _escribir(_ruta(destino, CARPETA_PAISES, anio, mes), lineas)
+        archivos += 1
+        filas += len(lineas) - 4
+    return archivos, filas
+
+
+def generar_categorias(destino, semilla=0, anios=ANIOS_CATEGORIAS):
+    """
+    Escribe los CSV mensuales de las cuatro carpetas de categorías.
+
+    :return: (archivos, filas) escritos
+    """
+    rng = np.random.default_rng(semilla + 1)
+    archivos = filas = 0
+    for carpeta in CARPETAS_CATEGORIAS:
+        primera, segunda = SUBCATEGORIAS[carpeta]
+        for anio, mes in _meses(anios, rng):
+            nivel = 5 * (1.04 ** (anio - anios[0]))
+            a, b = rng.uniform(0.2, 0.8) * nivel, rng.uniform(0.2, 0.8) * nivel
+            valores = [(primera, a), (segunda, b), ("Total", a + b)]
+            lineas = ["textbox2", "#Error", "", ENCABEZADO_GRAFICO]
+            lineas += [f"{nombre},{anio},{valor}" for nombre, valor in valores]
+            lineas += ["", "SubCategoria,Year,Valor"]
+            lineas += [f"{nombre},{anio},{valor:.1f}" for nombre, valor in valores]
+            _escribir(_ruta(destino, carpeta, anio, mes), lineas)
+            archivos += 1
+            filas += 3
+    return archivos, filas
+
+
+def generar(destino, escala=1.0, semilla=0):
+    """
+    Genera el árbol completo (países + categorías) y escribe sintetico.json.
+
+    :return: Diccionario con escala, semilla, archivos y filas por tipo de reporte
+    """
+    archivos_pais, filas_pais = generar_paises(destino, escala, semilla)
+    archivos_cat, filas_cat = generar_categorias(destino, semilla)
+    resumen = {
+        "escala": escala, "semilla": semilla,
+        "archivos_paises": archivos_pais, "filas_paises": filas_pais,
+        "archivos_categorias": archivos_cat, "filas_categorias": filas_cat,
+    }
+    with open(os.path.join(destino, MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump(resumen, f, indent=2)
+    return resumen
+
+
+def asegurar_datos(destino, escala=1.0, semilla=0):
+    """
+    Regresa el resumen del árbol en `destino`, generándolo (desde cero) sólo si no
+    existe o si fue generado con otra escala o semilla.
+    """
+    ruta = os.path.join(destino, MANIFIESTO)
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            resumen = json.load(f)
+        if resumen["escala"] == escala and resumen["semilla"] == semilla:
+            return resumen
+    for carpeta in [CARPETA_PAISES] + CARPETAS_CATEGORIAS:
+        shutil.rmtree(os.path.join(destino, carpeta), ignore_errors=True)
+    os.makedirs(destino, exist_ok=True)
+    return generar(destino, escala, semilla)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera CSV sintéticos con la forma de los reportes del CRT")
+    parser.add_argument("destino", help="Carpeta raíz del árbol sintético")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplicador del número de países")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+    resumen = asegurar_datos(args.destino, args.escala, args.semilla)
+    print(f" ExportacionesPais: {resumen['archivos_paises']} archivos, {resumen['filas_paises']:,} filas")
+    print(f" Categorías:        {resumen['archivos_categorias']} archivos, {resumen['filas_categorias']:,} filas")
+
+
+if __name__ == "__main__":
+    main()
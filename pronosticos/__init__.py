@@ -0,0 +1,9 @@
+"""
+pronosticos
+
+Paquete con el pipeline de datos y modelado del proyecto de pronóstico de
+exportaciones de tequila: consolidación de los CSV descargados del CRT,
+ingeniería de características, entrenamiento y pronóstico.
+
+Autor: Francisco Enríquez
+"""
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+"""
+__main__.py
+
+Permite `python -m pronosticos <subcomando>` (ver pronosticos/cli.py).
+
+Autor: Francisco Enríquez
+"""
+
+import sys
+
+from pronosticos.cli import main
+
+sys.exit(main())
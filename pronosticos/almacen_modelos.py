@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+
+"""
+almacen_modelos.py
+
+Almacén de modelos entrenados, direccionado por contenido.
+
+- Cada pipeline se guarda una sola vez, comprimido (joblib + zlib), con el SHA-256
+  de su contenido como nombre: dos nombres de modelo con el mismo contenido (o volver
+  a guardar un modelo que no cambió) comparten el mismo objeto.
+- Los árboles de un RandomForest se guardan además aplanados en arreglos NumPy
+  contiguos (.npy sin comprimir, tipos angostos) que se abren con memoria mapeada:
+  leer un modelo para predecir no requiere des-serializar el bosque.
+- Los metadatos (.json de cada modelo) se indexan en SQLite, de modo que se pueden
+  listar y filtrar (dataset, MAE, fecha…) sin abrir ningún pickle.
+
+Estructura:
+    resultados/almacen/indice.sqlite
+    resultados/almacen/objetos/<sha256>.joblib
+    resultados/almacen/arboles/<sha256>/{raices,caracteristica,umbral,izquierdo,derecho,valor}.npy
+    resultados/almacen/arboles/<sha256>/columnas.json
+
+Uso:
+    python -m pronosticos.almacen_modelos importar resultados/models data/resultados/models
+    python -m pronosticos.almacen_modelos listar [--dataset paises]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import json
+import pickle
+import sqlite3
+import hashlib
+import argparse
+import threading
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import joblib
+
+ALMACEN_DIR = os.getenv(
+    "PRONOSTICO_ALMACEN_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resultados", "almacen"),
+)
+
+COMPRESION = ("zlib", 3)
+
+# Arreglos del bosque aplanado (ver `aplanar_bosque`)
+ARREGLOS = ("raices", "caracteristica", "umbral", "izquierdo", "derecho", "valor")
+
+
+def _campos(nombres, campos):
+    # Sólo se usa como reductor al calcular la huella; no se des-serializa
+    return nombres, campos
+
+
+class _PicklerCanonico(pickle.Pickler):
+    """
+    Pickler para la huella: los arreglos estructurados (nodos de los árboles) se
+    serializan campo por campo, porque sus bytes de relleno no están inicializados y
+    cambian entre un modelo recién ajustado y el mismo modelo leído de disco.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, np.ndarray) and obj.dtype.names:
+            return _campos, (obj.dtype.names, [np.ascontiguousarray(obj[n]) for n in obj.dtype.names])
+        return NotImplemented
+
+
+class _Sha256:
+    def __init__(self):
+        self.sha = hashlib.sha256()
+
+    def write(self, datos):
+        self.sha.update(datos)
+
+
+def huella_pipeline(pipe):
+    """
+    SHA-256 del contenido del pipeline (mismo modelo → misma huella).
+    """
+    destino = _Sha256()
+    pickler = _PicklerCanonico(destino, protocol=5)
+    # Sin memo: que dos objetos iguales estén compartidos o duplicados no cambia la huella
+    pickler.fast = True
+    pickler.dump(pipe)
+    return destino.sha.hexdigest()
+
+
+def aplanar_bosque(pipe):
+    """
+    Convierte el RandomForest de un pipeline `selector` + `rf` en arreglos contiguos.
+
+    Todos los nodos de todos los árboles quedan en los mismos arreglos; los hijos
+    apuntan a índices globales y las hojas tienen hijo -1. La característica de cada
+    nodo se traduce a la columna de la entrada *antes* del selector, así que los
+    arreglos trabajan directo sobre X.
+
+    :return: Diccionario {raices, caracteristica, umbral, izquierdo, derecho, valor}
+        - raices: índice del nodo raíz de cada árbol (int64, n_arboles)
+        - caracteristica: columna de X del nodo (int32; -1 en hojas)
+        - umbral: umbral del nodo (float64; se va a la izquierda si x <= umbral)
+        - izquierdo / derecho: índice global del hijo (int32; -1 en hojas)
+        - valor: predicción del nodo (float64, n_nodos × n_salidas)
+    """
+    rf = pipe["rf"] if hasattr(pipe, "named_steps") else pipe
+    columnas = np.arange(rf.n_features_in_)
+    if hasattr(pipe, "named_steps") and "selector" in pipe.named_steps:
+        columnas = np.flatnonzero(pipe["selector"].get_support())
+
+    raices, caract, umbral, izq, der, valor = [], [], [], [], [], []
+    inicio = 0
+    for arbol in rf.estimators_:
+        t = arbol.tree_
+        hoja = t.children_left == -1
+        raices.append(inicio)
+        caract.append(np.where(hoja, -1, columnas[np.maximum(t.feature, 0)]))
+        umbral.append(t.threshold)
+        izq.append(np.where(hoja, -1, t.children_left + inicio))
+        der.append(np.where(hoja, -1, t.children_right + inicio))
+        valor.append(t.value[:, :, 0])
+        inicio += t.node_count
+
+    return {
+        "raices": np.asarray(raices, dtype=np.int64),
+        "caracteristica": np.concatenate(caract).astype(np.int32),
+        "umbral": np.concatenate(umbral).astype(np.float64),
+        "izquierdo": np.concatenate(izq).astype(np.int32),
+        "derecho": np.concatenate(der).astype(np.int32),
+        "valor": np.ascontiguousarray(np.concatenate(valor), dtype=np.float64),
+    }
+
+
+class ModeloNoEncontrado(KeyError):
+    """El modelo no está registrado en el almacén."""
+
+
+class AlmacenModelos:
+    """
+    Almacén de pipelines con índice SQLite. Es seguro usarlo desde varios hilos y
+    procesos (escrituras atómicas, SQLite en modo WAL).
+
+    :param directorio: Carpeta raíz del almacén
+    """
+
+    def __init__(self, directorio=ALMACEN_DIR):
+        self.directorio = directorio
+        self.ruta_indice = os.path.join(directorio, "indice.sqlite")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directorio, "objetos"), exist_ok=True)
+        os.makedirs(os.path.join(directorio, "arboles"), exist_ok=True)
+        with closing(self._conectar()) as con, con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS modelos (
+                    nombre      TEXT PRIMARY KEY,
+                    sha256      TEXT NOT NULL,
+                    dataset     TEXT,
+                    mae_cv      REAL,
+                    fecha       TEXT,
+                    modo_ajuste TEXT,
+                    bytes       INTEGER,
+                    meta        TEXT NOT NULL,
+                    registrado  TEXT NOT NULL
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS modelos_sha ON modelos (sha256)")
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta_indice, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.row_factory = sqlite3.Row
+        return con
+
+    def _ruta_objeto(self, sha):
+        return os.path.join(self.directorio, "objetos", f"{sha}.joblib")
+
+    def _carpeta_arboles(self, sha):
+        return os.path.join(self.directorio, "arboles", sha)
+
+    # ─────────────────────────── escritura ───────────────────────────
+
+    def guardar(self, pipe, nombre, meta=None):
+        """
+        Registra un pipeline bajo `nombre`.
+
+        El objeto comprimido y los arreglos del bosque sólo se escriben si su huella
+        no existe todavía; el índice siempre se actualiza con `meta`.
+
+        :return: SHA-256 del pipeline
+        """
+        sha = huella_pipeline(pipe)
+        ruta = self._ruta_objeto(sha)
+        if not os.path.exists(ruta):
+            temporal = f"{ruta}.{os.getpid()}.part"
+            joblib.dump(pipe, temporal, compress=COMPRESION)
+            os.replace(temporal, ruta)
+
+        carpeta = self._carpeta_arboles(sha)
+        if hasattr(pipe, "named_steps") and "rf" in pipe.named_steps and not os.path.isdir(carpeta):
+            temporal = f"{carpeta}.{os.getpid()}.part"
+            os.makedirs(temporal, exist_ok=True)
+            for clave, arreglo in aplanar_bosque(pipe).items():
+                np.save(os.path.join(temporal, f"{clave}.npy"), arreglo)
+            columnas = getattr(pipe, "feature_names_in_", None)
+            with open(os.path.join(temporal, "columnas.json"), "w", encoding="utf-8") as f:
+                json.dump(None if columnas is None else [str(c) for c in columnas], f, ensure_ascii=False)
+            try:
+                os.replace(temporal, carpeta)
+            except OSError:
+                # Otro proceso escribió la misma huella primero
+                for f in os.listdir(temporal):
+                    os.remove(os.path.join(temporal, f))
+                os.rmdir(temporal)
+
+        meta = meta or {}
+        with self._lock, closing(self._conectar()) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO modelos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (nombre, sha, meta.get("dataset"), meta.get("mae_cv"),
+                 meta.get("fecha_entrenamiento"), meta.get("modo_ajuste"),
+                 os.path.getsize(ruta), json.dumps(meta, default=str),
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+        return sha
+
+    def importar(self, directorio):
+        """
+        Registra todos los `<nombre>.pkl` (+ `<nombre>.json`) de una carpeta.
+
+        :return: Lista de (nombre, sha256)
+        """
+        registrados = []
+        for archivo in sorted(os.listdir(directorio)):
+            if not archivo.endswith(".pkl"):
+                continue
+            nombre = archivo[:-4]
+            ruta_meta = os.path.join(directorio, f"{nombre}.json")
+            meta = {}
+            if os.path.exists(ruta_meta):
+                with open(ruta_meta, encoding="utf-8") as f:
+                    meta = json.load(f)
+            pipe = joblib.load(os.path.join(directorio, archivo))
+            registrados.append((nombre, self.guardar(pipe, nombre, meta)))
+        return registrados
+
+    def eliminar_huerfanos(self):
+        """
+        Borra los objetos y árboles que ya no referencia ningún nombre del índice.
+
+        :return: Número de huellas eliminadas
+        """
+        with closing(self._conectar()) as con:
+            vivos = {r["sha256"] for r in con.execute("SELECT DISTINCT sha256 FROM modelos")}
+        eliminados = 0
+        for archivo in os.listdir(os.path.join(self.directorio, "objetos")):
+            sha = archivo.split(".")[0]
+            if archivo.endswith(".joblib") and sha not in vivos:
+                os.remove(self._ruta_objeto(sha))
+                carpeta = self._carpeta_arboles(sha)
+                if os.path.isdir(carpeta):
+                    for f in os.listdir(carpeta):
+                        os.remove(os.path.join(carpeta, f))
+                    os.rmdir(carpeta)
+                eliminados += 1
+        return eliminados
+
+    # ─────────────────────────── lectura ───────────────────────────
+
+    def _registro(self, nombre):
+        with closing(self._conectar()) as con:
+            registro = con.execute("SELECT * FROM modelos WHERE nombre = ?", (nombre,)).fetchone()
+        if registro is None:
+            raise ModeloNoEncontrado(nombre)
+        return registro
+
+    def nombres(self):
+        with closing(self._conectar()) as con:
+            return [r["nombre"] for r in con.execute("SELECT nombre FROM modelos ORDER BY nombre")]
+
+    def huella(self, nombre):
+        """
+        SHA-256 del contenido del modelo registrado como `nombre`.
+        """
+        return self._registro(nombre)["sha256"]
+
+    def metadatos(self, nombre):
+        """
+        Metadatos (.json) de un modelo, leídos del índice.
+        """
+        return json.loads(self._registro(nombre)["meta"])
+
+    def listar(self, dataset=None, mae_max=None):
+        """
+        Índice de modelos como DataFrame (sin abrir pickles).
+
+        :param dataset: Filtra por dataset de origen
+        :param mae_max: Sólo modelos con mae_cv <= mae_max
+        """
+        condiciones, valores = [], []
+        if dataset is not None:
+            condiciones.append("dataset = ?")
+            valores.append(dataset)
+        if mae_max is not None:
+            condiciones.append("mae_cv <= ?")
+            valores.append(mae_max)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        with closing(self._conectar()) as con:
+            return pd.read_sql_query(
+                f"SELECT nombre, sha256, dataset, mae_cv, fecha, modo_ajuste, bytes "
+                f"FROM modelos {where} ORDER BY nombre", con, params=valores)
+
+    def cargar(self, nombre):
+        """
+        Pipeline completo (se descomprime y des-serializa).
+        """
+        return joblib.load(self._ruta_objeto(self._registro(nombre)["sha256"]))
+
+    def cargar_arboles(self, nombre):
+        """
+        Arreglos del bosque aplanado con memoria mapeada (sólo lectura).
+
+        :raises ModeloNoEncontrado: si el modelo no existe o no es un RandomForest
+        """
+        carpeta = self._carpeta_arboles(self._registro(nombre)["sha256"])
+        if not os.path.isdir(carpeta):
+            raise ModeloNoEncontrado(nombre)
+        return {clave: np.load(os.path.join(carpeta, f"{clave}.npy"), mmap_mode="r") for clave in ARREGLOS}
+
+    def columnas(self, nombre):
+        """
+        Columnas de entrada del modelo (None si se entrenó sin nombres).
+        """
+        ruta = os.path.join(self._carpeta_arboles(self._registro(nombre)["sha256"]), "columnas.json")
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+
+    def uso_disco(self):
+        """
+        Bytes en disco de objetos comprimidos y arreglos.
+        """
+        total = {"objetos": 0, "arboles": 0}
+        for parte in total:
+            for raiz, _, archivos in os.walk(os.path.join(self.directorio, parte)):
+                total[parte] += sum(os.path.getsize(os.path.join(raiz, f)) for f in archivos)
+        return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Almacén de modelos direccionado por contenido")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_imp = sub.add_parser("importar", help="Registra las carpetas de .pkl/.json")
+    p_imp.add_argument("carpetas", nargs="+")
+    p_lis = sub.add_parser("listar", help="Lista el índice")
+    p_lis.add_argument("--dataset", default=None)
+    p_lis.add_argument("--mae-max", type=float, default=None)
+    args = parser.parse_args()
+
+    almacen = AlmacenModelos()
+    if args.comando == "importar":
+        for carpeta in args.carpetas:
+            for nombre, sha in almacen.importar(carpeta):
+                print(f" ✓ {nombre} → {sha[:12]}")
+        print(f"Uso en disco: {almacen.uso_disco()}")
+    else:
+        print(almacen.listar(args.dataset, args.mae_max).to_string(index=False))
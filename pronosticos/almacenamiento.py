@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""
+almacenamiento.py
+
+Almacenamiento columnar (Parquet) de los consolidados y de las matrices de
+características, como alternativa a los CSV UTF-8-BOM.
+
+- Un archivo Parquet por año dentro de una carpeta por dataset
+  (p. ej. data/parquet/consolidado_exportaciones_pais/1997.parquet), de modo que
+  filtrar por años sólo abre los archivos necesarios.
+- Los nombres de país, categoría, clase y subcategoría se guardan como
+  categóricos (diccionario) y los números con el tipo más angosto que no pierde
+  información: enteros pequeños, flags 0/1 como uint8 y float32 sólo cuando la
+  conversión es exacta.
+- Los lectores aceptan proyección de columnas (`columnas`) y filtro de años (`anios`).
+- Cada dataset guarda en fuente.json la huella (ruta, mtime, tamaño) del CSV del que
+  se escribió. `cargar_dataset` sólo usa el Parquet si el CSV sigue siendo ése: si
+  el CSV se reescribió sin `--parquet` (o se lee otra carpeta), se lee el CSV.
+
+Uso:
+    python -m pronosticos.almacenamiento   # convierte todos los CSV de data/ a Parquet
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import re
+import json
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+
+from pronosticos.consolidacion import DATA_DIR
+
+# Carpeta raíz de los datasets en Parquet
+PARQUET_DIR = os.path.join(DATA_DIR, "parquet")
+FEATURES_DIR = os.path.join(DATA_DIR, "feature-engineering")
+
+COLUMNAS_CATEGORICAS = ["NombrePais", "Categoria", "Clase", "SubCategoria"]
+
+# Columna que define la partición por año, en orden de preferencia
+COLUMNAS_ANIO = ["AñoArchivo", "Year"]
+
+# Huella del CSV de origen, dentro de la carpeta de cada dataset
+FUENTE = "fuente.json"
+
+
+def columna_anio(df):
+    """
+    Devuelve la columna de año con la que se particiona el DataFrame.
+    """
+    for col in COLUMNAS_ANIO:
+        if col in df.columns:
+            return col
+    raise ValueError(f"No se encontró columna de año ({COLUMNAS_ANIO}) en: {df.columns.tolist()}")
+
+
+def optimizar_tipos(df):
+    """
+    Convierte las columnas a tipos compactos sin perder información.
+
+    - Columnas de texto conocidas → category.
+    - Enteros → el entero más angosto que contiene el rango.
+    - Columnas float con sólo 0/1 (dummies) → uint8.
+    - Otros float → float32 únicamente si el valor se recupera exacto.
+    - 'Fecha' → datetime64.
+
+    :param df: DataFrame leído del CSV
+    :return: Nuevo DataFrame con tipos optimizados
+    """
+    df = df.copy()
+    for col in df.columns:
+        serie = df[col]
+        if col in COLUMNAS_CATEGORICAS:
+            df[col] = serie.astype("category")
+        elif col == "Fecha":
+            df[col] = pd.to_datetime(serie)
+        elif pd.api.types.is_integer_dtype(serie):
+            df[col] = pd.to_numeric(serie, downcast="integer")
+        elif pd.api.types.is_float_dtype(serie) and serie.notna().all():
+            valores = serie.to_numpy()
+            if np.isin(valores, (0.0, 1.0)).all():
+                df[col] = serie.astype(np.uint8)
+            elif np.array_equal(valores.astype(np.float32).astype(np.float64), valores):
+                df[col] = serie.astype(np.float32)
+    return df
+
+
+def huella_csv(ruta):
+    """
+    Ruta absoluta, mtime y tamaño de un CSV (None si no existe).
+    """
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return {"ruta": os.path.abspath(ruta), "mtime_ns": info.st_mtime_ns, "tamano": info.st_size}
+
+
+def parquet_vigente(destino, ruta_csv):
+    """
+    True si el dataset Parquet existe y corresponde al CSV actual (o si no hay CSV).
+    """
+    if not anios_disponibles(destino):
+        return False
+    actual = huella_csv(ruta_csv)
+    if actual is None:
+        return True
+    try:
+        with open(os.path.join(destino, FUENTE), encoding="utf-8") as f:
+            return json.load(f) == actual
+    except (OSError, ValueError):
+        return False
+
+
+def escribir_parquet(df, destino, optimizar=True, fuente=None):
+    """
+    Escribe un DataFrame como un Parquet por año en la carpeta `destino`.
+
+    La carpeta se reemplaza completa, así que no quedan años de escrituras anteriores.
+
+    :param df: DataFrame a guardar
+    :param destino: Carpeta del dataset
+    :param optimizar: Aplica `optimizar_tipos` antes de escribir
+    :param fuente: CSV con el mismo contenido; su huella se guarda en fuente.json
+    :return: Lista de años escritos
+    """
+    if optimizar:
+        df = optimizar_tipos(df)
+    col = columna_anio(df)
+
+    temporal = destino + ".part"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    anios = sorted(int(a) for a in df[col].unique())
+    for anio, grupo in df.groupby(col, sort=True, observed=True):
+        tabla = pa.Table.from_pandas(grupo, preserve_index=False)
+        pq.write_table(tabla, os.path.join(temporal, f"{int(anio)}.parquet"), compression="zstd")
+    if fuente is not None:
+        with open(os.path.join(temporal, FUENTE), "w", encoding="utf-8") as f:
+            json.dump(huella_csv(fuente), f)
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporal, destino)
+    return anios
+
+
+def anios_disponibles(destino):
+    """
+    Lista los años (particiones) de un dataset Parquet.
+    """
+    return sorted(
+        int(m.group(1)) for f in glob.glob(os.path.join(destino, "*.parquet"))
+        if (m := re.fullmatch(r"(\d{4})\.parquet", os.path.basename(f)))
+    )
+
+
+def leer_parquet(destino, columnas=None, anios=None):
+    """
+    Lee un dataset Parquet particionado por año.
+
+    :param destino: Carpeta del dataset
+    :param columnas: Columnas a leer (None = todas); sólo se decodifican éstas
+    :param anios: Años a incluir (None = todos); sólo se abren esos archivos
+    :return: DataFrame con categóricos y tipos angostos (vacío si ningún año coincide)
+    :raises FileNotFoundError: si el dataset no tiene particiones
+    """
+    disponibles = anios_disponibles(destino)
+    if not disponibles:
+        raise FileNotFoundError(f"Sin particiones en {destino}")
+    seleccion = disponibles
+    if anios is not None:
+        pedidos = set(anios)
+        seleccion = [a for a in disponibles if a in pedidos]
+    if not seleccion:
+        # Mismas columnas y tipos que una lectura con datos
+        esquema = pq.read_schema(os.path.join(destino, f"{disponibles[0]}.parquet"))
+        return esquema.empty_table().select(columnas or esquema.names).to_pandas()
+
+    archivos = [os.path.join(destino, f"{a}.parquet") for a in seleccion]
+    tabla = ds.dataset(archivos, format="parquet").to_table(columns=columnas)
+    # Cada año trae su propio diccionario de categorías; se unifican antes de convertir
+    return tabla.unify_dictionaries().to_pandas()
+
+
+def ruta_dataset(nombre):
+    """
+    Carpeta Parquet de un dataset a partir del nombre de su CSV (con o sin extensión).
+    """
+    return os.path.join(PARQUET_DIR, os.path.splitext(os.path.basename(nombre))[0])
+
+
+def cargar_dataset(nombre, columnas=None, anios=None, directorio=DATA_DIR):
+    """
+    Carga un consolidado o matriz de características, prefiriendo su versión Parquet.
+
+    Si no existe el Parquet, o no corresponde al CSV actual (ver `parquet_vigente`),
+    se lee el CSV original (filtro por año y luego proyección, en memoria), de modo
+    que los consumidores funcionan con cualquiera de los dos: mismas columnas en el
+    orden pedido y un DataFrame vacío si ningún año coincide.
+
+    :param nombre: Nombre del CSV (p. ej. 'consolidado_exportaciones_pais.csv')
+    :param columnas: Columnas a leer
+    :param anios: Años a incluir
+    :param directorio: Carpeta del CSV
+    """
+    destino = ruta_dataset(nombre)
+    ruta_csv = os.path.join(directorio, nombre)
+    if parquet_vigente(destino, ruta_csv):
+        return leer_parquet(destino, columnas, anios)
+
+    lectura = columnas
+    if anios is not None and columnas is not None:
+        # El filtro necesita la columna de año aunque no se haya pedido
+        anio = columna_anio(pd.read_csv(ruta_csv, encoding="utf-8-sig", nrows=0))
+        lectura = list(dict.fromkeys([*columnas, anio]))
+    df = pd.read_csv(ruta_csv, encoding="utf-8-sig", usecols=lectura)
+    if anios is not None:
+        df = df[df[columna_anio(df)].isin(list(anios))].reset_index(drop=True)
+    return df if columnas is None else df[list(columnas)]
+
+
+def csv_a_parquet(ruta_csv):
+    """
+    Convierte un CSV consolidado o de características a su dataset Parquet.
+
+    :return: (carpeta destino, número de filas)
+    """
+    df = pd.read_csv(ruta_csv, encoding="utf-8-sig")
+    destino = ruta_dataset(ruta_csv)
+    escribir_parquet(df, destino, fuente=ruta_csv)
+    return destino, len(df)
+
+
+def convertir_todo():
+    """
+    Convierte a Parquet todos los consolidados de data/ y las matrices de data/feature-engineering/.
+    """
+    rutas = sorted(glob.glob(os.path.join(DATA_DIR, "consolidado_*.csv")))
+    rutas += sorted(glob.glob(os.path.join(FEATURES_DIR, "*_features.csv")))
+    for ruta in rutas:
+        destino, filas = csv_a_parquet(ruta)
+        print(f" ✓ {os.path.basename(ruta)} → {os.path.relpath(destino, DATA_DIR)} ({filas} filas)")
+
+
+if __name__ == "__main__":
+    convertir_todo()
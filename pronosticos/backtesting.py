@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+"""
+backtesting.py
+
+Evaluación con origen móvil (*rolling origin*) de los modelos de entrenamiento.py,
+en lugar de los tres años sueltos de `backcast_years`.
+
+Para cada serie (total de cada país del top, los cuatro consolidados y, con
+`--global`, cada país del modelo global) y cada mes desde DESDE como origen:
+
+1. se entrena con los registros cuya Fecha es <= origen, con los hiper-parámetros
+   del modelo guardado (models/<nombre>.json) y sus mismas columnas; sin modelo
+   guardado se usa `make_rf_pipeline()`;
+2. se predicen todos los registros de los HORIZONTE meses siguientes y se anota el
+   error de cada uno con su horizonte (meses entre el origen y la Fecha).
+
+Reuso de ajustes:
+- Los orígenes con el mismo conjunto de entrenamiento comparten un solo ajuste (las
+  series por país tienen un registro por año, así que doce orígenes seguidos
+  entrenan con los mismos datos).
+- Cada ajuste pasa por `cache_cv`: repetir el backtest, o ampliarlo a más orígenes,
+  sólo entrena lo nuevo.
+- Todos los registros de prueba de los orígenes que comparten ajuste se predicen
+  con un solo `predict` del bosque compilado (inferencia.py).
+
+Las series se reparten en un pool de procesos con el mismo presupuesto de núcleos
+por unidad que orquestador.py.
+
+Salidas en resultados/:
+- backtest.csv: Modelo | Serie | Horizonte | N | MAE | MAPE | Sesgo
+- backtest_detalle.csv: un renglón por (origen, registro) con Real y Pred
+- backtest_tiempos.csv: orígenes, ajustes y segundos por unidad
+
+Uso:
+    python -m pronosticos.backtesting [--desde 2018-01] [--horizonte 12] [--top 10]
+                                      [--procesos N] [--nucleos-por-unidad K] [--global]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import time
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.exceptions import InconsistentVersionWarning
+from threadpoolctl import threadpool_limits
+
+from pronosticos import cache_cv
+from pronosticos import entrenamiento as ent
+from pronosticos.inferencia import compilar
+
+# Primer origen (AAAA-MM) y meses hacia adelante que se evalúan desde cada origen
+DESDE = "2018-01"
+HORIZONTE = 12
+
+# Ajustes que se tienen en memoria a la vez (cada uno es un bosque completo)
+LOTE_AJUSTES = 8
+
+ARCHIVO_RESUMEN = "backtest.csv"
+ARCHIVO_DETALLE = "backtest_detalle.csv"
+ARCHIVO_TIEMPOS = "backtest_tiempos.csv"
+
+# Orden de despacho: las unidades más largas primero
+COSTO_TIPO = {"global": 3.0, "consolidado": 2.0, "pais": 1.0}
+
+# DataFrame de países cargado una vez por proceso
+_df_paises = None
+
+
+def _paises():
+    global _df_paises
+    if _df_paises is None:
+        _df_paises = ent.cargar_paises()
+    return _df_paises
+
+
+def _inicializar(nucleos):
+    ent.configurar_nucleos(nucleos)
+    threadpool_limits(limits=nucleos)
+
+
+def mes_absoluto(fechas):
+    """
+    Número de mes (año × 12 + mes - 1) de cada fecha; la resta de dos da el horizonte.
+    """
+    fechas = pd.to_datetime(pd.Series(fechas))
+    return (fechas.dt.year * 12 + fechas.dt.month - 1).to_numpy()
+
+
+def texto_mes(meses):
+    """
+    Inverso de `mes_absoluto` como texto AAAA-MM.
+    """
+    meses = np.asarray(meses)
+    return pd.Series([f"{m // 12:04d}-{m % 12 + 1:02d}" for m in meses])
+
+
+def etiqueta(unidad):
+    """
+    Nombre legible de una unidad (llave en backtest_tiempos.csv).
+    """
+    if unidad[0] == "consolidado":
+        return f"consolidado|{unidad[3]}"
+    return "|".join(unidad)
+
+
+def datos_serie(unidad):
+    """
+    Datos de una unidad con la misma preparación que su entrenamiento.
+
+    :return: (nombre del modelo, mes de cada registro, X, y, serie de cada registro)
+        o None si no hay datos
+    """
+    tipo = unidad[0]
+    if tipo == "pais":
+        datos = ent.preparar_pais_total(_paises(), unidad[1])
+        nombre = ent.id_modelo_pais(unidad[1])
+    elif tipo == "global":
+        datos = ent.preparar_global(_paises())
+        nombre = ent.MODELO_GLOBAL
+    else:
+        _, archivo, target, nombre = unidad
+        datos = ent.preparar_consolidado(archivo, target)
+    if datos is None:
+        return None
+
+    df, X, y = datos
+    serie = df["NombrePais"].to_numpy() if tipo in ("pais", "global") else np.full(len(df), nombre)
+    return nombre, mes_absoluto(df["Fecha"]), X, y, serie
+
+
+def estimador(nombre, X):
+    """
+    Pipeline sin ajustar con los hiper-parámetros de models/<nombre>.json y X
+    restringida a las columnas del modelo guardado (como `ajustar_modelo`).
+    """
+    pipe = ent.make_rf_pipeline()
+    with warnings.catch_warnings():
+        # Sólo se leen columnas e hiper-parámetros de pickles de otra versión de sklearn
+        warnings.simplefilter("ignore", InconsistentVersionWarning)
+        guardado = ent.cargar_modelo_guardado(nombre)
+    if guardado is None:
+        return pipe, X
+    pipe_prev, meta = guardado
+    pipe.set_params(**ent.hiperparametros_guardados(meta))
+    columnas = list(getattr(pipe_prev, "feature_names_in_", []))
+    if columnas and set(columnas) <= set(X.columns):
+        X = X[columnas]
+    return pipe, X
+
+
+def plan_origenes(meses, desde=DESDE, horizonte=HORIZONTE, minimo=2 * ent.N_SPLITS):
+    """
+    Orígenes mensuales desde `desde` agrupados por conjunto de entrenamiento.
+
+    :param meses: Mes (`mes_absoluto`) de cada registro
+    :param minimo: Registros mínimos de entrenamiento para evaluar un origen
+    :return: Lista de (índices de entrenamiento, [(origen, índices de prueba), ...])
+    """
+    grupos = {}
+    for origen in range(mes_absoluto([desde])[0], int(meses.max())):
+        entrenamiento = np.flatnonzero(meses <= origen)
+        prueba = np.flatnonzero((meses > origen) & (meses <= origen + horizonte))
+        if len(entrenamiento) < minimo or not len(prueba):
+            continue
+        grupos.setdefault(entrenamiento.tobytes(), (entrenamiento, []))[1].append((origen, prueba))
+    return list(grupos.values())
+
+
+def evaluar_serie(unidad, desde=DESDE, horizonte=HORIZONTE):
+    """
+    Backtest de una unidad.
+
+    :return: (unidad, DataFrame de detalle, dict de tiempos)
+    """
+    inicio = time.perf_counter()
+    datos = datos_serie(unidad)
+    if datos is None:
+        return unidad, pd.DataFrame(), {"Unidad": etiqueta(unidad), "Origenes": 0, "Ajustes": 0,
+                                        "Segundos": 0.0}
+    nombre, meses, X, y, serie = datos
+    pipe, X = estimador(nombre, X)
+    plan = plan_origenes(meses, desde, horizonte)
+    real = y.to_numpy()
+
+    partes = []
+    for i in range(0, len(plan), LOTE_AJUSTES):
+        lote = plan[i:i + LOTE_AJUSTES]
+        vacio = np.array([], dtype=np.int64)
+        ajustes = cache_cv.evaluar_folds([(pipe, entrenamiento, vacio) for entrenamiento, _ in lote],
+                                         X, y, ent.SCORING, n_jobs=ent.N_JOBS)
+        for (_, origenes), ajuste in zip(lote, ajustes):
+            # Un predict para la unión de los registros de prueba de estos orígenes
+            union = np.unique(np.concatenate([prueba for _, prueba in origenes]))
+            pred = np.empty(len(real))
+            pred[union] = compilar(ajuste["modelo"]).predict(X.iloc[union])
+            for origen, prueba in origenes:
+                partes.append(pd.DataFrame({
+                    "Modelo": nombre,
+                    "Serie": serie[prueba],
+                    "Origen": origen,
+                    "Mes": meses[prueba],
+                    "Real": real[prueba],
+                    "Pred": pred[prueba],
+                }))
+
+    detalle = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    info = {"Unidad": etiqueta(unidad), "Origenes": sum(len(o) for _, o in plan),
+            "Ajustes": len(plan), "Segundos": round(time.perf_counter() - inicio, 3)}
+    return unidad, detalle, info
+
+
+def resumir(detalle):
+    """
+    Errores por Modelo × Serie × Horizonte: N, MAE, MAPE (%, sin reales en 0) y
+    Sesgo (promedio de Pred - Real).
+    """
+    error = detalle["Pred"] - detalle["Real"]
+    abs_pct = (error.abs() / detalle["Real"].abs()).where(detalle["Real"] != 0) * 100
+    return (detalle.assign(Error=error, AbsError=error.abs(), AbsPct=abs_pct)
+                   .groupby(["Modelo", "Serie", "Horizonte"], sort=True)
+                   .agg(N=("Error", "size"), MAE=("AbsError", "mean"),
+                        MAPE=("AbsPct", "mean"), Sesgo=("Error", "mean"))
+                   .reset_index())
+
+
+def planear(top=10, global_paises=False):
+    """
+    Unidades a evaluar: total de cada país del top, consolidados y, si se pide,
+    el modelo global.
+    """
+    unidades = [("pais", p) for p in ent.top_paises(_paises(), top)]
+    unidades += [("consolidado", *c) for c in ent.CONSOLIDADOS]
+    if global_paises:
+        unidades.append(("global",))
+    return sorted(unidades, key=lambda u: COSTO_TIPO[u[0]], reverse=True)
+
+
+def ejecutar_backtest(desde=DESDE, horizonte=HORIZONTE, top=10, procesos=None,
+                      nucleos_por_unidad=1, global_paises=False):
+    """
+    Corre el backtest de todas las unidades en paralelo y escribe las salidas.
+
+    :param desde: Primer origen (AAAA-MM)
+    :param horizonte: Meses evaluados después de cada origen
+    :param top: Número de países con modelo individual
+    :param procesos: Procesos del pool; None = cpu_count // nucleos_por_unidad
+    :param nucleos_por_unidad: Núcleos por unidad (ajustes en paralelo)
+    :param global_paises: Incluir el modelo global (todos los países)
+    :return: DataFrame resumen (backtest.csv)
+    """
+    ent.preparar_directorios()
+    nucleos_por_unidad = max(1, nucleos_por_unidad)
+    procesos = procesos or max(1, (os.cpu_count() or 1) // nucleos_por_unidad)
+
+    inicio = time.perf_counter()
+    ent.asegurar_features_paises()
+    unidades = planear(top, global_paises)
+    print(f"{len(unidades)} unidades | orígenes desde {desde}, horizonte {horizonte} meses | "
+          f"{procesos} procesos × {nucleos_por_unidad} núcleo(s)")
+
+    detalles, tiempos = [], []
+    if procesos == 1:
+        _inicializar(nucleos_por_unidad)
+        salidas = (evaluar_serie(u, desde, horizonte) for u in unidades)
+        for _, detalle, info in salidas:
+            detalles.append(detalle)
+            tiempos.append(info)
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar,
+                                 initargs=(nucleos_por_unidad,)) as pool:
+            futuros = [pool.submit(evaluar_serie, u, desde, horizonte) for u in unidades]
+            for futuro in as_completed(futuros):
+                _, detalle, info = futuro.result()
+                detalles.append(detalle)
+                tiempos.append(info)
+
+    detalles = [d for d in detalles if not d.empty]
+    if not detalles:
+        # Sin registros de prueba después de ningún origen (p. ej. `desde` posterior a ANIO_CORTE)
+        print(f"Ningún origen desde {desde} tiene meses de prueba (datos hasta {ent.ANIO_CORTE}).")
+        return pd.DataFrame()
+    detalle = pd.concat(detalles, ignore_index=True)
+    detalle["Horizonte"] = detalle["Mes"] - detalle["Origen"]
+    resumen = resumir(detalle)
+    detalle["Origen"] = texto_mes(detalle["Origen"])
+    detalle["Mes"] = texto_mes(detalle["Mes"])
+
+    resumen.to_csv(ent.RESULT_PATH / ARCHIVO_RESUMEN, index=False)
+    detalle.to_csv(ent.RESULT_PATH / ARCHIVO_DETALLE, index=False)
+    df_tiempos = pd.DataFrame(tiempos).sort_values("Segundos", ascending=False)
+    df_tiempos.to_csv(ent.RESULT_PATH / ARCHIVO_TIEMPOS, index=False)
+
+    pared = time.perf_counter() - inicio
+    print(resumen.groupby(["Modelo", "Horizonte"])["MAE"].mean().unstack("Horizonte")
+                 .to_string(float_format=lambda v: f"{v:,.0f}"))
+    print(f"\n{df_tiempos['Origenes'].sum():,} orígenes × serie con {df_tiempos['Ajustes'].sum():,} ajustes | "
+          f"{len(detalle):,} predicciones | tiempo total: {pared:,.1f} s")
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest con origen móvil de todos los modelos")
+    parser.add_argument("--desde", default=DESDE, help="Primer origen (AAAA-MM)")
+    parser.add_argument("--horizonte", type=int, default=HORIZONTE, help="Meses evaluados por origen")
+    parser.add_argument("--top", type=int, default=10, help="Países con modelo individual")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos del pool (por omisión: núcleos / núcleos por unidad)")
+    parser.add_argument("--nucleos-por-unidad", type=int, default=1,
+                        help="Núcleos por unidad para los ajustes")
+    parser.add_argument("--global", dest="global_paises", action="store_true",
+                        help="Incluir el modelo global (todos los países)")
+    args = parser.parse_args()
+    ejecutar_backtest(args.desde, args.horizonte, args.top, args.procesos,
+                      args.nucleos_por_unidad, args.global_paises)
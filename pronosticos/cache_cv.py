@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""
+cache_cv.py
+
+Caché en disco, direccionado por contenido, de los folds de validación cruzada.
+
+Un mismo `run_pais_total` valida los mismos datos varias veces (baseline, búsqueda,
+segunda búsqueda tras depurar banderas, curva de aprendizaje) y cada corrida del
+flujo repite todo. Aquí cada ajuste de un fold se identifica por:
+
+- la huella de los datos (valores y nombres de columnas de X, valores de y);
+- los parámetros del estimador (clases y parámetros, sin n_jobs/verbose);
+- los índices de entrenamiento y prueba del fold.
+
+Con la misma llave se devuelve el puntaje de prueba, el de entrenamiento y el modelo
+ajustado del fold sin volver a entrenarlo. Los folds que coinciden entre llamadas
+(p. ej. el primer fold de la búsqueda y el mayor tamaño de ese fold en la curva de
+aprendizaje, o el baseline y la búsqueda repetida tras depurar banderas) se ajustan
+una sola vez.
+
+Cada entrada es un archivo joblib en CACHE_DIR/<2 hex>/<sha256>.joblib. Al leer una
+entrada se actualiza su mtime y, cuando el caché rebasa MAX_MB, se eliminan las
+menos usadas recientemente. Varios procesos pueden compartir la carpeta: las
+escrituras son atómicas y una entrada que desaparece se trata como fallo.
+
+Cada ajuste real (no los aciertos del caché) se registra como tramo
+"entrenamiento.ajuste" (ver telemetria.py), con tipo "cv" o "completo".
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import json
+import hashlib
+from types import FunctionType
+
+import numpy as np
+import pandas as pd
+import joblib
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, clone
+from sklearn.metrics import get_scorer
+
+from pronosticos.consolidacion import DATA_DIR
+from pronosticos.telemetria import tramo
+
+CACHE_DIR = os.getenv("PRONOSTICO_CACHE_CV_DIR", os.path.join(DATA_DIR, ".cache_cv"))
+MAX_MB = float(os.getenv("PRONOSTICO_CACHE_CV_MB", "512"))
+ACTIVO = os.getenv("PRONOSTICO_CACHE_CV", "1") != "0"
+
+VERSION_CACHE = 2
+
+# Parámetros que no cambian el modelo ajustado
+_PARAMS_IGNORADOS = ("n_jobs", "verbose")
+
+
+def _como_pandas(y, indice=None):
+    # Serie si y es 1-D; DataFrame si es multisalida (n × k)
+    valores = np.asarray(y)
+    return pd.Series(valores, index=indice) if valores.ndim == 1 else pd.DataFrame(valores, index=indice)
+
+
+def huella_datos(X, y):
+    """
+    SHA-256 de los valores y columnas de X y de los valores de y (1-D o multisalida).
+    """
+    sha = hashlib.sha256()
+    sha.update(json.dumps([str(c) for c in X.columns]).encode())
+    sha.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    sha.update(pd.util.hash_pandas_object(_como_pandas(y), index=False).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def _valor_param(valor):
+    # Sin repr de objetos: el de un estimador incluye la dirección de sus funciones
+    # (p. ej. `steps` del Pipeline) y cambiaría la llave en cada proceso
+    if isinstance(valor, BaseEstimator):
+        return type(valor).__name__
+    if isinstance(valor, FunctionType):
+        return f"{valor.__module__}.{valor.__qualname__}"
+    if isinstance(valor, (list, tuple)):
+        return [_valor_param(v) for v in valor]
+    return repr(valor)
+
+
+def huella_estimador(estimador):
+    """
+    Texto estable con la clase y los parámetros del estimador (sin n_jobs ni verbose).
+    """
+    params = {
+        k: _valor_param(v) for k, v in estimador.get_params(deep=True).items()
+        if k.rsplit("__", 1)[-1] not in _PARAMS_IGNORADOS
+    }
+    return json.dumps([type(estimador).__name__, sorted(params.items())])
+
+
+def clave_fold(datos, estimador, entrenamiento, prueba, scoring):
+    """
+    Llave de un fold: datos + estimador + índices + métrica + versión de sklearn.
+    """
+    sha = hashlib.sha256()
+    for parte in (VERSION_CACHE, sklearn.__version__, datos, huella_estimador(estimador), scoring):
+        sha.update(str(parte).encode())
+        sha.update(b"\0")
+    sha.update(np.asarray(entrenamiento, dtype=np.int64).tobytes())
+    sha.update(b"\0")
+    sha.update(np.asarray(prueba, dtype=np.int64).tobytes())
+    return sha.hexdigest()
+
+
+def _ruta(clave, directorio):
+    return os.path.join(directorio, clave[:2], clave + ".joblib")
+
+
+def _leer(clave, directorio):
+    ruta = _ruta(clave, directorio)
+    try:
+        entrada = joblib.load(ruta)
+        os.utime(ruta)
+    except (OSError, EOFError, KeyError, ValueError, AttributeError, ImportError):
+        return None
+    return entrada
+
+
+def _escribir(clave, entrada, directorio):
+    ruta = _ruta(clave, directorio)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.part"
+    joblib.dump(entrada, temporal)
+    os.replace(temporal, ruta)
+
+
+def _nombre_estimador(estimador):
+    final = estimador.steps[-1][1] if hasattr(estimador, "steps") else estimador
+    return type(final).__name__
+
+
+def _ajustar_fold(estimador, X, y, entrenamiento, prueba, scoring):
+    # Mismo ajuste que cross_val_score / GridSearchCV / learning_curve para un fold
+    scorer = get_scorer(scoring)
+    etiquetas = {"tipo": "cv" if len(prueba) else "completo", "estimador": _nombre_estimador(estimador)}
+    with tramo("entrenamiento.ajuste", etiquetas, filas=len(entrenamiento), prueba=len(prueba)):
+        modelo = clone(estimador).fit(X.iloc[entrenamiento], y.iloc[entrenamiento])
+        return {
+            "prueba": float(scorer(modelo, X.iloc[prueba], y.iloc[prueba])) if len(prueba) else np.nan,
+            "entrenamiento": float(scorer(modelo, X.iloc[entrenamiento], y.iloc[entrenamiento])),
+            "modelo": modelo,
+        }
+
+
+def recortar(directorio=CACHE_DIR, max_mb=MAX_MB):
+    """
+    Elimina las entradas menos usadas recientemente hasta quedar bajo `max_mb`.
+
+    :return: Número de entradas eliminadas
+    """
+    entradas = []
+    for sub in (os.scandir(directorio) if os.path.isdir(directorio) else []):
+        if sub.is_dir():
+            for f in os.scandir(sub.path):
+                if f.name.endswith(".joblib"):
+                    try:
+                        info = f.stat()
+                    except FileNotFoundError:
+                        continue
+                    entradas.append((info.st_mtime_ns, info.st_size, f.path))
+
+    total = sum(e[1] for e in entradas)
+    limite = max_mb * 1e6
+    eliminadas = 0
+    for _, tamano, ruta in sorted(entradas):
+        if total <= limite:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+        eliminadas += 1
+    return eliminadas
+
+
+def evaluar_folds(tareas, X, y, scoring, n_jobs=None, directorio=CACHE_DIR, activo=None):
+    """
+    Ajusta (o recupera del caché) cada estimador en su fold.
+
+    :param tareas: Lista de (estimador sin ajustar, índices de entrenamiento, índices
+        de prueba); el estimador se clona. Una prueba vacía ajusta sobre los índices
+        de entrenamiento sin evaluar (refit final).
+    :param X: DataFrame de features
+    :param y: Serie objetivo (o DataFrame / arreglo n × k para modelos multisalida)
+    :param scoring: Nombre de la métrica de sklearn
+    :param n_jobs: Procesos joblib para las tareas que no están en caché
+    :param directorio: Carpeta del caché
+    :param activo: None usa ACTIVO (variable PRONOSTICO_CACHE_CV)
+    :return: Lista de dicts {prueba, entrenamiento, modelo} en el orden de `tareas`
+    """
+    activo = ACTIVO if activo is None else activo
+    y = _como_pandas(y, X.index)
+    resultados = [None] * len(tareas)
+    claves = [None] * len(tareas)
+
+    if activo:
+        datos = huella_datos(X, y)
+        for i, (estimador, entrenamiento, prueba) in enumerate(tareas):
+            claves[i] = clave_fold(datos, estimador, entrenamiento, prueba, scoring)
+            resultados[i] = _leer(claves[i], directorio)
+
+    pendientes = [i for i, r in enumerate(resultados) if r is None]
+    if pendientes:
+        ajustes = Parallel(n_jobs=n_jobs)(
+            delayed(_ajustar_fold)(estimador, X, y, entrenamiento, prueba, scoring)
+            for estimador, entrenamiento, prueba in (tareas[i] for i in pendientes)
+        )
+        for i, entrada in zip(pendientes, ajustes):
+            resultados[i] = entrada
+            if activo:
+                _escribir(claves[i], entrada, directorio)
+        if activo:
+            recortar(directorio)
+    return resultados
+
+
+def puntajes_cv(estimador, X, y, folds, scoring, n_jobs=None):
+    """
+    Puntajes de prueba por fold (equivalente cacheado de `cross_val_score`).
+    """
+    tareas = [(estimador, entrenamiento, prueba) for entrenamiento, prueba in folds]
+    return np.array([r["prueba"] for r in evaluar_folds(tareas, X, y, scoring, n_jobs)])
+
+
+def ajustar_completo(estimador, X, y, scoring, n_jobs=None):
+    """
+    Estimador ajustado sobre todas las filas (refit final), también cacheado.
+    """
+    tarea = (estimador, np.arange(len(X)), np.array([], dtype=np.int64))
+    return evaluar_folds([tarea], X, y, scoring, n_jobs)[0]["modelo"]
@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+
+"""
+caracteristicas.py
+
+Ingeniería de características de notebook/feature_engineering.ipynb como módulo
+importable, con ajuste (fit) y aplicación (transform) separados.
+
+El estado ajustado (transformación elegida y lambda de Yeo-Johnson, StandardScaler,
+PCA, media/desviación de las banderas Out_*, categóricas elegidas por χ²/ANOVA,
+OneHotEncoders, columnas que sobreviven a VarianceThreshold y al filtro de
+colinealidad, y FactorAnalysis) se guarda junto a los CSV de características
+(data/feature-engineering/{nombre}_transformador.joblib).
+
+En una actualización mensual sólo se transforman los meses nuevos del consolidado
+y se agregan al CSV; el reajuste sobre toda la historia ocurre sólo si se pide
+(`refit=True`) o si se detecta deriva (ver `detectar_deriva`).
+
+Cada paso del ajuste y de la aplicación se registra como tramo
+"caracteristicas.paso" (ver telemetria.py).
+
+Con `compacto=True` la matriz se guarda en memoria con tipos angostos: banderas
+Out_* y One-Hot como uint8, medidas derivadas (transformadas, escaladas, PCA, FA)
+como float32 y texto como category; las medidas originales (objetivos) se quedan
+en float64. El RandomForest convierte X a float32 de todos modos, así que el
+modelo no cambia. El modo se guarda con el estado ajustado: el CSV sigue siendo
+texto y `compactar` vuelve a aplicar los tipos al leerlo (ver
+entrenamiento.cargar_paises); cambiar de modo reajusta sobre toda la historia.
+
+Uso:
+    python -m pronosticos.caracteristicas                 # actualiza todos los datasets
+    python -m pronosticos.caracteristicas --refit forma   # reajusta sólo 'forma'
+    python -m pronosticos.caracteristicas --compacto paises
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import argparse
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.stats import yeojohnson
+from sklearn.decomposition import FactorAnalysis, PCA
+from sklearn.feature_selection import VarianceThreshold, chi2, f_classif
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from pronosticos.consolidacion import DATA_DIR
+from pronosticos.telemetria import Cronometro
+
+FEATURES_DIR = os.path.join(DATA_DIR, "feature-engineering")
+
+FILES = {
+    "forma":      "consolidado_exportacionestotalforma.csv",
+    "categoria":  "consolidado_exportacionestotalcategoria.csv",
+    "produccion": "consolidado_producciontotaltequila.csv",
+    "agave":      "consolidado_consumodeagavetotal.csv",
+    "paises":     "consolidado_exportaciones_pais.csv",
+}
+
+# País ➜ continente (dataset "paises")
+CONTINENTE_MAP = {
+    "ESTADOS UNIDOS DE AMERICA": "América", "CANADA": "América",
+    "BRASIL": "América", "ALEMANIA": "Europa", "FRANCIA": "Europa",
+    "REINO UNIDO": "Europa", "ESPAÑA": "Europa", "CHINA": "Asia", "JAPON": "Asia",
+}
+
+LOW_VAR_THRESHOLD   = 0.01   # umbral de varianza
+HIGH_CORR_THRESHOLD = 0.95   # umbral de colinealidad
+Z_OUTLIER           = 3      # |z| a partir del cual se marca Out_*
+
+# Deriva: desplazamiento de la media de los meses nuevos (en desviaciones estándar
+# del ajuste) y proporción de filas nuevas a partir de las cuales se reajusta todo
+UMBRAL_DERIVA = 3.0
+UMBRAL_FILAS_NUEVAS = 0.25
+
+COLUMNAS_PAIS = ["Total_Pais_Mes", "Total_Categoria_Mes", "Litros 40 % Alc. Vol"]
+
+# Abreviaturas de mes tal como las genera strftime("%b")
+MESES_ABREV = np.array(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
+
+
+# ─────────────────────────── Funciones auxiliares ───────────────────────────
+
+def _best_transform(series):
+    """
+    Elige la transformación más "simétrica" (menor skew) entre original, log1p,
+    sqrt y Yeo-Johnson.
+
+    :return: (serie transformada, nombre, lambda de Yeo-Johnson o None)
+    """
+    yj_val, lmbda = yeojohnson(series.values)
+    cands = {
+        "orig": (series, None),
+        "log":  (np.log1p(series), None) if (series > 0).all() else None,
+        "sqrt": (np.sqrt(series.clip(lower=0)), None),
+        "yj":   (pd.Series(yj_val, index=series.index), lmbda),
+    }
+    cands = {k: v for k, v in cands.items() if v is not None}
+    best_k, (best_s, best_l) = min(cands.items(), key=lambda kv: abs(pd.Series(kv[1][0]).skew()))
+    return best_s, best_k, best_l
+
+
+def aplicar_transformacion(series, nombre, lmbda=None):
+    """
+    Aplica una transformación ya elegida por `_best_transform`.
+    """
+    if nombre == "log":
+        return np.log1p(series)
+    if nombre == "sqrt":
+        return np.sqrt(series.clip(lower=0))
+    if nombre == "yj":
+        return pd.Series(yeojohnson(series.values.astype(float), lmbda), index=series.index)
+    return series
+
+
+def _remove_high_corr(df, target=None):
+    """Devuelve columnas con |ρ|>HIGH_CORR_THRESHOLD (exceptúa *target*)."""
+    corr  = df.corr(numeric_only=True).abs()
+    upper = corr.where(np.triu(np.ones(corr.shape), k=1).astype(bool))
+    return [c for c in upper.columns if any(upper[c] > HIGH_CORR_THRESHOLD) and c != target]
+
+
+def _chi2_anova(df, cat, num):
+    """Calcula p-values χ² (cat vs num discret.) y ANOVA (cat vs num cont.)."""
+    y_disc = pd.qcut(df[num], q=4, labels=False, duplicates="drop")
+    dummies = pd.get_dummies(df[cat])
+    chi_p  = chi2(dummies, y_disc)[1].min()
+    anova_p = f_classif(dummies, df[num])[1].min()
+    return chi_p, anova_p
+
+
+def variables_temporales(df, nombre):
+    """
+    Paso 1 del notebook: Fecha, Mes, Trimestre, Anio y Decada. En los datasets por
+    categoría se quitan las filas 'Total'.
+
+    A diferencia del notebook, 'Fecha' se conserva (no es numérica, así que no entra
+    en ningún paso posterior) para saber qué meses ya están en el CSV de características.
+    Todo se calcula vectorizado a partir de AñoArchivo y Mes (sin formatear fechas fila
+    por fila).
+    """
+    df = df.copy()
+    anio = df["AñoArchivo"].to_numpy()
+    mes = df["Mes"].to_numpy()
+    df["Fecha"]     = pd.to_datetime(pd.DataFrame({"year": anio, "month": mes, "day": 1}, index=df.index))
+    df["Mes"]       = MESES_ABREV[mes - 1]
+    df["Trimestre"] = df["AñoArchivo"].astype(str) + "Q" + pd.Series((mes - 1) // 3 + 1, index=df.index).astype(str)
+    df["Anio"]      = anio
+    df["Decada"]    = (df["Anio"] // 10 * 10).astype(str) + "s"
+
+    if nombre != "paises":
+        df = df[df["SubCategoria"] != "Total"]
+    if nombre == "paises":
+        df["Continente"] = df["NombrePais"].map(CONTINENTE_MAP).fillna("Otro")
+    return df
+
+
+def _ohe(categories="auto", dtype=np.float64):
+    return OneHotEncoder(drop="first", sparse_output=False, handle_unknown="ignore",
+                         categories=categories, dtype=dtype)
+
+
+# ─────────────────────────── Transformador ───────────────────────────
+
+class TransformadorCaracteristicas:
+    """
+    Pasos 2-8 del notebook con estado persistente.
+
+    :param nombre: Dataset ('forma', 'categoria', 'produccion', 'agave' o 'paises')
+    :param compacto: Devuelve banderas/One-Hot en uint8 y medidas derivadas en float32
+    """
+
+    # Valor por omisión para estados guardados antes de existir la opción
+    compacto = False
+
+    def __init__(self, nombre, compacto=False):
+        self.nombre = nombre
+        self.compacto = compacto
+        self.ajustado = None
+        self.filas_ajuste = 0
+        self.filas_agregadas = 0
+
+    @property
+    def medidas(self):
+        return COLUMNAS_PAIS if self.nombre == "paises" else ["Valor"]
+
+    @property
+    def target(self):
+        return self.medidas[0]
+
+    # ── Ajuste ──
+
+    def fit_transform(self, df):
+        """
+        Ajusta todos los pasos sobre `df` (consolidado con variables temporales) y
+        devuelve la matriz de características.
+        """
+        df = df.copy()
+        tgt = self.target
+        pasos = Cronometro("caracteristicas.paso", {"dataset": self.nombre, "modo": "ajuste"}, filas=len(df))
+
+        # 2. Transformaciones numéricas + escalado + PCA
+        self.transformaciones_ = {}
+        for col in self.medidas:
+            best_s, trans_name, lmbda = _best_transform(df[col])
+            scaler = StandardScaler().fit(best_s.to_frame())
+            self.transformaciones_[col] = (trans_name, lmbda, scaler)
+            df[f"{col}_{trans_name}"]     = best_s
+            df[f"{col}_{trans_name}_Esc"] = scaler.transform(best_s.to_frame())[:, 0]
+
+        self.esc_cols_ = [c for c in df.columns if c.endswith("_Esc")]
+        n_pca = 1 if self.nombre != "paises" else (3 if len(self.esc_cols_) >= 3 else 0)
+        self.pca_ = PCA(n_components=n_pca).fit(df[self.esc_cols_]) if n_pca else None
+        if self.pca_ is not None:
+            df[self._pca_cols()] = self.pca_.transform(df[self.esc_cols_])
+        pasos.marca("transformaciones")
+
+        # 3. Banderas de outliers (media y desviación del ajuste)
+        numericas = df.select_dtypes("number")
+        self.outliers_ = {c: (numericas[c].mean(), numericas[c].std()) for c in numericas.columns}
+        df = self._banderas_outliers(df)
+        pasos.marca("banderas_outliers")
+
+        # 4. χ² / ANOVA para categóricas originales
+        cat_orig = ["Categoria", "Clase"] if self.nombre == "paises" else ["Trimestre", "SubCategoria"]
+        cat_orig.append("Mes")
+        cat_orig += [c for c in ["Continente"] if c in df.columns and c not in cat_orig]
+
+        self.estadisticas_ = []
+        quitar = []
+        for cat in cat_orig:
+            if cat not in df.columns:
+                continue
+            chi_p, anova_p = _chi2_anova(df, cat, tgt)
+            self.estadisticas_.append({"dataset": self.nombre, "cat": cat,
+                                       "chi2_p": round(chi_p, 4), "anova_p": round(anova_p, 4)})
+            if chi_p > 0.05 and anova_p > 0.05:
+                quitar.append(cat)
+        pasos.marca("chi2_anova")
+
+        # 5. One-Hot Encoding de categóricas relevantes
+        self.cat_cols_ = [c for c in cat_orig if c not in quitar]
+        self.ohe_ = _ohe(dtype=self._tipo_bandera()).fit(df[self.cat_cols_]) if self.cat_cols_ else None
+        df = self._one_hot(df)
+        pasos.marca("one_hot")
+
+        # 6. Filtro de varianza
+        num_block = df.select_dtypes("number").fillna(0)
+        vt = VarianceThreshold(LOW_VAR_THRESHOLD).fit(num_block)
+        self.num_keep_ = num_block.columns[vt.get_support()].tolist()
+        self.no_num_ = [c for c in df.columns if c not in num_block.columns]
+        df = df[self.num_keep_ + self.no_num_]
+        pasos.marca("varianza")
+
+        # 5.a One-Hot de la década, incluyendo la siguiente para no borrarla
+        self.ohe_decada_ = None
+        if self.nombre != "paises":
+            categorias = df["Decada"].unique().tolist()
+            categorias.append(f"{(df['Anio'].max() + 10) // 10 * 10}s")
+            self.ohe_decada_ = _ohe(categories=[categorias], dtype=self._tipo_bandera()).fit(df[["Decada"]])
+            df = self._decada(df)
+            pasos.marca("decada")
+
+        # 7. Filtro de colinealidad
+        self.corr_drop_ = _remove_high_corr(df, target=tgt if tgt in df.columns else None)
+        df = df.drop(columns=self.corr_drop_)
+        pasos.marca("colinealidad")
+
+        # 8. Factor Analysis (si ≥5 numéricas)
+        self.fa_cols_ = df.select_dtypes("number").columns.tolist()
+        self.fa_ = None
+        if len(self.fa_cols_) >= 5:
+            self.fa_ = FactorAnalysis(n_components=min(3, len(self.fa_cols_)), random_state=0)
+            df[self._fa_cols()] = self.fa_.fit_transform(df[self.fa_cols_])
+        pasos.marca("factor_analysis")
+
+        df = self._compactar(df)
+        pasos.marca("compactar")
+        self.columnas_ = df.columns.tolist()
+        self.ajustado = datetime.now().isoformat(timespec="seconds")
+        self.filas_ajuste = len(df)
+        self.filas_agregadas = 0
+        return df
+
+    # ── Aplicación ──
+
+    def transform(self, df):
+        """
+        Aplica el estado ajustado a filas nuevas (consolidado con variables temporales).
+        El costo es proporcional al número de filas de `df`.
+        """
+        if self.ajustado is None:
+            raise RuntimeError(f"El transformador '{self.nombre}' no está ajustado")
+        df = df.copy()
+        pasos = Cronometro("caracteristicas.paso", {"dataset": self.nombre, "modo": "transformacion"},
+                           filas=len(df))
+
+        for col, (trans_name, lmbda, scaler) in self.transformaciones_.items():
+            serie = aplicar_transformacion(df[col], trans_name, lmbda)
+            df[f"{col}_{trans_name}"]     = serie
+            df[f"{col}_{trans_name}_Esc"] = scaler.transform(serie.to_frame())[:, 0]
+        if self.pca_ is not None:
+            df[self._pca_cols()] = self.pca_.transform(df[self.esc_cols_])
+        pasos.marca("transformaciones")
+
+        df = self._banderas_outliers(df)
+        df = self._one_hot(df)
+        df = df.reindex(columns=self.num_keep_ + self.no_num_, fill_value=0)
+        if self.ohe_decada_ is not None:
+            df = self._decada(df)
+        df = df.drop(columns=self.corr_drop_)
+        pasos.marca("banderas_one_hot")
+
+        if self.fa_ is not None:
+            df[self._fa_cols()] = self.fa_.transform(df[self.fa_cols_])
+        pasos.marca("factor_analysis")
+
+        df = self._compactar(df[self.columnas_])
+        pasos.marca("compactar")
+        return df
+
+    def detectar_deriva(self, df):
+        """
+        Revisa si los meses nuevos se alejan del ajuste como para justificar un reajuste.
+
+        :param df: Filas nuevas (consolidado con variables temporales)
+        :return: Lista de motivos (vacía si no hay deriva)
+        """
+        motivos = []
+        if (self.filas_agregadas + len(df)) > UMBRAL_FILAS_NUEVAS * self.filas_ajuste:
+            motivos.append("filas_nuevas")
+
+        for col, (trans_name, lmbda, scaler) in self.transformaciones_.items():
+            esc = scaler.transform(aplicar_transformacion(df[col], trans_name, lmbda).to_frame())[:, 0]
+            desplazamiento = abs(float(np.mean(esc)))
+            if desplazamiento > UMBRAL_DERIVA:
+                motivos.append(f"media:{col}={desplazamiento:.2f}")
+
+        if self.ohe_ is not None:
+            for cat, conocidas in zip(self.cat_cols_, self.ohe_.categories_):
+                nuevas = set(df[cat].dropna().unique()) - set(conocidas)
+                if nuevas:
+                    motivos.append(f"categorias:{cat}={sorted(nuevas)}")
+        if self.ohe_decada_ is not None:
+            nuevas = set(df["Decada"].unique()) - set(self.ohe_decada_.categories_[0])
+            if nuevas:
+                motivos.append(f"decada:{sorted(nuevas)}")
+        return motivos
+
+    # ── Pasos compartidos ──
+
+    def _pca_cols(self):
+        return [f"PCA{i + 1}" for i in range(self.pca_.n_components_)]
+
+    def _fa_cols(self):
+        return [f"FA{i + 1}" for i in range(self.fa_.n_components)]
+
+    def _tipo_bandera(self):
+        return np.uint8 if self.compacto else np.float64
+
+    def _banderas_outliers(self, df):
+        tipo = np.uint8 if self.compacto else int
+        banderas = {}
+        for col, (media, std) in self.outliers_.items():
+            z = (df[col].to_numpy(dtype=np.float64) - media) / std
+            banderas[f"Out_{col}"] = (np.abs(z) > Z_OUTLIER).astype(tipo)
+        # Se agregan de una sola vez (no columna por columna) para no fragmentar el DataFrame
+        return df.drop(columns=[c for c in banderas if c in df.columns]).assign(**banderas)
+
+    def _compactar(self, df):
+        """
+        En modo compacto, pasa a float32 las columnas float que no son medidas originales
+        y a category las de texto (país, trimestre, década).
+        """
+        if not self.compacto:
+            return df
+        tipos = {c: np.float32 for c in df.select_dtypes("float64").columns if c not in self.medidas}
+        tipos.update({c: "category" for c in df.select_dtypes(["object", "string"]).columns if c != "Fecha"})
+        return df.astype(tipos)
+
+    def _one_hot(self, df):
+        if self.ohe_ is None:
+            return df
+        df = df.join(pd.DataFrame(self.ohe_.transform(df[self.cat_cols_]),
+                                  columns=self.ohe_.get_feature_names_out(self.cat_cols_),
+                                  index=df.index))
+        return df.drop(columns=self.cat_cols_)
+
+    def _decada(self, df):
+        df = df.join(pd.DataFrame(self.ohe_decada_.transform(df[["Decada"]]),
+                                  columns=self.ohe_decada_.get_feature_names_out(["Decada"]),
+                                  index=df.index))
+        return df.drop(columns=["Decada"])
+
+    # ── Persistencia ──
+
+    def guardar(self, ruta):
+        joblib.dump(self, ruta)
+
+    @staticmethod
+    def cargar(ruta):
+        return joblib.load(ruta)
+
+
+# ─────────────────────────── Actualización de CSV ───────────────────────────
+
+def rutas_dataset(nombre, directorio=FEATURES_DIR):
+    """
+    Rutas del CSV de características y del estado ajustado de un dataset.
+    """
+    return (os.path.join(directorio, f"{nombre}_features.csv"),
+            os.path.join(directorio, f"{nombre}_transformador.joblib"))
+
+
+def _escribir(df, ruta, agregar=False):
+    # Fecha se guarda como AAAA-MM-DD, igual que los CSV existentes
+    df = df.assign(Fecha=df["Fecha"].dt.strftime("%Y-%m-%d"))
+    if agregar:
+        df.to_csv(ruta, mode="a", header=False, index=False, encoding="utf-8")
+    else:
+        df.to_csv(ruta, index=False, encoding="utf-8-sig")
+
+
+def compactar(df, nombre):
+    """
+    Aplica los tipos del modo compacto a una matriz leída de su CSV, que no guarda
+    tipos: columnas 0/1 (Out_*, One-Hot) a uint8 y el resto como `_compactar`.
+    """
+    transformador = TransformadorCaracteristicas(nombre, compacto=True)
+    numericas = df.select_dtypes("number").columns.difference(transformador.medidas)
+    banderas = [c for c in numericas if df[c].isin((0, 1)).all()]
+    return transformador._compactar(df.astype(dict.fromkeys(banderas, np.uint8)))
+
+
+def modo_compacto(nombre, directorio=FEATURES_DIR):
+    """
+    Si la matriz guardada de un dataset se generó en modo compacto.
+    """
+    _, ruta_estado = rutas_dataset(nombre, directorio)
+    return os.path.exists(ruta_estado) and TransformadorCaracteristicas.cargar(ruta_estado).compacto
+
+
+def actualizar_caracteristicas(nombre, refit=False, data_dir=DATA_DIR, features_dir=FEATURES_DIR, compacto=None):
+    """
+    Actualiza {nombre}_features.csv a partir del consolidado.
+
+    - Sin estado guardado, con `refit=True`, con deriva o al cambiar de modo compacto:
+      ajusta sobre toda la historia y reescribe el CSV.
+    - En otro caso: transforma sólo los meses posteriores al último del CSV y los agrega.
+
+    :param compacto: Modo del transformador (None conserva el del estado guardado)
+    :return: Diccionario {dataset, modo, filas, motivos}
+    """
+    ruta_csv, ruta_estado = rutas_dataset(nombre, features_dir)
+    base = variables_temporales(pd.read_csv(os.path.join(data_dir, FILES[nombre]), encoding="utf-8-sig"), nombre)
+
+    guardado = None
+    if os.path.exists(ruta_estado) and os.path.exists(ruta_csv):
+        guardado = TransformadorCaracteristicas.cargar(ruta_estado)
+    if compacto is None:
+        compacto = guardado is not None and guardado.compacto
+
+    motivos = []
+    if refit:
+        motivos.append("refit")
+    elif guardado is None:
+        motivos.append("sin_estado")
+    elif guardado.compacto != compacto:
+        motivos.append(f"compacto:{compacto}")
+
+    if not motivos:
+        transformador = guardado
+        ultima = pd.to_datetime(pd.read_csv(ruta_csv, usecols=["Fecha"], encoding="utf-8-sig")["Fecha"]).max()
+        nuevas = base[base["Fecha"] > ultima]
+        if nuevas.empty:
+            return {"dataset": nombre, "modo": "al_dia", "filas": 0, "motivos": []}
+
+        motivos = transformador.detectar_deriva(nuevas)
+        if not motivos:
+            _escribir(transformador.transform(nuevas), ruta_csv, agregar=True)
+            transformador.filas_agregadas += len(nuevas)
+            transformador.guardar(ruta_estado)
+            return {"dataset": nombre, "modo": "incremental", "filas": len(nuevas), "motivos": []}
+
+    os.makedirs(features_dir, exist_ok=True)
+    transformador = TransformadorCaracteristicas(nombre, compacto=compacto)
+    df = transformador.fit_transform(base)
+    _escribir(df, ruta_csv)
+    transformador.guardar(ruta_estado)
+    return {"dataset": nombre, "modo": "ajuste_completo", "filas": len(df), "motivos": motivos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza las matrices de características")
+    parser.add_argument("datasets", nargs="*", default=list(FILES), help="Datasets a actualizar")
+    parser.add_argument("--refit", action="store_true", help="Reajusta sobre toda la historia")
+    parser.add_argument("--compacto", action=argparse.BooleanOptionalAction, default=None,
+                        help="Tipos angostos (por omisión, el modo guardado)")
+    args = parser.parse_args()
+    for nombre in args.datasets:
+        r = actualizar_caracteristicas(nombre, refit=args.refit, compacto=args.compacto)
+        print(f" ✓ {r['dataset']}: {r['modo']} ({r['filas']} filas) {', '.join(r['motivos'])}")
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+cli.py
+
+Línea de comandos del pipeline, con un subcomando por etapa:
+
+    python -m pronosticos consolidate [--reporte paises|categorias|todos] [--procesos N]
+                                      [--completo] [--parquet] [--flujo]
+    python -m pronosticos features [forma paises ...] [--refit] [--compacto]
+    python -m pronosticos train [--top 10] [--procesos N] [--busqueda halving] [...]
+    python -m pronosticos forecast pais_total_japon "Exportaciones Total Forma" [--anios 2030 2040]
+                                   [--meses 1 6] [--formato json]
+
+(alias en español: consolidar, caracteristicas, entrenar, pronosticar).
+
+Este módulo sólo importa la biblioteca estándar: cada subcomando importa su etapa al
+ejecutarse, así que `--help` o `consolidate` no cargan scikit-learn ni SciPy
+(~3 s de arranque en frío) y `forecast` no carga la ingeniería de características.
+Las opciones que dependen de constantes de esas etapas (FILES, MODOS_MIX) se validan
+en la etapa, no aquí.
+
+Autor: Francisco Enríquez
+"""
+
+import sys
+import argparse
+
+
+# ─────────────────────────── Subcomandos ───────────────────────────
+
+def consolidate(args):
+    from pronosticos.consolidacion import consolidar_categorias, consolidar_paises
+
+    if args.reporte in ("paises", "todos"):
+        consolidar_paises(args.procesos, args.completo, args.parquet, args.flujo)
+    if args.reporte in ("categorias", "todos"):
+        consolidar_categorias(args.procesos, args.completo, args.parquet)
+    return 0
+
+
+def features(args):
+    from pronosticos.caracteristicas import FILES, actualizar_caracteristicas
+
+    desconocidos = sorted(set(args.datasets) - set(FILES))
+    if desconocidos:
+        print(f" Datasets desconocidos: {', '.join(desconocidos)} (disponibles: {', '.join(FILES)})",
+              file=sys.stderr)
+        return 2
+    for nombre in args.datasets or list(FILES):
+        r = actualizar_caracteristicas(nombre, refit=args.refit, compacto=args.compacto)
+        print(f" ✓ {r['dataset']}: {r['modo']} ({r['filas']} filas) {', '.join(r['motivos'])}")
+    return 0
+
+
+def train(args):
+    from pronosticos import entrenamiento as ent
+    from pronosticos.orquestador import entrenar_todo
+
+    if args.mix not in ent.MODOS_MIX:
+        print(f" Mix desconocido: {args.mix!r} (disponibles: {', '.join(ent.MODOS_MIX)})", file=sys.stderr)
+        return 2
+    entrenar_todo(args.top, args.procesos, args.nucleos_por_unidad, args.reusar,
+                  (args.busqueda, args.presupuesto_arboles, args.presupuesto_segundos), args.mix,
+                  args.global_paises)
+    return 0
+
+
+def forecast(args):
+    import json
+    from pronosticos.servicio import CacheModelos, ModeloNoEncontrado, modelos_disponibles, pronosticar
+
+    modelos = args.modelos or modelos_disponibles()
+    try:
+        resultados = pronosticar(CacheModelos(), modelos, args.anios, args.meses)
+    except ModeloNoEncontrado as e:
+        print(f" Modelo no encontrado: {e.args[0]}", file=sys.stderr)
+        return 1
+
+    if args.formato == "json":
+        json.dump(resultados, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print("modelo,anio,mes,valor")
+        for r in resultados:
+            print(f"{r['modelo']},{r['anio']},{'' if r['mes'] is None else r['mes']},{r['valor']}")
+    return 0
+
+
+# ─────────────────────────── Argumentos ───────────────────────────
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="python -m pronosticos",
+                                     description="Pipeline de pronóstico de exportaciones de tequila")
+    sub = parser.add_subparsers(dest="comando", metavar="{consolidate,features,train,forecast}")
+    sub.required = True
+
+    p = sub.add_parser("consolidate", aliases=["consolidar"], help="Consolida los CSV descargados del CRT")
+    p.add_argument("--reporte", choices=["paises", "categorias", "todos"], default="todos")
+    p.add_argument("--procesos", type=int, default=None, help="Procesos del pool (por defecto, todos los núcleos)")
+    p.add_argument("--completo", action="store_true", help="Ignora el caché y vuelve a parsear todo")
+    p.add_argument("--parquet", action="store_true", help="Guarda también el consolidado en Parquet")
+    p.add_argument("--flujo", action="store_true", help="Países: escribe en flujo con memoria acotada")
+    p.set_defaults(funcion=consolidate)
+
+    p = sub.add_parser("features", aliases=["caracteristicas"], help="Actualiza las matrices de características")
+    p.add_argument("datasets", nargs="*", default=[], help="Datasets a actualizar (por omisión, todos)")
+    p.add_argument("--refit", action="store_true", help="Reajusta sobre toda la historia")
+    p.add_argument("--compacto", action=argparse.BooleanOptionalAction, default=None,
+                   help="Tipos angostos (por omisión, el modo guardado)")
+    p.set_defaults(funcion=features)
+
+    p = sub.add_parser("train", aliases=["entrenar"], help="Entrena todos los modelos en paralelo")
+    p.add_argument("--procesos", type=int, default=None,
+                   help="Procesos del pool (por omisión: núcleos / núcleos por unidad)")
+    p.add_argument("--nucleos-por-unidad", type=int, default=1, help="Núcleos por modelo para la validación cruzada")
+    p.add_argument("--top", type=int, default=10, help="Número de países a modelar")
+    p.add_argument("--reusar", choices=["refit", "warm_start"], default=None,
+                   help="Re-entrena con los hiper-parámetros guardados (búsqueda sólo con deriva)")
+    p.add_argument("--busqueda", choices=["grid", "halving"], default="grid",
+                   help="Malla PARAM_GRID_RF o successive halving sobre ESPACIO_RF")
+    p.add_argument("--presupuesto-arboles", type=int, default=None,
+                   help="Árboles ajustados en CV por búsqueda halving")
+    p.add_argument("--presupuesto-segundos", type=float, default=None, help="Segundos de pared por búsqueda halving")
+    p.add_argument("--mix", default="pares", help="Mix 2040: pares | multisalida")
+    p.add_argument("--global", dest="global_paises", action="store_true",
+                   help="Un solo modelo para todos los países (país como feature)")
+    p.set_defaults(funcion=train)
+
+    p = sub.add_parser("forecast", aliases=["pronosticar"], help="Pronósticos con los pipelines entrenados")
+    p.add_argument("modelos", nargs="*", default=[],
+                   help="Nombres de modelo, p. ej. pais_total_japon (por omisión, todos)")
+    p.add_argument("--anios", type=int, nargs="+", default=[2040])
+    p.add_argument("--meses", type=int, nargs="+", default=None, choices=range(1, 13), metavar="MES",
+                   help="Meses 1-12 (por omisión, anual)")
+    p.add_argument("--formato", choices=["csv", "json"], default="csv")
+    p.set_defaults(funcion=forecast)
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    return args.funcion(args)
@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+
+"""
+consolidacion.py
+
+Motor de consolidación de los CSV mensuales descargados del CRT.
+
+- `limpiar_csv` y `limpiar_exportaciones_pais` convierten un CSV exportado
+  por el ReportViewer en un DataFrame limpio.
+- `consolidar` reparte el parseo de los archivos entre un pool de procesos y
+  une los resultados en orden determinista (año y nombre de archivo), de modo
+  que la salida es idéntica sin importar cuántos procesos se usen.
+- `consolidar_incremental` guarda por cada archivo fuente su huella (ruta, mtime,
+  tamaño, SHA-256) y sus filas ya parseadas, de modo que en cada corrida sólo se
+  parsean los archivos nuevos o modificados y se descartan los eliminados.
+- `consolidar_en_flujo` escribe el consolidado archivo por archivo, con memoria
+  acotada sin importar cuántos archivos haya.
+- `consolidar_paises` / `consolidar_categorias` escriben los consolidados del
+  proyecto en /data (los usan scripts/consolidado_*.py y `python -m pronosticos
+  consolidate`).
+
+El parseo de cada archivo se registra como tramo "consolidacion.parseo" (ver
+telemetria.py), también desde los procesos del pool.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import time
+import pickle
+import hashlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pronosticos.telemetria import tramo
+
+# Directorio /data del proyecto
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Carpetas de reportes por categoría dentro de /data
+CARPETAS_CATEGORIAS = [
+    "ConsumodeAgaveTotal",
+    "ProduccionTotalTequila",
+    "ExportacionesTotalCategoria",
+    "ExportacionesTotalForma"
+]
+CARPETA_PAISES = "ExportacionesPais"
+
+# Caché de piezas parseadas por archivo fuente (una por consolidado)
+CACHE_DIR = os.path.join(DATA_DIR, ".cache_consolidacion")
+VERSION_CACHE = 1
+
+# Rango de años que se revisa en cada carpeta
+ANIOS = range(1995, 2026)
+
+ENCABEZADO_CATEGORIAS = ["SubCategoria", "Year", "Valor"]
+COLUMNAS_PAIS = ["NombrePais", "textbox11", "Categoria", "textbox14", "Clase", "textbox17"]
+RENOMBRES_PAIS = {
+    "textbox11": "Total_Pais_Mes",
+    "textbox14": "Total_Categoria_Mes",
+    "textbox17": "Litros 40 % Alc. Vol"
+}
+
+
+def limpiar_csv(ruta_csv):
+    """
+    Limpia y transforma un archivo CSV con columnas SubCategoria, Year y Valor.
+
+    Parámetros:
+        ruta_csv (str): Ruta al archivo CSV individual.
+
+    Retorna:
+        pd.DataFrame | None: DataFrame limpio o None si el archivo no es válido.
+    """
+    try:
+        # Leer el archivo ignorando comentarios y líneas vacías
+        with open(ruta_csv, encoding="utf-8") as f:
+            lineas = [l.strip() for l in f if l.strip() and not l.startswith("#")]
+
+        for i, linea in enumerate(lineas):
+            columnas = linea.split(",")
+            if columnas == ENCABEZADO_CATEGORIAS:
+                # Extraer los datos válidos desde esa línea en adelante (un solo split por línea)
+                datos = [campos for campos in (l.split(",") for l in lineas[i + 1:]) if len(campos) == 3]
+                if not datos:
+                    print(f" Archivo sin datos válidos: {ruta_csv}")
+                    return None
+
+                df = pd.DataFrame(datos, columns=columnas)
+
+                # Limpieza de columna Valor
+                df["Valor"] = df["Valor"].str.replace(",", "")
+                df = df[df["Valor"].str.strip() != ""]  # eliminar vacíos
+                df["Valor"] = df["Valor"].astype(float)
+
+                # Extraer Año y Mes del nombre del archivo
+                nombre_archivo = os.path.basename(ruta_csv)
+                año, mes, *_ = nombre_archivo.split("-")
+                df["AñoArchivo"] = int(año)
+                df["Mes"] = int(mes)
+
+                return df
+
+        print(f" Encabezado no encontrado en: {ruta_csv}")
+        return None
+
+    except Exception as e:
+        print(f" Error leyendo {ruta_csv}: {e}")
+        return None
+
+
+def limpiar_exportaciones_pais(ruta_csv):
+    """
+    Limpia y transforma un archivo CSV de exportaciones por país.
+
+    Parámetros:
+        ruta_csv (str): Ruta al archivo CSV individual.
+
+    Retorna:
+        pd.DataFrame | None: DataFrame limpio o None si el archivo no es válido.
+    """
+    try:
+        # Leer el CSV desde la fila 3 (skiprows=2) donde están los encabezados reales
+        df = pd.read_csv(ruta_csv, skiprows=2, quotechar='"', encoding="utf-8")
+
+        # Validar el formato esperado
+        if df.shape[1] != 6 or list(df.columns) != COLUMNAS_PAIS:
+            print(f" ⚠ Formato inesperado: {ruta_csv} ({df.shape[1]} columnas)")
+            return None
+
+        # Limpieza de columnas numéricas (quitar comas y convertir a float)
+        for col in ["textbox11", "textbox14", "textbox17"]:
+            df[col] = df[col].astype(str).str.replace(",", "").str.strip()
+            df[col] = df[col].replace('', '0').astype(float)
+
+        # Extraer año y mes desde el nombre del archivo
+        nombre_archivo = os.path.basename(ruta_csv)
+        año, mes, *_ = nombre_archivo.split("-")
+        df["AñoArchivo"] = int(año)
+        df["Mes"] = int(mes)
+
+        return df
+
+    except Exception as e:
+        print(f"  Error procesando {ruta_csv}: {e}")
+        return None
+
+
+def listar_csv(base_dir, carpeta, anios=ANIOS):
+    """
+    Lista los CSV de una carpeta de reporte en orden determinista (año y nombre).
+
+    Parámetros:
+        base_dir (str): Directorio con las subcarpetas {año}-{carpeta}.
+        carpeta (str): Nombre del reporte (p. ej. 'ConsumodeAgaveTotal').
+        anios (iterable): Años a revisar.
+
+    Retorna:
+        list[str]: Rutas de los CSV encontrados.
+    """
+    rutas = []
+    for año in anios:
+        carpeta_año = os.path.join(base_dir, f"{año}-{carpeta}")
+        if not os.path.isdir(carpeta_año):
+            print(f" Carpeta no encontrada: {carpeta_año}")
+            continue
+        with os.scandir(carpeta_año) as entradas:
+            rutas.extend(sorted(e.path for e in entradas if e.name.endswith(".csv") and e.is_file()))
+    return rutas
+
+
+def _limpiar_medido(limpiar, ruta):
+    with tramo("consolidacion.parseo", {"limpiar": limpiar.__name__}, archivo=os.path.basename(ruta)) as t:
+        df = limpiar(ruta)
+        t["filas"] = 0 if df is None else len(df)
+        if df is None:
+            t["estado"] = "saltado"
+    return df
+
+
+def _medido(limpiar):
+    """
+    `limpiar` con su tramo de telemetría; sigue siendo importable desde los procesos hijos.
+    """
+    return partial(_limpiar_medido, limpiar)
+
+
+def _parsear(rutas, limpiar, n_procesos):
+    """
+    Aplica `limpiar` a cada ruta (en un pool si n_procesos > 1) conservando el orden.
+    """
+    limpiar = _medido(limpiar)
+    if n_procesos == 1 or len(rutas) < 2:
+        return [limpiar(r) for r in rutas]
+    # map conserva el orden de entrada, así que la unión es determinista
+    chunksize = max(1, len(rutas) // (n_procesos * 4))
+    with ProcessPoolExecutor(max_workers=min(n_procesos, len(rutas))) as pool:
+        return list(pool.map(limpiar, rutas, chunksize=chunksize))
+
+
+def consolidar(rutas, limpiar, n_procesos=None):
+    """
+    Parsea los archivos en paralelo y los concatena en el mismo orden que `rutas`.
+
+    Parámetros:
+        rutas (list[str]): CSV a procesar.
+        limpiar (callable): Función ruta -> DataFrame | None (debe poder importarse
+            desde los procesos hijos, p. ej. limpiar_csv).
+        n_procesos (int | None): Procesos del pool; None usa todos los núcleos y 1
+            procesa en el proceso actual.
+
+    Retorna:
+        tuple[pd.DataFrame | None, dict]: DataFrame consolidado (None si no hubo archivos
+        válidos) y estadísticas {archivos, validos, segundos, archivos_por_segundo}.
+    """
+    n_procesos = n_procesos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    resultados = _parsear(rutas, limpiar, n_procesos)
+
+    dataframes = []
+    for ruta, df in zip(rutas, resultados):
+        archivo = os.path.basename(ruta)
+        if df is not None:
+            print(f"  Archivo válido: {archivo} ({len(df)} filas)")
+            dataframes.append(df)
+        else:
+            print(f"  Saltado: {archivo}")
+
+    df_final = pd.concat(dataframes, ignore_index=True) if dataframes else None
+    segundos = time.perf_counter() - inicio
+    estadisticas = {
+        "archivos": len(rutas),
+        "validos": len(dataframes),
+        "segundos": round(segundos, 3),
+        "archivos_por_segundo": round(len(rutas) / segundos, 1) if segundos > 0 else 0.0,
+    }
+    print(f" {estadisticas['archivos']} archivos en {estadisticas['segundos']} s "
+          f"({estadisticas['archivos_por_segundo']} archivos/s, {n_procesos} procesos)")
+    return df_final, estadisticas
+
+
+def calcular_hash(ruta):
+    """
+    Calcula el SHA-256 de un archivo.
+    """
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def cargar_cache(ruta_cache, limpiar):
+    """
+    Lee el caché de piezas de un consolidado.
+
+    Retorna un diccionario vacío si no existe, está dañado o se generó con otra
+    versión del formato u otra función de limpieza.
+    """
+    try:
+        with open(ruta_cache, "rb") as f:
+            cache = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return {}
+    if cache.get("version") != VERSION_CACHE or cache.get("limpiar") != limpiar.__name__:
+        return {}
+    return cache["archivos"]
+
+
+def guardar_cache(ruta_cache, limpiar, archivos):
+    """
+    Escribe el caché de forma atómica (archivo temporal + os.replace).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_cache)), exist_ok=True)
+    temporal = ruta_cache + ".part"
+    with open(temporal, "wb") as f:
+        pickle.dump({"version": VERSION_CACHE, "limpiar": limpiar.__name__, "archivos": archivos},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta_cache)
+
+
+def consolidar_incremental(rutas, limpiar, ruta_cache, n_procesos=None):
+    """
+    Igual que `consolidar`, pero reutiliza las piezas ya parseadas de corridas anteriores.
+
+    Un archivo se reutiliza si su mtime y tamaño coinciden con la huella guardada; si
+    sólo cambió el mtime (p. ej. se volvió a descargar el mismo contenido) se compara el
+    SHA-256 antes de volver a parsearlo. Los archivos que ya no están en `rutas` se
+    eliminan del caché.
+
+    Parámetros:
+        rutas (list[str]): CSV a consolidar, en el orden de salida.
+        limpiar (callable): Función ruta -> DataFrame | None.
+        ruta_cache (str): Archivo del caché de este consolidado.
+        n_procesos (int | None): Procesos del pool para los archivos a parsear.
+
+    Retorna:
+        tuple[pd.DataFrame | None, dict]: DataFrame consolidado y estadísticas
+        {archivos, validos, parseados, reutilizados, eliminados, cambios, segundos}.
+    """
+    n_procesos = n_procesos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    base = os.path.dirname(os.path.abspath(ruta_cache))
+    anterior = cargar_cache(ruta_cache, limpiar)
+
+    archivos = {}
+    pendientes = []
+    actualizado = False
+    for ruta in rutas:
+        clave = os.path.relpath(ruta, base)
+        info = os.stat(ruta)
+        pieza = anterior.get(clave)
+
+        if pieza and pieza["mtime_ns"] == info.st_mtime_ns and pieza["tamano"] == info.st_size:
+            archivos[clave] = pieza
+            continue
+
+        sha = calcular_hash(ruta)
+        if pieza and pieza["tamano"] == info.st_size and pieza["sha256"] == sha:
+            archivos[clave] = dict(pieza, mtime_ns=info.st_mtime_ns)
+            actualizado = True
+            continue
+
+        archivos[clave] = {"mtime_ns": info.st_mtime_ns, "tamano": info.st_size, "sha256": sha, "df": None}
+        pendientes.append((clave, ruta))
+
+    for (clave, ruta), df in zip(pendientes, _parsear([r for _, r in pendientes], limpiar, n_procesos)):
+        archivos[clave]["df"] = df
+        estado = f"{len(df)} filas" if df is not None else "saltado"
+        print(f"  Parseado: {os.path.basename(ruta)} ({estado})")
+
+    eliminados = len(set(anterior) - set(archivos))
+    # Un archivo con sólo mtime nuevo actualiza la huella pero no cambia el consolidado
+    cambios = bool(pendientes or eliminados)
+    if cambios or actualizado:
+        guardar_cache(ruta_cache, limpiar, archivos)
+
+    dataframes = [p["df"] for p in archivos.values() if p["df"] is not None]
+    df_final = pd.concat(dataframes, ignore_index=True) if dataframes else None
+    segundos = time.perf_counter() - inicio
+    estadisticas = {
+        "archivos": len(rutas),
+        "validos": len(dataframes),
+        "parseados": len(pendientes),
+        "reutilizados": len(rutas) - len(pendientes),
+        "eliminados": eliminados,
+        "cambios": cambios,
+        "segundos": round(segundos, 3),
+    }
+    print(f" {estadisticas['archivos']} archivos: {estadisticas['parseados']} parseados, "
+          f"{estadisticas['reutilizados']} del caché, {estadisticas['eliminados']} eliminados "
+          f"({estadisticas['segundos']} s)")
+    return df_final, estadisticas
+
+
+def consolidar_en_flujo(rutas, limpiar, destino, transformar=None, n_procesos=None, ventana=None):
+    """
+    Consolida en modo streaming: cada archivo se parsea, se transforma y se agrega
+    al CSV de salida, sin juntar todos los DataFrames en memoria.
+
+    Los archivos se procesan por ventanas de `ventana` rutas (repartidas en el pool),
+    así que la memoria pico depende del tamaño de la ventana y no del total. La salida
+    es byte a byte igual a `consolidar(...)` seguido de `to_csv(..., encoding="utf-8-sig")`.
+
+    Parámetros:
+        rutas (list[str]): CSV a procesar, en el orden de salida.
+        limpiar (callable): Función ruta -> DataFrame | None.
+        destino (str): CSV consolidado a escribir (se reemplaza de forma atómica).
+        transformar (callable | None): Función DataFrame -> DataFrame aplicada a cada
+            pieza antes de escribirla (p. ej. renombrar columnas).
+        n_procesos (int | None): Procesos del pool; 1 procesa en el proceso actual.
+        ventana (int | None): Archivos en vuelo a la vez (por defecto 4 por proceso).
+
+    Retorna:
+        dict: Estadísticas {archivos, validos, filas, segundos, archivos_por_segundo}.
+    """
+    n_procesos = n_procesos or os.cpu_count() or 1
+    ventana = ventana or n_procesos * 4
+    inicio = time.perf_counter()
+    validos = filas = 0
+    columnas = None
+
+    temporal = destino + ".part"
+    pool = ProcessPoolExecutor(max_workers=n_procesos) if n_procesos > 1 and len(rutas) > 1 else None
+    try:
+        # Un solo handle con utf-8-sig: el BOM se escribe una vez, al inicio
+        with open(temporal, "w", encoding="utf-8-sig", newline="") as salida:
+            for i in range(0, len(rutas), ventana):
+                lote = rutas[i:i + ventana]
+                resultados = pool.map(_medido(limpiar), lote) if pool else map(_medido(limpiar), lote)
+                for ruta, df in zip(lote, resultados):
+                    archivo = os.path.basename(ruta)
+                    if df is None:
+                        print(f"  Saltado: {archivo}")
+                        continue
+                    if transformar is not None:
+                        df = transformar(df)
+                    if columnas is None:
+                        columnas = list(df.columns)
+                    # pd.concat alinea por nombre; aquí se reordena igual antes de escribir
+                    df.reindex(columns=columnas).to_csv(salida, index=False, header=validos == 0)
+                    print(f"  Archivo válido: {archivo} ({len(df)} filas)")
+                    validos += 1
+                    filas += len(df)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if validos:
+        os.replace(temporal, destino)
+    else:
+        os.remove(temporal)
+
+    segundos = time.perf_counter() - inicio
+    estadisticas = {
+        "archivos": len(rutas),
+        "validos": validos,
+        "filas": filas,
+        "segundos": round(segundos, 3),
+        "archivos_por_segundo": round(len(rutas) / segundos, 1) if segundos > 0 else 0.0,
+    }
+    print(f" {estadisticas['archivos']} archivos en {estadisticas['segundos']} s "
+          f"({estadisticas['archivos_por_segundo']} archivos/s, {n_procesos} procesos, en flujo)")
+    return estadisticas
+
+
+# ─────────────────────────── Consolidados del proyecto ───────────────────────────
+
+# Salida del consolidado por país (las de categorías: `salida_categoria`)
+SALIDA_PAISES = os.path.join(DATA_DIR, "consolidado_exportaciones_pais.csv")
+
+
+def salida_categoria(carpeta):
+    """
+    Ruta del consolidado de una carpeta de categorías (data/consolidado_{carpeta}.csv).
+    """
+    return os.path.join(DATA_DIR, f"consolidado_{carpeta.lower()}.csv")
+
+
+def renombrar_columnas_pais(df):
+    """
+    Renombra las columnas técnicas del ReportViewer a nombres descriptivos.
+    """
+    return df.rename(columns=RENOMBRES_PAIS)
+
+
+def _guardar_parquet(df_final, salida):
+    # Importación diferida: pyarrow sólo si se pide Parquet
+    from pronosticos.almacenamiento import escribir_parquet, ruta_dataset
+    escribir_parquet(df_final, ruta_dataset(salida), fuente=salida)
+    print(f" Parquet guardado en '{ruta_dataset(salida)}'")
+
+
+def _sin_cambios(df_final, salida, parquet):
+    """
+    Con el CSV al día no se reescribe; con `parquet` se escribe el Parquet si falta
+    o no corresponde a ese CSV.
+    """
+    print(f" Sin cambios: '{salida}' está al día")
+    if parquet and df_final is not None:
+        from pronosticos.almacenamiento import parquet_vigente, ruta_dataset
+        if not parquet_vigente(ruta_dataset(salida), salida):
+            _guardar_parquet(df_final, salida)
+
+
+def _guardar_consolidado(df_final, salida, parquet):
+    if df_final is None:
+        print(" No se encontraron archivos válidos para combinar.")
+        return
+    # Se escribe aparte y se reemplaza: quien lo lee (p. ej. el almacén de series de la
+    # API) nunca ve un archivo a medias, igual que con consolidar_en_flujo
+    temporal = salida + ".part"
+    df_final.to_csv(temporal, index=False, encoding="utf-8-sig")
+    os.replace(temporal, salida)
+    print(f"\n Consolidado guardado como '{salida}' ({len(df_final)} filas)")
+    if parquet:
+        _guardar_parquet(df_final, salida)
+
+
+def consolidar_paises(n_procesos=None, completo=False, parquet=False, flujo=False):
+    """
+    Consolida todos los CSV de ExportacionesPais en data/consolidado_exportaciones_pais.csv.
+
+    :param n_procesos: Procesos del pool de parseo
+    :param completo: Ignora el caché y vuelve a parsear todos los archivos
+    :param parquet: Guarda además el consolidado en Parquet particionado por año (data/parquet/)
+    :param flujo: Escribe archivo por archivo con memoria acotada (sin caché ni Parquet)
+    """
+    print(f"\n=== Procesando carpeta: {CARPETA_PAISES} ===")
+    rutas = listar_csv(os.path.join(DATA_DIR, CARPETA_PAISES), CARPETA_PAISES)
+
+    if flujo:
+        stats = consolidar_en_flujo(rutas, limpiar_exportaciones_pais, SALIDA_PAISES,
+                                    renombrar_columnas_pais, n_procesos)
+        if stats["validos"]:
+            print(f"\n Consolidado guardado como '{SALIDA_PAISES}' ({stats['filas']} filas)")
+        else:
+            print(" No se encontraron archivos válidos para combinar.")
+        return
+
+    if completo:
+        df_final, _ = consolidar(rutas, limpiar_exportaciones_pais, n_procesos)
+    else:
+        ruta_cache = os.path.join(CACHE_DIR, "consolidado_exportaciones_pais.pkl")
+        df_final, stats = consolidar_incremental(rutas, limpiar_exportaciones_pais, ruta_cache, n_procesos)
+        if not stats["cambios"] and os.path.exists(SALIDA_PAISES):
+            _sin_cambios(None if df_final is None else renombrar_columnas_pais(df_final), SALIDA_PAISES, parquet)
+            return
+
+    _guardar_consolidado(None if df_final is None else renombrar_columnas_pais(df_final), SALIDA_PAISES, parquet)
+
+
+def consolidar_categorias(n_procesos=None, completo=False, parquet=False):
+    """
+    Consolida cada carpeta de categorías en data/consolidado_{carpeta}.csv.
+
+    :param n_procesos: Procesos del pool de parseo
+    :param completo: Ignora el caché y vuelve a parsear todos los archivos
+    :param parquet: Guarda además el consolidado en Parquet particionado por año (data/parquet/)
+    """
+    for carpeta in CARPETAS_CATEGORIAS:
+        print(f"\n=== Procesando carpeta: {carpeta} ===")
+        rutas = listar_csv(os.path.join(DATA_DIR, carpeta), carpeta)
+        salida = salida_categoria(carpeta)
+
+        if completo:
+            df_final, _ = consolidar(rutas, limpiar_csv, n_procesos)
+        else:
+            ruta_cache = os.path.join(CACHE_DIR, f"consolidado_{carpeta.lower()}.pkl")
+            df_final, stats = consolidar_incremental(rutas, limpiar_csv, ruta_cache, n_procesos)
+            if not stats["cambios"] and os.path.exists(salida):
+                _sin_cambios(df_final, salida, parquet)
+                continue
+
+        _guardar_consolidado(df_final, salida, parquet)
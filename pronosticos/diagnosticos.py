@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+"""
+diagnosticos.py
+
+Gráficas de diagnóstico de los modelos entrenados (importancias de variables y
+curva de aprendizaje), fuera del camino del entrenamiento.
+
+- Se generan bajo pedido: con `python -m pronosticos.diagnosticos <modelo>` o con
+  GET /diagnosticos/{modelo}/{tipo} en la API, que encola un trabajo 'diagnostico'
+  para el proceso trabajador (app/trabajador.py).
+- Se guardan por huella del modelo (SHA-256 de su contenido en el almacén, ver
+  almacen_modelos.py):
+
+      resultados/diagnosticos/<sha256>/importancias.png
+      resultados/diagnosticos/<sha256>/curva_aprendizaje.png
+      resultados/diagnosticos/<sha256>/resumen.json
+
+  Un modelo que no cambió nunca las vuelve a calcular; al re-entrenarlo cambia su
+  huella y la siguiente solicitud las genera de nuevo.
+- Una gráfica que falla queda registrada en "errores" de resumen.json para esa
+  huella (o la del .pkl, si el modelo ni siquiera se pudo cargar): la API responde
+  422 en vez de volver a encolarla, y sólo se reintenta con `--forzar`.
+- La curva de aprendizaje re-ajusta el pipeline 6 tamaños × N_SPLITS folds sobre los
+  datos de su unidad (misma preparación que el entrenamiento: país, global o
+  consolidado); los ajustes pasan por cache_cv.
+
+sklearn y matplotlib se importan sólo al generar, de modo que consultar si una
+gráfica ya existe (lo que hace la API) no los carga.
+
+Uso:
+    python -m pronosticos.diagnosticos pais_total_japon "Exportaciones Total Forma"
+    python -m pronosticos.diagnosticos --todos [--tipos importancias] [--forzar]
+    python -m pronosticos.diagnosticos --limpiar
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pronosticos.almacen_modelos import AlmacenModelos, ModeloNoEncontrado
+from pronosticos.telemetria import tramo
+
+_RAIZ = Path(__file__).resolve().parent.parent
+
+# Mismas carpetas que entrenamiento.py (que no se importa aquí para no cargar sklearn)
+RESULT_PATH = Path(os.getenv("PRONOSTICO_RESULTADOS_DIR", _RAIZ / "resultados"))
+MODEL_PATH = Path(os.getenv("PRONOSTICO_MODELOS_DIR", RESULT_PATH / "models"))
+DIAGNOSTICOS_DIR = Path(os.getenv("PRONOSTICO_DIAGNOSTICOS_DIR", RESULT_PATH / "diagnosticos"))
+
+TIPOS = ("importancias", "curva_aprendizaje")
+RESUMEN = "resumen.json"
+
+# Variables que muestra la gráfica de importancias
+TOP_IMPORTANCIAS = 20
+DPI = 150
+
+
+class DiagnosticoNoDisponible(ValueError):
+    """No se pueden reconstruir los datos de entrenamiento del modelo."""
+
+
+def _pyplot():
+    import matplotlib
+    # ── backend 'Agg' → renderiza figuras en disco (no en pantalla) ──
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _guardar_figura(plt, ruta):
+    # Escritura atómica: la API nunca sirve un PNG a medio escribir
+    temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.part")
+    plt.savefig(temporal, dpi=DPI, format="png")
+    os.replace(temporal, ruta)
+
+
+def _guardar_resumen(ruta, resumen):
+    # Igual que las figuras: se reemplaza de una vez
+    temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.part")
+    temporal.write_text(json.dumps(resumen, indent=2, ensure_ascii=False))
+    os.replace(temporal, ruta)
+
+
+# ═════════════════════ CACHÉ ═════════════════════
+def huella_modelo(nombre, almacen=None):
+    """
+    Huella del modelo en el almacén, o None si sólo existe como models/<nombre>.pkl
+    (se registra en el almacén al generar sus gráficas).
+
+    :raises ModeloNoEncontrado: si el modelo no existe
+    """
+    almacen = almacen or AlmacenModelos()
+    try:
+        return almacen.huella(nombre)
+    except ModeloNoEncontrado:
+        if (MODEL_PATH / f"{nombre}.pkl").exists():
+            return None
+        raise
+
+
+def diagnostico_en_cache(nombre, tipo, almacen=None):
+    """
+    Ruta del PNG de `tipo` si ya se generó para la versión actual del modelo.
+
+    :return: Path o None si hay que generarlo
+    :raises ModeloNoEncontrado: si el modelo no existe
+    """
+    sha = huella_modelo(nombre, almacen)
+    if sha is None:
+        return None
+    ruta = DIAGNOSTICOS_DIR / sha / f"{tipo}.png"
+    return ruta if ruta.exists() else None
+
+
+def _clave_fallos(nombre, almacen):
+    """
+    Carpeta donde se registran los errores de un modelo: su huella en el almacén o,
+    si nunca se pudo registrar (p. ej. un pickle que no carga), la del .pkl.
+    """
+    sha = huella_modelo(nombre, almacen)
+    if sha is None:
+        sha = "pkl-" + hashlib.sha256((MODEL_PATH / f"{nombre}.pkl").read_bytes()).hexdigest()
+    return DIAGNOSTICOS_DIR / sha
+
+
+def _leer_resumen(destino):
+    ruta = destino / RESUMEN
+    return json.loads(ruta.read_text()) if ruta.exists() else {}
+
+
+def _registrar_error(destino, resumen, tipo, error):
+    resumen.setdefault("errores", {})[tipo] = {"error": f"{type(error).__name__}: {error}",
+                                               "fecha": datetime.now().isoformat(timespec="seconds")}
+    destino.mkdir(parents=True, exist_ok=True)
+    _guardar_resumen(destino / RESUMEN, resumen)
+
+
+def error_registrado(nombre, tipo, almacen=None):
+    """
+    Error con el que falló `tipo` para la versión actual del modelo, o None.
+
+    :raises ModeloNoEncontrado: si el modelo no existe
+    """
+    almacen = almacen or AlmacenModelos()
+    error = _leer_resumen(_clave_fallos(nombre, almacen)).get("errores", {}).get(tipo)
+    return error["error"] if error else None
+
+
+def eliminar_huerfanos(almacen=None):
+    """
+    Borra las gráficas de huellas que ya no referencia ningún modelo del almacén.
+
+    :return: Número de carpetas eliminadas
+    """
+    almacen = almacen or AlmacenModelos()
+    if not DIAGNOSTICOS_DIR.is_dir():
+        return 0
+    vivas = set(almacen.listar()["sha256"])
+    eliminadas = 0
+    for carpeta in DIAGNOSTICOS_DIR.iterdir():
+        if carpeta.is_dir() and carpeta.name not in vivas:
+            shutil.rmtree(carpeta, ignore_errors=True)
+            eliminadas += 1
+    return eliminadas
+
+
+# ═════════════════════ DATOS ═════════════════════
+def _cargar(nombre, almacen):
+    """Pipeline y huella; un modelo que sólo está en models/ se registra en el almacén."""
+    try:
+        return almacen.cargar(nombre), almacen.huella(nombre)
+    except ModeloNoEncontrado:
+        from pronosticos import entrenamiento as ent
+        guardado = ent.cargar_modelo_guardado(nombre)
+        if guardado is None:
+            raise
+        pipe, meta = guardado
+        return pipe, almacen.guardar(pipe, nombre, meta)
+
+
+def datos_entrenamiento(nombre, pipe):
+    """
+    X / y con las que se entrenó el modelo: la preparación de su unidad (país,
+    global o consolidado) restringida a las columnas del pipeline.
+
+    :raises DiagnosticoNoDisponible: si el modelo no corresponde a ninguna unidad
+        (p. ej. modelos del notebook) o sus columnas ya no están en los features
+    """
+    from pronosticos import entrenamiento as ent
+
+    consolidados = {modelo: (archivo, target) for archivo, target, modelo in ent.CONSOLIDADOS}
+    if nombre not in consolidados:
+        ent.asegurar_features_paises()
+    datos = None
+    if nombre == ent.MODELO_GLOBAL:
+        datos = ent.preparar_global(ent.cargar_paises())
+    elif nombre in consolidados:
+        datos = ent.preparar_consolidado(*consolidados[nombre])
+    elif nombre.startswith("pais_total_"):
+        df_paises = ent.cargar_paises()
+        paises = [p for p in df_paises["NombrePais"].unique() if ent.id_modelo_pais(p) == nombre]
+        if paises:
+            datos = ent.preparar_pais_total(df_paises, paises[0])
+    if datos is None:
+        raise DiagnosticoNoDisponible(f"Sin datos de entrenamiento para '{nombre}'")
+
+    _, X, y = datos
+    columnas = [str(c) for c in getattr(pipe, "feature_names_in_", X.columns)]
+    faltantes = set(columnas) - set(X.columns)
+    if faltantes:
+        raise DiagnosticoNoDisponible(f"'{nombre}' usa columnas que ya no existen: {sorted(faltantes)[:5]}")
+    return X[columnas], y
+
+
+# ═════════════════════ GRÁFICAS ═════════════════════
+def plot_learning_curve(pipe, X, y, titulo, save_path=None):
+    """
+    Graba la **curva de aprendizaje** (MAE) usando el mismo TimeSeriesSplit
+    que el entrenamiento.
+
+    Equivale a `sklearn.model_selection.learning_curve` (tamaños relativos al
+    primer fold, se entrena con las primeras n filas de cada fold), pero cada
+    ajuste pasa por `cache_cv`: el mayor tamaño del primer fold coincide con el
+    primer fold de la búsqueda y no se vuelve a entrenar.
+
+    :return: Diccionario {tamanos, mae_entrenamiento, mae_validacion}
+    """
+    from sklearn.model_selection import TimeSeriesSplit
+    from pronosticos import cache_cv
+    from pronosticos import entrenamiento as ent
+
+    folds = list(TimeSeriesSplit(n_splits=ent.N_SPLITS).split(X))
+    n_max = len(folds[0][0])
+    tr_sizes = np.unique(np.clip((np.linspace(0.2, 1.0, 6) * n_max).astype(int), 1, n_max))
+
+    tareas = [(pipe, tr[:n], te) for n in tr_sizes for tr, te in folds]
+    resultados = cache_cv.evaluar_folds(tareas, X, y, ent.SCORING, n_jobs=ent.N_JOBS)
+    tr_scores  = np.array([r["entrenamiento"] for r in resultados]).reshape(len(tr_sizes), -1)
+    val_scores = np.array([r["prueba"] for r in resultados]).reshape(len(tr_sizes), -1)
+
+    tr_mae  = -tr_scores.mean(axis=1)
+    val_mae = -val_scores.mean(axis=1)
+
+    plt = _pyplot()
+    plt.figure(figsize=(6, 4))
+    plt.plot(tr_sizes, tr_mae,  marker="o", label="Entrenamiento")
+    plt.plot(tr_sizes, val_mae, marker="s", label="Validación")
+    plt.title(titulo)
+    plt.xlabel("Tamaño de entrenamiento")
+    plt.ylabel("MAE")
+    plt.legend()
+    plt.tight_layout()
+    if save_path:
+        _guardar_figura(plt, save_path)
+    plt.close()
+    return {"tamanos": tr_sizes.tolist(),
+            "mae_entrenamiento": tr_mae.tolist(),
+            "mae_validacion": val_mae.tolist()}
+
+
+def plot_feature_importance(pipe, cols, name, save_path=None):
+    """
+    Top-`TOP_IMPORTANCIAS` de importancias del bosque (decremento promedio en
+    impurezas) con la desviación estándar entre árboles.
+
+    :return: Diccionario {variable: importancia} del top
+    """
+    forest = pipe["rf"]
+    cols = np.asarray(cols)
+    if "selector" in pipe.named_steps:
+        cols = cols[pipe["selector"].get_support()]
+    std = np.std([tree.feature_importances_ for tree in forest.estimators_], axis=0)
+
+    importancias = pd.DataFrame({"importancia": forest.feature_importances_, "std": std}, index=cols)
+    top = importancias.nlargest(TOP_IMPORTANCIAS, "importancia").iloc[::-1]
+
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(7, max(3, 0.3 * len(top) + 1)))
+    top["importancia"].plot.barh(xerr=top["std"], ax=ax)
+    ax.set_title(f"Importancia - {name} (top {len(top)})")
+    ax.set_xlabel("Decremento promedio en impurezas")
+    fig.tight_layout()
+    if save_path:
+        _guardar_figura(plt, save_path)
+    plt.close(fig)
+    return top["importancia"].iloc[::-1].to_dict()
+
+
+# ═════════════════════ GENERACIÓN ═════════════════════
+def generar(nombre, tipos=TIPOS, forzar=False, almacen=None, al_avance=None):
+    """
+    Genera las gráficas de `tipos` que falten para la versión actual del modelo.
+
+    :param nombre: Modelo (nombre en models/ y en el almacén)
+    :param tipos: Subconjunto de TIPOS
+    :param forzar: Regenera aunque ya existan o hayan fallado antes
+    :param al_avance: Función opcional (resumen) llamada antes y después de cada gráfica,
+        con el mismo formato que el pool de descargas ({meses, exitosos, fallidos}, donde
+        cada "mes" es una gráfica); el trabajador la usa como latido
+    :return: Diccionario {modelo, sha256, generados, rutas, segundos}
+    :raises ModeloNoEncontrado: si el modelo no existe
+    :raises DiagnosticoNoDisponible: si la curva de aprendizaje no tiene datos
+    :raises Exception: el primer error de una gráfica (queda en "errores" del resumen;
+        las demás gráficas se intentan igual)
+    """
+    desconocidos = set(tipos) - set(TIPOS)
+    if desconocidos:
+        raise ValueError(f"Tipos de diagnóstico no válidos: {sorted(desconocidos)}")
+
+    inicio = time.perf_counter()
+    almacen = almacen or AlmacenModelos()
+    try:
+        pipe, sha = _cargar(nombre, almacen)
+    except Exception as e:
+        # Incluye un .pkl sin su .json: la API lo da por existente y lo volvería a encolar
+        try:
+            destino = _clave_fallos(nombre, almacen)
+        except ModeloNoEncontrado:
+            raise e from None
+        resumen = dict(_leer_resumen(destino), modelo=nombre)
+        for tipo in tipos:
+            _registrar_error(destino, resumen, tipo, e)
+        raise
+
+    destino = DIAGNOSTICOS_DIR / sha
+    resumen = dict(_leer_resumen(destino), modelo=nombre, sha256=sha)
+    fallidos = resumen.get("errores", {})
+    pendientes = [t for t in tipos if forzar or not ((destino / f"{t}.png").exists() or t in fallidos)]
+
+    primer_error = None
+    avance = {"meses": len(pendientes), "exitosos": 0, "fallidos": 0}
+    if pendientes:
+        destino.mkdir(parents=True, exist_ok=True)
+        columnas = [str(c) for c in getattr(pipe, "feature_names_in_", [])]
+        for tipo in pendientes:
+            if al_avance:
+                al_avance(avance)
+            try:
+                with tramo("diagnosticos.grafica", {"tipo": tipo}, modelo=nombre):
+                    if tipo == "importancias":
+                        datos = plot_feature_importance(pipe, columnas, nombre, destino / f"{tipo}.png")
+                    else:
+                        X, y = datos_entrenamiento(nombre, pipe)
+                        datos = plot_learning_curve(pipe, X, y, nombre, destino / f"{tipo}.png")
+            except Exception as e:
+                _registrar_error(destino, resumen, tipo, e)
+                primer_error = primer_error or e
+                avance["fallidos"] += 1
+                continue
+            # Después de cada gráfica: si la siguiente falla, la ya guardada tiene su resumen
+            resumen[tipo] = {"valores": datos, "fecha": datetime.now().isoformat(timespec="seconds")}
+            resumen.get("errores", {}).pop(tipo, None)
+            _guardar_resumen(destino / RESUMEN, resumen)
+            avance["exitosos"] += 1
+        if al_avance:
+            al_avance(avance)
+    if primer_error is not None:
+        raise primer_error
+
+    return {
+        "modelo": nombre,
+        "sha256": sha,
+        "generados": pendientes,
+        "rutas": {t: str(destino / f"{t}.png") for t in tipos},
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gráficas de diagnóstico de los modelos, en caché por huella")
+    parser.add_argument("modelos", nargs="*", help="Nombres de modelo (models/<nombre>.pkl)")
+    parser.add_argument("--todos", action="store_true", help="Todos los modelos de models/")
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS, default=list(TIPOS))
+    parser.add_argument("--forzar", action="store_true", help="Regenera aunque ya existan")
+    parser.add_argument("--limpiar", action="store_true",
+                        help="Borra las gráficas de modelos que ya no están en el almacén")
+    args = parser.parse_args()
+
+    modelos = args.modelos
+    if args.todos:
+        modelos = sorted(p.stem for p in MODEL_PATH.glob("*.pkl"))
+    for modelo in modelos:
+        try:
+            r = generar(modelo, args.tipos, args.forzar)
+        except (ModeloNoEncontrado, DiagnosticoNoDisponible) as e:
+            print(f"[skip] {modelo}: {e}")
+            continue
+        except Exception as e:
+            # p. ej. pickles de otra versión de sklearn: se sigue con los demás modelos
+            print(f"[error] {modelo}: {type(e).__name__}: {e}")
+            continue
+        estado = f"generadas {', '.join(r['generados'])}" if r["generados"] else "en caché"
+        print(f" ✓ {modelo} ({r['sha256'][:12]}): {estado} | {r['segundos']:,.1f} s")
+    if args.limpiar:
+        print(f"Carpetas huérfanas eliminadas: {eliminar_huerfanos()}")
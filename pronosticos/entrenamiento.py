@@ -0,0 +1,1548 @@
+# -*- coding: utf-8 -*-
+
+"""
+entrenamiento.py
+
+Pipeline de modelado de notebook/baseline_model_v03.ipynb como módulo importable.
+
+Funciones clave
+1.  Carga los datasets *_features.csv* generados en la fase previa de
+    ingeniería de características (data/feature-engineering/).
+2.  Ajusta **RandomForestRegressor** con validación temporal
+    (`TimeSeriesSplit`) y búsqueda de hiperparámetros reducida
+    (en malla, equivalente a `GridSearchCV`); los folds se memorizan en disco
+    (cache_cv.py) para no re-entrenarlos en corridas repetidas.
+3.  Genera proyecciones a 2040 y *back-casts* (2010-2015-2020) para
+    control de calidad. El mix (Categoría, Clase) de 2040 se estima con un RF
+    por par (modo "pares", como en el notebook) o con un solo RF multisalida
+    por país cuyas salidas suman 1 (modo "multisalida").
+4.  Calcula métricas (MAE, RMSE, R², …) y las guarda en CSV.
+5.  Serializa los *pipelines* (`joblib`). Las gráficas de diagnóstico
+    (curvas de aprendizaje e importancias de variables) no se generan al
+    entrenar: se piden bajo demanda a diagnosticos.py, en caché por huella del modelo.
+
+El paralelismo se controla con `N_JOBS` (validación cruzada, GridSearch) y
+`N_JOBS_RF` (árboles del bosque). Por omisión ambos valen -1, como en el notebook;
+el orquestador (orquestador.py) los fija con `configurar_nucleos` para que cada
+unidad de entrenamiento use sólo su presupuesto de núcleos, sin pools anidados.
+
+Autor: Francisco Enríquez
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+import joblib
+import sklearn
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_selection import SelectKBest, f_regression
+from sklearn.metrics import mean_squared_error
+from sklearn.base import clone
+from sklearn.model_selection import TimeSeriesSplit, ParameterGrid
+from sklearn.pipeline import Pipeline
+
+from pronosticos import cache_cv
+from pronosticos.almacen_modelos import AlmacenModelos
+from pronosticos.almacenamiento import cargar_dataset
+from pronosticos.telemetria import tramo
+
+import warnings
+from sklearn.exceptions import ConvergenceWarning
+
+warnings.filterwarnings("ignore", category=ConvergenceWarning)
+
+# ═════════════════════ CONFIGURACIÓN GLOBAL ═════════════════════
+# ── umbral objetivo de MAE (litros) para aceptar un modelo
+UMBRAL_MAE: float = 10_000
+
+# ── Nº de divisiones en TimeSeriesSplit (3 = train 66 %, val 33 %)
+N_SPLITS: int = 3
+
+# ── métrica de validación (sklearn la reporta negativa)
+SCORING = "neg_mean_absolute_error"
+
+# ── semilla reproducible para sklearn / numpy
+RANDOM_STATE: int = 42
+
+# ── núcleos para validación cruzada / búsqueda y para los árboles del RF
+N_JOBS: int = -1
+N_JOBS_RF: int = -1
+
+_RAIZ = Path(__file__).resolve().parent.parent
+
+# Dataset de entrada (features) y carpetas de salida (resultados + modelos)
+BASE_PATH   = Path(os.getenv("PRONOSTICO_FEATURES_DIR", _RAIZ / "data" / "feature-engineering"))
+RESULT_PATH = Path(os.getenv("PRONOSTICO_RESULTADOS_DIR", _RAIZ / "resultados"))
+MODEL_PATH  = Path(os.getenv("PRONOSTICO_MODELOS_DIR", RESULT_PATH / "models"))
+
+# ── re-entrenamiento: la búsqueda completa se repite sólo si el MAE CV con los
+#    hiper-parámetros guardados empeora más de este porcentaje vs. la última búsqueda
+UMBRAL_DERIVA_MAE: float = 0.15
+
+# ── árboles que se agregan al bosque existente en modo "warm_start"; el bosque
+#    crece hasta TOPE_WARM_START × los árboles de la búsqueda y, pasado el tope,
+#    se descartan los más viejos (ajustados con menos historia)
+ARBOLES_WARM_START: int = 50
+TOPE_WARM_START: int = 3
+
+# ── búsqueda de hiper-parámetros: "grid" (PARAM_GRID_RF) o "halving" (ESPACIO_RF)
+BUSQUEDA: str = "grid"
+
+# ── presupuesto de la búsqueda "halving": árboles ajustados en la validación
+#    cruzada (None = lo que cuesta la malla) y/o segundos de pared
+PRESUPUESTO_ARBOLES: Optional[int] = None
+PRESUPUESTO_SEGUNDOS: Optional[float] = None
+
+# ── successive halving: en cada ronda sobrevive 1/FACTOR de los candidatos y los
+#    árboles se multiplican por FACTOR hasta llegar a n_estimators de la malla
+FACTOR_HALVING: int = 3
+RONDAS_HALVING: int = 4
+
+# ── años para *back-casting* (control de calidad)
+BACKCAST_YEARS = [2020, 2015, 2010]
+
+# ── mix (Categoría, Clase) 2040: "pares" (un RF por par) o "multisalida"
+MODOS_MIX = ("pares", "multisalida")
+
+# ── año máximo de entrenamiento y año de proyección
+ANIO_CORTE = 2022
+ANIO_PROYECCION = 2040
+
+
+def configurar_nucleos(nucleos: int) -> None:
+    """
+    Fija el presupuesto de núcleos de este proceso: `nucleos` para la validación
+    cruzada / búsqueda y 1 para los árboles, de modo que no haya paralelismo anidado.
+    """
+    global N_JOBS, N_JOBS_RF
+    N_JOBS = max(1, nucleos)
+    N_JOBS_RF = 1
+
+
+def configurar_busqueda(
+    busqueda: str = "grid",
+    arboles: Optional[int] = None,
+    segundos: Optional[float] = None,
+) -> None:
+    """Fija el modo de búsqueda ("grid" / "halving") y su presupuesto."""
+    global BUSQUEDA, PRESUPUESTO_ARBOLES, PRESUPUESTO_SEGUNDOS
+    if busqueda not in ("grid", "halving"):
+        raise ValueError(f"Búsqueda desconocida: {busqueda!r}")
+    BUSQUEDA, PRESUPUESTO_ARBOLES, PRESUPUESTO_SEGUNDOS = busqueda, arboles, segundos
+
+
+def preparar_directorios() -> None:
+    RESULT_PATH.mkdir(parents=True, exist_ok=True)
+    MODEL_PATH.mkdir(parents=True, exist_ok=True)
+
+
+# ═════════════════════ UTILIDADES GENERALES ═════════════════════
+def root_mean_squared_error(y_true, y_pred) -> float:
+    """RMSE rápido para imprimir / loggear."""
+    return np.sqrt(mean_squared_error(y_true, y_pred))
+
+
+def detectar_outliers_iqr(y: pd.Series) -> pd.Series:
+    """
+    Regresa una **máscara booleana** con outliers según la regla IQR × 1.5.
+    Uso:  df = df[~detectar_outliers_iqr(df["columna"])]
+    """
+    q1, q3 = np.percentile(y, [25, 75])
+    iqr    = q3 - q1
+    low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    return (y < low) | (y > high)
+
+
+def guardar_metricas_csv(metricas: dict, archivo: Path) -> None:
+    """
+    Añade un renglón al CSV *archivo* (creándolo si no existe).
+    metricas : diccionario plano {columna: valor}
+    """
+    pd.DataFrame([metricas]).to_csv(
+        archivo, mode="a", header=not archivo.exists(), index=False
+    )
+
+
+# ═════════════ BACK-CAST: PREDICCIONES HISTÓRICAS ═══════════════
+def backcast_years(
+    pipe: Pipeline,
+    X_cols: List[str],
+    df_hist: pd.DataFrame,
+    target: str,
+    years: List[int],
+    *,
+    year_col: str = "Year",
+) -> pd.DataFrame:
+    """
+    Genera predicciones “hacia atrás” (back-cast) para *years* y compara con
+    el valor real disponible en `df_hist` (control rápido; la evaluación con
+    origen móvil mes a mes está en backtesting.py).
+
+    Estrategia para construir la fila de entrada:
+    ▸ Si hay registros reales en ese año:
+        • Variables numéricas  → mediana.
+        • Dummies / categóricas→ moda (0/1 más frecuente).
+    ▸ Si NO hay registros reales:
+        • Crea un vector “cero” (salvo la columna Year).
+    Devuelve un DataFrame:  Year | Pred | Real | AbsPct(%) .
+    """
+    rows: list[dict] = []
+
+    for yr in years:
+        df_yr = df_hist.loc[df_hist[year_col] == yr]
+
+        if df_yr.empty:
+            x_row = pd.DataFrame({c: 0 for c in X_cols}, index=[0])
+        else:
+            num_med = df_yr[X_cols].select_dtypes("number").median()
+            mode = df_yr[X_cols].mode().iloc[0]
+            x_row = pd.DataFrame([{**mode, **num_med}], columns=X_cols).fillna(0)
+
+        if year_col in X_cols:
+            x_row[year_col] = yr
+
+        pred = float(pipe.predict(x_row)[0])
+        real_vals = df_yr[target]
+        real = float(real_vals.mean()) if not real_vals.empty else np.nan
+        abs_pct = abs(pred - real) / real * 100 if not np.isnan(real) else np.nan
+
+        rows.append(dict(Year=yr, Pred=pred, Real=real, AbsPct=abs_pct))
+
+    return pd.DataFrame(rows)
+
+
+# ═══════════  IMPORTANCIA DE BANDERAS “FlagOut_*”  ═══════════════
+def low_importance_out_flags(
+    pipe: Pipeline,
+    X: pd.DataFrame,
+    threshold: float = 0.002,
+) -> Tuple[List[str], pd.Series]:
+    """
+    Identifica columnas que empiezan por **'FlagOut_'** y cuyo peso en el RF
+    es < *threshold* (0.2 %).
+
+    Retorna
+    -------
+    low_flags : list[str]
+        Columnas prescindibles.
+    out_imp   : pd.Series
+        Importancia completa (ordenada ‘desc’).
+    """
+    rf = pipe["rf"]
+    importances = pd.Series(rf.feature_importances_, index=X.columns)
+    mask = importances.index.str.startswith("FlagOut_")
+    out_imp = importances[mask].sort_values(ascending=False)
+    low_flags = out_imp[out_imp < threshold].index.tolist()
+    return low_flags, out_imp
+
+
+def drop_low_importance_flags(df: pd.DataFrame, low_flags: List[str]) -> pd.DataFrame:
+    """Elimina del DataFrame las columnas listadas en *low_flags*."""
+    return df.drop(columns=[c for c in low_flags if c in df.columns], errors="ignore")
+
+
+# ═══════ RECONSTRUIR 'Categoria' / 'Clase' A PARTIR DE DUMMIES ══
+def ensure_categoria_clase(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Garantiza que existan columnas **Categoria** y **Clase** con texto.
+
+    Si sólo hay dummies (Categoria_*, Clase_*), toma la columna de
+    mayor valor (=1) y extrae el sufijo.
+    """
+    if "Categoria" not in df.columns:
+        cat_dummies = [c for c in df.columns if c.startswith("Categoria_")]
+        if cat_dummies:
+            df["Categoria"] = (
+                df[cat_dummies].idxmax(axis=1).str.replace("Categoria_", "")
+            )
+
+    if "Clase" not in df.columns:
+        cls_dummies = [c for c in df.columns if c.startswith("Clase_")]
+        if cls_dummies:
+            df["Clase"] = df[cls_dummies].idxmax(axis=1).str.replace("Clase_", "")
+
+    return df
+
+
+# ════════════════ CONSTRUCCIÓN Y EVALUACIÓN DEL MODELO ═══════════════════
+def make_rf_pipeline(
+    n_estimators: int = 200,
+    max_depth: Optional[int] = None,
+    min_samples_leaf: int = 3,
+) -> Pipeline:
+    """
+    Genera un **Pipeline** que aplica:
+    1. `SelectKBest`  – filtro univariado (f-regression).
+       k="all": no descarta, pero deja el paso preparado para GridSearch.
+    2. `RandomForestRegressor` – modelo robusto a outliers y escalas.
+
+    Parámetros
+    ----------
+    n_estimators      : nº árboles; 200 es buen balance velocidad / varianza.
+    max_depth         : None → sin tope; valores bajos se prueban en grid.
+    min_samples_leaf  : regulariza nodos muy pequeños.
+    """
+    return Pipeline(
+        steps=[
+            ("selector",
+             SelectKBest(score_func=f_regression, k="all")),
+            ("rf",
+             RandomForestRegressor(
+                 n_estimators=n_estimators,
+                 max_depth=max_depth,
+                 min_samples_leaf=min_samples_leaf,
+                 n_jobs=N_JOBS_RF,
+                 random_state=RANDOM_STATE,
+             )
+            ),
+        ]
+    )
+
+
+def cierre_simplex(Y) -> np.ndarray:
+    """
+    Proyecta cada renglón de *Y* al simplex: recorta negativos a 0 y divide entre
+    la suma del renglón (un renglón en ceros queda uniforme).
+    """
+    Y = np.clip(np.asarray(Y, dtype=float), 0, None)
+    if Y.ndim == 1:
+        Y = Y.reshape(1, -1)
+    suma = Y.sum(axis=1, keepdims=True)
+    return np.divide(Y, suma, out=np.full_like(Y, 1 / Y.shape[1]), where=suma > 0)
+
+
+def f_regression_multisalida(X, Y):
+    """
+    `f_regression` para objetivos multisalida: promedio del estadístico F y mínimo
+    p-valor sobre las salidas (una salida constante aporta F = 0).
+    """
+    Y = np.asarray(Y)
+    if Y.ndim == 1:
+        return f_regression(X, Y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultados = [f_regression(X, Y[:, j]) for j in range(Y.shape[1])]
+    F = np.nan_to_num(np.mean([r[0] for r in resultados], axis=0))
+    p = np.nan_to_num(np.min([r[1] for r in resultados], axis=0), nan=1.0)
+    return F, p
+
+
+class RandomForestSimplex(RandomForestRegressor):
+    """
+    `RandomForestRegressor` multisalida para composiciones: cada renglón de y es
+    el porcentaje de cada par (Categoría, Clase) y suma 1.
+
+    `fit` cierra y al simplex antes de ajustar; como cada hoja promedia renglones
+    que suman 1, la predicción del bosque ya está en el simplex, y `predict` la
+    vuelve a cerrar para absorber el redondeo.
+    """
+
+    def fit(self, X, y, sample_weight=None):
+        return super().fit(X, cierre_simplex(y), sample_weight=sample_weight)
+
+    def predict(self, X):
+        return cierre_simplex(super().predict(X))
+
+
+def make_mix_pipeline(
+    n_estimators: int = 200,
+    max_depth: Optional[int] = None,
+    min_samples_leaf: int = 3,
+) -> Pipeline:
+    """
+    Igual que `make_rf_pipeline`, pero para el mix multisalida:
+    `SelectKBest` con `f_regression_multisalida` y `RandomForestSimplex`.
+    Los pasos conservan los nombres, así que `PARAM_GRID_RF` / `ESPACIO_RF`
+    aplican sin cambios.
+    """
+    return Pipeline(
+        steps=[
+            ("selector",
+             SelectKBest(score_func=f_regression_multisalida, k="all")),
+            ("rf",
+             RandomForestSimplex(
+                 n_estimators=n_estimators,
+                 max_depth=max_depth,
+                 min_samples_leaf=min_samples_leaf,
+                 n_jobs=N_JOBS_RF,
+                 random_state=RANDOM_STATE,
+             )
+            ),
+        ]
+    )
+
+
+def cv_mae_score(
+    pipe: Pipeline,
+    X: pd.DataFrame,
+    y: pd.Series,
+) -> float:
+    """
+    Calcula el **MAE medio** usando `TimeSeriesSplit`.
+
+    Devuelve el error como valor *positivo* (se multiplica por –1 internamente
+    porque sklearn reporta “neg_mean_absolute_error”). Los folds se sirven del
+    caché en disco (`cache_cv`) cuando ya se evaluaron con los mismos datos.
+    """
+    folds = list(TimeSeriesSplit(n_splits=N_SPLITS).split(X))
+    mae_neg = cache_cv.puntajes_cv(pipe, X, y, folds, SCORING, n_jobs=N_JOBS)
+    return -mae_neg.mean()
+
+
+def dummy_mae(X: pd.DataFrame, y: pd.Series) -> float:
+    """MAE CV del baseline naïf (`DummyRegressor` con la media)."""
+    folds = list(TimeSeriesSplit(n_splits=N_SPLITS).split(X))
+    return -cache_cv.puntajes_cv(DummyRegressor(strategy="mean"), X, y, folds, SCORING).mean()
+
+
+PARAM_GRID_RF = {
+    # mantener la malla pequeña acelera ~×5 sin bajar performance
+    "rf__n_estimators":     [200],
+    "rf__max_depth":       [None, 10],
+    "rf__min_samples_leaf": [3],
+}
+
+
+# Espacio amplio para la búsqueda "halving" (n_estimators es el recurso)
+ESPACIO_RF = {
+    "rf__max_depth":        [None, 5, 10, 20],
+    "rf__min_samples_leaf": [1, 2, 3, 5, 8],
+    "rf__max_features":     [1.0, 0.5, "sqrt"],
+}
+
+# Hiper-parámetros del RF que se guardan / reutilizan entre corridas
+HIPERPARAMETROS_RF = ["rf__n_estimators", "rf__max_depth",
+                      "rf__min_samples_leaf", "rf__max_features"]
+
+
+def _elegidos(pipe: Pipeline) -> dict:
+    params = pipe.get_params()
+    return {k: params[k] for k in HIPERPARAMETROS_RF}
+
+
+def _puntajes(candidatos: List[Pipeline], X, y, folds) -> np.ndarray:
+    """MAE CV (positivo) de cada candidato, vía `cache_cv`."""
+    tareas = [(c, tr, te) for c in candidatos for tr, te in folds]
+    resultados = cache_cv.evaluar_folds(tareas, X, y, SCORING, n_jobs=N_JOBS)
+    return -np.array([r["prueba"] for r in resultados]).reshape(len(candidatos), len(folds)).mean(axis=1)
+
+
+def _busqueda_malla(X, y, pipe: Pipeline) -> Tuple[Pipeline, float, dict]:
+    """
+    Búsqueda en malla sobre `PARAM_GRID_RF` (mismo resultado que **GridSearchCV**).
+    """
+    inicio = time.perf_counter()
+    folds = list(TimeSeriesSplit(n_splits=N_SPLITS).split(X))
+    candidatos = [clone(pipe).set_params(**p) for p in ParameterGrid(PARAM_GRID_RF)]
+    maes = _puntajes(candidatos, X, y, folds)
+
+    # Empates → primer candidato, como GridSearchCV
+    mejor = int(np.argmin(maes))
+    best_pipe = cache_cv.ajustar_completo(candidatos[mejor], X, y, SCORING, n_jobs=N_JOBS)
+    info = {
+        "metodo": "grid",
+        "candidatos": len(candidatos),
+        "ajustes": len(candidatos) * len(folds),
+        "arboles_ajustados": int(sum(c["rf"].n_estimators for c in candidatos) * len(folds)),
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "elegido": _elegidos(best_pipe),
+    }
+    return best_pipe, float(maes[mejor]), info
+
+
+def costo_malla() -> int:
+    """Árboles que ajusta la validación cruzada de `PARAM_GRID_RF`."""
+    return sum(p["rf__n_estimators"] for p in ParameterGrid(PARAM_GRID_RF)) * N_SPLITS
+
+
+def plan_halving(n_candidatos: int, max_arboles: int) -> List[Tuple[int, int]]:
+    """
+    Rondas (candidatos, árboles) de successive halving para *n_candidatos*.
+
+    Los árboles crecen ×FACTOR_HALVING por ronda hasta *max_arboles*; cuando queda
+    un solo candidato se salta directo a la ronda final (con *max_arboles*), que
+    da el MAE CV comparable con la malla.
+    """
+    recursos = [max(1, max_arboles // FACTOR_HALVING ** k)
+                for k in range(RONDAS_HALVING - 1, 0, -1)]
+    plan, n = [], n_candidatos
+    for arboles in recursos:
+        if n <= 1:
+            break
+        plan.append((n, arboles))
+        n = max(1, n // FACTOR_HALVING)
+    plan.append((n, max_arboles))
+    return plan
+
+
+def _candidatos_halving(pipe: Pipeline) -> List[dict]:
+    """Configuraciones de `ESPACIO_RF`: primero las de la malla, luego el resto al azar."""
+    espacio = list(ParameterGrid(ESPACIO_RF))
+    malla = [{k: v for k, v in p.items() if k in ESPACIO_RF} for p in ParameterGrid(PARAM_GRID_RF)]
+    base = {k: pipe.get_params()[k] for k in ESPACIO_RF}
+    primeros = [dict(base, **m) for m in malla]
+    resto = [p for p in espacio if p not in primeros]
+    orden = np.random.RandomState(RANDOM_STATE).permutation(len(resto))
+    return primeros + [resto[i] for i in orden]
+
+
+def busqueda_halving_rf(
+    X: pd.DataFrame,
+    y: pd.Series,
+    base_pipe: Pipeline | None = None,
+    presupuesto_arboles: Optional[int] = None,
+    presupuesto_segundos: Optional[float] = None,
+) -> Tuple[Pipeline, float, dict]:
+    """
+    **Successive halving** sobre `ESPACIO_RF` con `n_estimators` como recurso y
+    la misma validación temporal (`TimeSeriesSplit`).
+
+    1. Se eligen tantos candidatos como quepan en el presupuesto (árboles
+       ajustados en CV; por omisión, lo que cuesta la malla `PARAM_GRID_RF`).
+       Un presupuesto en segundos se estima con dos ajustes de prueba (costo
+       fijo por ajuste + costo por árbol); si se dan ambos, rige el menor.
+    2. Cada ronda evalúa a los sobrevivientes con más árboles y conserva el mejor
+       1/FACTOR_HALVING. Si se agota el tiempo se salta a la ronda final.
+    3. La ronda final evalúa al ganador con el n_estimators de la malla, así que
+       su MAE CV es comparable con el de `gridsearch_rf`.
+
+    Retorna (pipeline ajustado sobre todo X, MAE CV, resumen de la búsqueda).
+    """
+    inicio = time.perf_counter()
+    pipe = base_pipe or make_rf_pipeline()
+    folds = list(TimeSeriesSplit(n_splits=N_SPLITS).split(X))
+    max_arboles = max(PARAM_GRID_RF["rf__n_estimators"])
+    configuraciones = _candidatos_halving(pipe)
+
+    presupuesto = costo_malla() if presupuesto_arboles is None and presupuesto_segundos is None \
+        else presupuesto_arboles
+
+    def arboles_plan(n):
+        return N_SPLITS * sum(c * a for c, a in plan_halving(n, max_arboles))
+
+    cabe = [lambda n: presupuesto is None or arboles_plan(n) <= presupuesto]
+    if presupuesto_segundos is not None:
+        # Segundos por ajuste ≈ fijo + por_arbol × árboles, medido en el fold más grande
+        tr, te = folds[-1]
+        tiempos = []
+        for arboles in (plan_halving(len(configuraciones), max_arboles)[0][1], max_arboles):
+            t0 = time.perf_counter()
+            clone(pipe).set_params(rf__n_estimators=arboles).fit(X.iloc[tr], y.iloc[tr]).predict(X.iloc[te])
+            tiempos.append((arboles, time.perf_counter() - t0))
+        (a0, t0), (a1, t1) = tiempos
+        por_arbol = max(0.0, (t1 - t0) / max(1, a1 - a0))
+        fijo = max(0.0, t0 - por_arbol * a0)
+        nucleos = (os.cpu_count() or 1) if N_JOBS == -1 else N_JOBS
+        disponible = presupuesto_segundos - (time.perf_counter() - inicio)
+
+        def segundos_plan(n):
+            return N_SPLITS * sum(c * (fijo + por_arbol * a) for c, a in plan_halving(n, max_arboles)) / nucleos
+
+        cabe.append(lambda n: segundos_plan(n) <= disponible)
+
+    n0 = max([n for n in range(1, len(configuraciones) + 1) if all(f(n) for f in cabe)] or [1])
+    plan = plan_halving(n0, max_arboles)
+
+    vivos = configuraciones[:n0]
+    rondas, ajustes, arboles_ajustados = [], 0, 0
+    for i, (n, arboles) in enumerate(plan):
+        final = i == len(plan) - 1
+        if not final and presupuesto_segundos is not None \
+                and time.perf_counter() - inicio > presupuesto_segundos:
+            n, arboles, final = 1, max_arboles, True
+        vivos = vivos[:n]
+        candidatos = [clone(pipe).set_params(rf__n_estimators=arboles, **p) for p in vivos]
+        maes = _puntajes(candidatos, X, y, folds)
+        orden = np.argsort(maes, kind="stable")
+        vivos = [vivos[j] for j in orden]
+        ajustes += len(candidatos) * len(folds)
+        arboles_ajustados += len(candidatos) * len(folds) * arboles
+        rondas.append({"candidatos": len(candidatos), "arboles": arboles,
+                       "mejor_mae": float(maes[orden[0]])})
+        if final:
+            break
+
+    ganador = clone(pipe).set_params(rf__n_estimators=max_arboles, **vivos[0])
+    best_pipe = cache_cv.ajustar_completo(ganador, X, y, SCORING, n_jobs=N_JOBS)
+    info = {
+        "metodo": "halving",
+        "espacio": len(configuraciones),
+        "candidatos": n0,
+        "presupuesto_arboles": presupuesto,
+        "presupuesto_segundos": presupuesto_segundos,
+        "rondas": rondas,
+        "ajustes": ajustes,
+        "arboles_ajustados": arboles_ajustados,
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "elegido": _elegidos(best_pipe),
+    }
+    return best_pipe, rondas[-1]["mejor_mae"], info
+
+
+def buscar_rf(
+    X: pd.DataFrame,
+    y: pd.Series,
+    base_pipe: Pipeline | None = None,
+    busqueda: Optional[str] = None,
+) -> Tuple[Pipeline, float, dict]:
+    """
+    Búsqueda de hiper-parámetros según `busqueda` (None → `BUSQUEDA`):
+    "grid" recorre `PARAM_GRID_RF`; "halving" usa `busqueda_halving_rf` con
+    `PRESUPUESTO_ARBOLES` / `PRESUPUESTO_SEGUNDOS`.
+
+    Retorna (pipeline ajustado sobre todo X, MAE CV, resumen de la búsqueda para
+    los metadatos del modelo).
+    """
+    pipe = base_pipe or make_rf_pipeline()
+    busqueda = busqueda or BUSQUEDA
+    with tramo("entrenamiento.busqueda", {"busqueda": busqueda}, filas=len(X)):
+        if busqueda == "halving":
+            return busqueda_halving_rf(X, y, pipe, PRESUPUESTO_ARBOLES, PRESUPUESTO_SEGUNDOS)
+        return _busqueda_malla(X, y, pipe)
+
+
+def gridsearch_rf(
+    X: pd.DataFrame,
+    y: pd.Series,
+    base_pipe: Pipeline | None = None,
+) -> Tuple[Pipeline, float]:
+    """
+    Ejecuta la búsqueda con validación temporal y devuelve:
+    • `best_estimator_`  (Pipeline óptimo, ya ajustado sobre todo X)
+    • `best_mae`         (MAE CV positivo)
+
+    Con `BUSQUEDA = "grid"` (por omisión) recorre `PARAM_GRID_RF` con el mismo
+    resultado que **GridSearchCV**; con "halving" hace successive halving con
+    presupuesto (ver `buscar_rf`). Cada fold y el ajuste final pasan por
+    `cache_cv`, así que una búsqueda repetida sobre los mismos datos no vuelve a
+    entrenar.
+    """
+    best_pipe, best_mae, _ = buscar_rf(X, y, base_pipe)
+    return best_pipe, best_mae
+
+
+def save_pipeline(
+    pipe: Pipeline,
+    nombre: str,
+    mae_cv: float,
+    dataset: str,
+    *,
+    modo_ajuste: str = "grid",
+    mae_cv_referencia: Optional[float] = None,
+    busqueda: Optional[dict] = None,
+    n_estimators_busqueda: Optional[int] = None,
+) -> None:
+    """
+    Guarda:
+    • `models/<nombre>.pkl`   –  Pipeline entrenado (joblib).
+    • `almacen/`              –  mismo pipeline en `AlmacenModelos` (ver almacen_modelos.py).
+    • `models/<nombre>.json` –  metadatos reproducibles:
+        - dataset de origen
+        - arquitectura del modelo
+        - MAE CV y MAE de la última búsqueda completa (referencia de deriva)
+        - cómo se ajustó: "grid", "halving", "refit" o "warm_start"
+        - resumen de la búsqueda (candidatos, rondas, ajustes, segundos)
+        - timestamp y versión sklearn
+        - hiper-parámetros completos
+        - árboles de la búsqueda (`n_estimators_busqueda`; con "warm_start" el
+          bosque guardado en `parametros` tiene más)
+    """
+    pkl_file  = MODEL_PATH / f"{nombre}.pkl"
+    meta_file = MODEL_PATH / f"{nombre}.json"
+
+    joblib.dump(pipe, pkl_file)
+
+    meta = {
+        "dataset": dataset,
+        "modelo": "RandomForest + SelectKBest",
+        "mae_cv": mae_cv,
+        "mae_cv_referencia": mae_cv if mae_cv_referencia is None else mae_cv_referencia,
+        "modo_ajuste": modo_ajuste,
+        "fecha_entrenamiento": datetime.now().isoformat(timespec="seconds"),
+        "sklearn_version": sklearn.__version__,
+        "n_splits": N_SPLITS,
+        "parametros": pipe.get_params(),
+        "n_estimators_busqueda": (pipe["rf"].n_estimators if n_estimators_busqueda is None
+                                  else n_estimators_busqueda),
+    }
+    if busqueda is not None:
+        meta["busqueda"] = busqueda
+    meta_file.write_text(json.dumps(meta, indent=2, default=str))
+
+    # Registro en el almacén direccionado por contenido (índice + árboles mapeables)
+    AlmacenModelos().guardar(pipe, nombre, json.loads(meta_file.read_text()))
+
+
+def cargar_modelo_guardado(nombre: str) -> Optional[Tuple[Pipeline, dict]]:
+    """Pipeline y metadatos de `models/<nombre>.*`, o `None` si falta alguno."""
+    pkl_file  = MODEL_PATH / f"{nombre}.pkl"
+    meta_file = MODEL_PATH / f"{nombre}.json"
+    if not (pkl_file.exists() and meta_file.exists()):
+        return None
+    return joblib.load(pkl_file), json.loads(meta_file.read_text())
+
+
+def hiperparametros_guardados(meta: dict) -> dict:
+    """
+    `HIPERPARAMETROS_RF` de los metadatos de un modelo, con los árboles de la
+    búsqueda y no los acumulados por "warm_start".
+    """
+    params = {k: v for k, v in meta.get("parametros", {}).items() if k in HIPERPARAMETROS_RF}
+    if "n_estimators_busqueda" in meta:
+        params["rf__n_estimators"] = meta["n_estimators_busqueda"]
+    return params
+
+
+def ajustar_modelo(
+    X: pd.DataFrame,
+    y: pd.Series,
+    nombre: str,
+    reusar: Optional[str] = None,
+) -> Tuple[Pipeline, float, pd.DataFrame, dict]:
+    """
+    Ajusta el RF de *nombre* reutilizando, si se pide, el modelo guardado.
+
+    reusar
+    ------
+    None          → búsqueda completa (`buscar_rf`).
+    "refit"       → reajusta con los hiper-parámetros de `models/<nombre>.json`
+                    sobre los datos extendidos.
+    "warm_start"  → conserva los árboles del pipeline guardado y agrega
+                    `ARBOLES_WARM_START` entrenados sobre los datos extendidos,
+                    sin pasar de `TOPE_WARM_START` × los árboles de la búsqueda
+                    (se descartan los más viejos).
+
+    Al reutilizar se calcula el MAE CV con los hiper-parámetros guardados; si supera
+    `mae_cv_referencia × (1 + UMBRAL_DERIVA_MAE)` (o el modelo no existe, o usa
+    columnas que ya no están) se vuelve a la búsqueda completa. X se restringe a las
+    columnas del modelo guardado, así que las banderas depuradas siguen fuera.
+
+    Retorna
+    -------
+    (pipeline ajustado, MAE CV, X usada, ajuste) donde *ajuste* son los argumentos
+    de `save_pipeline`: modo_ajuste ("grid" | "halving" | "refit" | "warm_start"),
+    mae_cv_referencia, busqueda (None si no hubo búsqueda) y n_estimators_busqueda
+    (None: los del pipeline).
+    """
+    guardado = cargar_modelo_guardado(nombre) if reusar else None
+    if guardado is not None:
+        pipe_prev, meta = guardado
+        columnas = list(getattr(pipe_prev, "feature_names_in_", []))
+        if columnas and set(columnas) <= set(X.columns):
+            X_prev = X[columnas]
+            params = hiperparametros_guardados(meta)
+            pipe = make_rf_pipeline().set_params(**params)
+            mae_cv = cv_mae_score(pipe, X_prev, y)
+            referencia = meta.get("mae_cv_referencia", meta["mae_cv"])
+            if mae_cv <= referencia * (1 + UMBRAL_DERIVA_MAE):
+                arboles = pipe["rf"].n_estimators
+                if reusar == "warm_start":
+                    pipe = pipe_prev
+                    rf = pipe["rf"]
+                    conservar = max(TOPE_WARM_START * arboles - ARBOLES_WARM_START, 0)
+                    rf.estimators_ = rf.estimators_[max(len(rf.estimators_) - conservar, 0):]
+                    rf.set_params(
+                        warm_start=True,
+                        n_estimators=len(rf.estimators_) + ARBOLES_WARM_START,
+                        n_jobs=N_JOBS_RF,
+                    )
+                    with tramo("entrenamiento.ajuste", {"tipo": "warm_start",
+                                                        "estimador": type(pipe["rf"]).__name__},
+                               filas=len(X_prev)):
+                        pipe.fit(X_prev, y)
+                    pipe["rf"].set_params(warm_start=False)
+                else:
+                    pipe = cache_cv.ajustar_completo(pipe, X_prev, y, SCORING, n_jobs=N_JOBS)
+                return pipe, mae_cv, X_prev, {"modo_ajuste": reusar,
+                                              "mae_cv_referencia": referencia,
+                                              "busqueda": None,
+                                              "n_estimators_busqueda": arboles}
+            print(f"[deriva] {nombre}: MAE CV {mae_cv:,.1f} > referencia {referencia:,.1f} "
+                  f"(+{UMBRAL_DERIVA_MAE:.0%}) → búsqueda completa")
+
+    pipe, mae_cv, info = buscar_rf(X, y)
+    return pipe, mae_cv, X, {"modo_ajuste": info["metodo"],
+                             "mae_cv_referencia": mae_cv,
+                             "busqueda": info}
+
+
+def fila_futura(
+    X_cols: List[str],
+    future_year: int = ANIO_PROYECCION,
+    year_col: str = "Year",
+) -> pd.DataFrame:
+    """FILA “vacía” (todas las features = 0 salvo `Year`) para proyectar."""
+    X_future = pd.DataFrame({c: 0 for c in X_cols}, index=[0])
+    X_future[year_col] = future_year
+    return X_future
+
+
+def proyectar_anyo(
+    pipe: Pipeline,
+    X_cols: List[str],
+    *,
+    future_year: int = ANIO_PROYECCION,
+    year_col: str = "Year",
+) -> float:
+    """
+    Genera una FILA “vacía” (todas las features = 0 salvo `Year`)
+    y devuelve la predicción del Pipeline.
+
+    Usado para proyecciones a 2040, pero admite cualquier año.
+    """
+    return float(pipe.predict(fila_futura(X_cols, future_year, year_col))[0])
+
+
+# ═════════════════════ CARGA Y PREPARACIÓN ═════════════════════
+def cargar_csv_features(nombre_archivo: str) -> pd.DataFrame:
+    """
+    Carga un CSV de BASE_PATH, desde su Parquet (data/parquet/) si está al día con
+    el CSV (ver almacenamiento.cargar_dataset).
+    """
+    return cargar_dataset(nombre_archivo, directorio=str(BASE_PATH))
+
+
+def asegurar_columna_year(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Asegura que el DataFrame tenga una columna 'Year'. Si ya existe, no hace nada.
+    Si no existe, intenta crearla a partir de otras columnas.
+    """
+    if "Year" in df.columns:
+        return df
+
+    posibles = ["AñoArchivo", "Año", "Anio", "AnioArchivo", "Periodo"]
+    for col in posibles:
+        if col in df.columns:
+            df["Year"] = df[col]
+            return df
+
+    raise ValueError(f"No se encontró alguna que se convierta en 'Year'. Columnas disponibles: {df.columns.tolist()}")
+
+
+def split_Xy(
+    df: pd.DataFrame,
+    target: str,
+    drop_cols: list[str] = None
+) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Separa un DataFrame en X (features) e y (target), excluyendo columnas no numéricas.
+
+    Parámetros:
+    - df: DataFrame original
+    - target: nombre de la columna objetivo
+    - drop_cols: lista opcional de columnas a eliminar de X
+
+    Retorna:
+    - X: DataFrame con sólo variables numéricas
+    - y: Serie con el objetivo
+    """
+    df = df.copy()
+    y = df[target]
+    drop_cols = drop_cols or []
+    base_excluir = [target] + drop_cols
+    X = df.drop(columns=base_excluir, errors="ignore")
+    X = X.select_dtypes(include=["number"])  # Solo numéricas
+    return X, y
+
+
+def asegurar_features_paises() -> None:
+    """
+    Genera paises_features.csv desde el consolidado si no existe (no se versiona).
+
+    Se llama una vez en el proceso principal, antes de repartir unidades a un pool.
+    """
+    if not (BASE_PATH / "paises_features.csv").exists():
+        from pronosticos.caracteristicas import actualizar_caracteristicas
+        print("Generando paises_features.csv…")
+        actualizar_caracteristicas("paises", features_dir=str(BASE_PATH))
+
+
+def cargar_paises(compacto: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Carga paises_features.csv con los nombres de país en mayúsculas.
+
+    Con *compacto* (por omisión, el modo con que se generó la matriz) las banderas
+    quedan en uint8 y las medidas derivadas en float32 (ver caracteristicas.compactar).
+    """
+    from pronosticos.caracteristicas import compactar, modo_compacto
+
+    df_paises = cargar_csv_features("paises_features.csv")
+    df_paises["NombrePais"] = df_paises["NombrePais"].str.upper()
+    if compacto is None:
+        compacto = modo_compacto("paises", str(BASE_PATH))
+    return compactar(df_paises, "paises") if compacto else df_paises
+
+
+def top_paises(df_paises: pd.DataFrame, n: int = 10) -> List[str]:
+    """Los *n* mayores destinos por volumen histórico."""
+    return (df_paises.groupby("NombrePais")["Total_Pais_Mes"]
+                     .sum()
+                     .nlargest(n)
+                     .index.tolist())
+
+
+def pares_categoria_clase(df_paises: pd.DataFrame, pais: str) -> List[Tuple[str, str]]:
+    """Pares (Categoria, Clase) de un país con datos suficientes para validar."""
+    df_p = preparar_mix(df_paises, pais)
+    if df_p is None:
+        return []
+    tamanos = df_p.groupby(["Categoria", "Clase"]).size()
+    return [par for par, n in tamanos.items() if n >= 2 * N_SPLITS]
+
+
+def id_modelo_pais(pais: str) -> str:
+    """Nombre del modelo individual de *pais* en models/ (`pais_total_<pais>`)."""
+    return f"pais_total_{pais.lower().replace(' ', '_')}"
+
+
+def preparar_pais_total(
+    df_paises: pd.DataFrame,
+    pais: str,
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, pd.Series]]:
+    """
+    Histórico del total de un país (`<=2022`, un registro por año, sin outliers
+    IQR) y su split X / y con `Year`. Devuelve (df_p, X, y) o `None` sin datos.
+    """
+    df_p = df_paises[df_paises["NombrePais"] == pais].copy()
+    if df_p.empty:
+        return None
+
+    df_p = asegurar_columna_year(df_p)
+    df_p = df_p[df_p["Year"] <= ANIO_CORTE].drop_duplicates(subset=["Year"])
+    df_p = df_p[~detectar_outliers_iqr(df_p["Total_Pais_Mes"])]
+
+    X, y = split_Xy(
+        df_p,
+        target="Total_Pais_Mes",
+        drop_cols=["Year_Binned"] if "Year_Binned" in df_p else None,
+    )
+    X = X.assign(Year=df_p["Year"].values)
+    return df_p, X, y
+
+
+def preparar_consolidado(
+    nombre_archivo: str,
+    target: str,
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, pd.Series]]:
+    """
+    Histórico de un consolidado (`<=2022`, sin filas sin target) y su split
+    X / y con `Year`. Devuelve (df, X, y) o `None` si no hay datos válidos.
+    """
+    df = cargar_csv_features(nombre_archivo)
+    df = asegurar_columna_year(df)
+    df = df[df["Year"] <= ANIO_CORTE]
+
+    # Validación: eliminar filas sin target
+    df = df.dropna(subset=[target])
+    if df.empty:
+        return None
+
+    X, y = split_Xy(df, target)
+    X = X.assign(Year=df["Year"].values)
+    return df, X, y
+
+
+# ═════════════════════ MODELOS ═════════════════════
+def entrenar_pais_total(
+    df_paises: pd.DataFrame,
+    pais: str,
+    reusar: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Entrena un `RandomForest` (vía ``gridsearch_rf``) para el país indicado y
+    proyecta los litros exportados **en 2040**.
+
+    Etapas
+    ------
+    1.   Filtrado & limpieza del histórico (`<=2022`, sin outliers IQR).
+    2.   Split **X / y** conservando solo variables numéricas.
+    3.   Dummy-baseline (``DummyRegressor``) → MAE de referencia.
+    4.   GridSearchCV con TimeSeriesSplit:
+         * refina hiper-parámetros en `PARAM_GRID_RF`.
+    5.   *Embedded feature selection*: descarta `FlagOut_*` poco relevantes
+         (<0.2 % de importancia).
+    6.   Guarda el pipeline + metadatos (`save_pipeline`); la curva de
+         aprendizaje y las importancias se generan aparte (diagnosticos.py).
+    7.   Back-casting a años “pasados” (`BACKCAST_YEARS`) para auditar exactitud.
+
+    Parameters
+    ----------
+    df_paises : DataFrame
+        Dataset completo con *features* y objetivos.
+    pais : str
+        Nombre (uppercase) del país a modelar.
+    reusar : {None, "refit", "warm_start"}
+        Re-entrenamiento a partir del modelo guardado (ver `ajustar_modelo`);
+        los pasos 4 y 5 se omiten salvo que haya deriva.
+
+    Returns
+    -------
+    dict | None
+        Renglón de métricas {Dataset, Pais, MAE_CV, Pred_2040}, o `None` si no
+        hay registros del país. No escribe metricas_paises.csv: de eso se encarga
+        quien llama (`run_pais_total` o el orquestador).
+    """
+    preparar_directorios()
+
+    # --- Selección, pre-procesamiento y división X / y --------------------
+    datos = preparar_pais_total(df_paises, pais)
+    if datos is None:
+        print(f"[warn] No hay registros para '{pais}'.")
+        return None
+    df_p, X, y = datos
+
+    # --- Baseline naïf ----------------------------------------------------
+    mae_dummy = dummy_mae(X, y)
+
+    # --- Grid-search RF (o re-uso del modelo guardado) ---------------------
+    model_id = id_modelo_pais(pais)
+    best_pipe, mae_cv, X, ajuste = ajustar_modelo(X, y, model_id, reusar)
+
+    # --- Limpieza de FlagOut_* irrelevantes (sólo tras una búsqueda) -------
+    low_flags, _ = low_importance_out_flags(best_pipe, X, threshold=0.002)
+    if low_flags and ajuste["busqueda"] is not None:
+        X2 = drop_low_importance_flags(X, low_flags)
+        if X2.shape[1] < X.shape[1]:                # se descartó algo
+            pipe2, mae_cv2, info2 = buscar_rf(X2, y)
+            if mae_cv2 <= mae_cv + 1:               # mejora (±1 L toler.)
+                best_pipe, mae_cv, X = pipe2, mae_cv2, X2
+                ajuste = dict(ajuste, mae_cv_referencia=mae_cv, busqueda=info2)
+
+    # --- Serializar modelo -----------------------------------------------
+    save_pipeline(best_pipe, model_id, mae_cv, dataset="paises", **ajuste)
+
+    # --- Proyección 2040 --------------------------------------------------
+    pred_2040 = proyectar_anyo(best_pipe, X.columns.tolist(), future_year=ANIO_PROYECCION)
+    print(f"\n {pais:25s} | MAE CV: {mae_cv:,.1f} | Pred 2040: {pred_2040:,.0f} L  "
+          f"(Dummy MAE: {mae_dummy:,.1f})")
+
+    # --- Check umbral -----------------------------------------------------
+    print("Modelo dentro del desempeño mínimo" if mae_cv <= UMBRAL_MAE else "Modelo por encima del umbral de MAE")
+
+    # --- Back-cast --------------------------------------------------------
+    back_df = backcast_years(best_pipe, X.columns.tolist(), df_p,
+                             "Total_Pais_Mes", BACKCAST_YEARS)
+    print("Back-cast:")
+    print(back_df.to_string(index=False,
+                            formatters={
+                                "Pred": "{:,.0f}".format,
+                                "Real": "{:,.0f}".format,
+                                "AbsPct": lambda x: f"{x:.1f}%"
+                                    if not np.isnan(x) else "N/A"}))
+    back_df.to_csv(RESULT_PATH / f"backcast_{pais}.csv", index=False)
+
+    return {"Dataset": "paises", "Pais": pais,
+            "MAE_CV": mae_cv, "Pred_2040": pred_2040}
+
+
+def run_pais_total(
+    df_paises: pd.DataFrame,
+    pais: str,
+    reusar: Optional[str] = None,
+) -> Optional[float]:
+    """
+    `entrenar_pais_total` + registro en metricas_paises.csv.
+
+    Devuelve los litros estimados para 2040 (o `None` sin datos).
+    """
+    metricas = entrenar_pais_total(df_paises, pais, reusar)
+    if metricas is None:
+        return None
+    guardar_metricas_csv(metricas, RESULT_PATH / "metricas_paises.csv")
+    return metricas["Pred_2040"]
+
+
+def preparar_mix(df_paises: pd.DataFrame, pais: str) -> Optional[pd.DataFrame]:
+    """Histórico de un país con Categoria/Clase y el porcentaje de cada fila."""
+    df_p = df_paises[df_paises["NombrePais"] == pais].copy()
+    if df_p.empty:
+        return None
+    df_p = asegurar_columna_year(df_p)
+    df_p = ensure_categoria_clase(df_p)
+    df_p = df_p[df_p["Year"] <= ANIO_CORTE]
+    df_p["Porcentaje"] = df_p["Total_Categoria_Mes"] / df_p["Total_Pais_Mes"]
+    return df_p
+
+
+def entrenar_mix(df_cc: pd.DataFrame) -> float:
+    """
+    RF simple para un par (Categoria, Clase): devuelve el porcentaje
+    (sin normalizar) proyectado a 2040.
+    """
+    X, y = split_Xy(df_cc, target="Porcentaje",
+                    drop_cols=["Year_Binned"] if "Year_Binned" in df_cc else None)
+    X["Year"] = df_cc["Year"].values
+    pipe, _ = gridsearch_rf(X, y)
+    return proyectar_anyo(pipe, X.columns.tolist(), future_year=ANIO_PROYECCION)
+
+
+def guardar_porcentajes(
+    pais: str,
+    porcentajes: List[Tuple[str, str, float]],
+    total_2040: float,
+) -> None:
+    """
+    Normaliza los porcentajes (Σ = 1), los traduce a litros y los guarda en
+    `porcentaje_<pais>_2040.csv`.
+    """
+    total_pct = sum(p for _, _, p in porcentajes) or 1e-9
+    resultados_norm = [
+        (c, cl, pct / total_pct, pct * total_2040 / total_pct)
+        for c, cl, pct in porcentajes
+    ]
+
+    print(f"\nDistribución 2040 – {pais}")
+    for c, cl, pct, litros in resultados_norm:
+        print(f"{c:15s} | {cl:15s} : {pct:6.2%}  (~{litros:,.0f} L)")
+
+    (pd.DataFrame(resultados_norm,
+                  columns=["Categoria", "Clase",
+                           "Porcentaje_Normalizado", "Litros_Estimados"])
+     .to_csv(RESULT_PATH / f"porcentaje_{pais}_2040.csv", index=False))
+
+
+def preparar_mix_multisalida(
+    df_paises: pd.DataFrame,
+    pais: str,
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Datos del mix multisalida de un país: un renglón por periodo (`Fecha`).
+
+    - Y: porcentaje de cada par de `pares_categoria_clase` en el periodo (0 si
+      el par no aparece), cerrado al simplex.
+    - X: las features numéricas que son iguales para todos los pares del
+      periodo (mes, totales del país, continente, `Year`…); las que cambian
+      por par (totales de categoría, PCA, dummies de clase) no describen al
+      periodo y se descartan.
+
+    Devuelve (X, Y) en orden cronológico, o `None` si el país no tiene pares.
+    """
+    df_p = preparar_mix(df_paises, pais)
+    if df_p is None:
+        return None
+    tamanos = df_p.groupby(["Categoria", "Clase"]).size()
+    pares = [par for par, n in tamanos.items() if n >= 2 * N_SPLITS]
+    if not pares:
+        return None
+    df_p = df_p[pd.MultiIndex.from_frame(df_p[["Categoria", "Clase"]]).isin(pares)]
+
+    Y = (df_p.pivot_table(index="Fecha", columns=["Categoria", "Clase"],
+                          values="Porcentaje", aggfunc="mean")
+             .reindex(columns=pd.MultiIndex.from_tuples(pares, names=["Categoria", "Clase"]))
+             .fillna(0))
+    Y = pd.DataFrame(cierre_simplex(Y), index=Y.index, columns=Y.columns)
+
+    numericas, _ = split_Xy(df_p, target="Porcentaje",
+                            drop_cols=["Year_Binned"] if "Year_Binned" in df_p else None)
+    por_periodo = numericas.groupby(df_p["Fecha"])
+    comunes = [c for c in numericas.columns if por_periodo[c].nunique(dropna=False).max() <= 1]
+    X = por_periodo[comunes].first().loc[Y.index]
+    return X, Y
+
+
+def entrenar_mix_multisalida(
+    df_paises: pd.DataFrame,
+    pais: str,
+) -> Optional[Tuple[List[Tuple[str, str, float]], dict]]:
+    """
+    Un solo `RandomForestSimplex` (una búsqueda) para todos los pares
+    (Categoría, Clase) del país, en lugar de una búsqueda por par.
+
+    Returns
+    -------
+    (porcentajes, métricas) | None
+        porcentajes: [(Categoria, Clase, porcentaje 2040)] que ya suman 1.
+        métricas: {Pais, Modo, Pares, Periodos, MAE_CV, MAE_Dummy, Segundos};
+        el MAE es en fracción del total (0.01 = 1 punto porcentual).
+    """
+    datos = preparar_mix_multisalida(df_paises, pais)
+    if datos is None:
+        return None
+    inicio = time.perf_counter()
+    X, Y = datos
+    mae_dummy = dummy_mae(X, Y)
+    pipe, mae_cv, _ = buscar_rf(X, Y, make_mix_pipeline())
+    pred = pipe.predict(fila_futura(X.columns.tolist(), ANIO_PROYECCION))[0]
+
+    porcentajes = [(cat, cls, float(p)) for (cat, cls), p in zip(Y.columns, pred)]
+    metricas = {"Pais": pais, "Modo": "multisalida", "Pares": Y.shape[1],
+                "Periodos": Y.shape[0], "MAE_CV": mae_cv, "MAE_Dummy": float(mae_dummy),
+                "Segundos": round(time.perf_counter() - inicio, 3)}
+    return porcentajes, metricas
+
+
+def comparar_mix(
+    pais: str,
+    porcentajes: List[Tuple[str, str, float]],
+) -> dict:
+    """
+    Diferencia entre *porcentajes* y el `porcentaje_<pais>_2040.csv` que ya
+    existe (p. ej. el del modo "pares"), en puntos porcentuales.
+
+    Devuelve {Pares_Comunes, Dif_Media_pp, Dif_Max_pp}; vacío si no hay archivo.
+    """
+    archivo = RESULT_PATH / f"porcentaje_{pais}_2040.csv"
+    if not archivo.exists():
+        return {}
+    previo = pd.read_csv(archivo).set_index(["Categoria", "Clase"])["Porcentaje_Normalizado"]
+    nuevo = pd.Series({(c, cl): p for c, cl, p in porcentajes})
+    comunes = previo.index.intersection(nuevo.index)
+    if comunes.empty:
+        return {"Pares_Comunes": 0}
+    dif = (nuevo[comunes] - previo[comunes]).abs() * 100
+    return {"Pares_Comunes": len(comunes),
+            "Dif_Media_pp": float(dif.mean()), "Dif_Max_pp": float(dif.max())}
+
+
+def guardar_mix_multisalida(
+    pais: str,
+    porcentajes: List[Tuple[str, str, float]],
+    metricas: dict,
+    total_2040: float,
+) -> None:
+    """
+    Registra en `metricas_mix.csv` el MAE CV y la diferencia contra el
+    porcentaje_<pais>_2040.csv anterior, y luego lo sobrescribe.
+    """
+    metricas = dict(metricas, **comparar_mix(pais, porcentajes))
+    guardar_metricas_csv(metricas, RESULT_PATH / "metricas_mix.csv")
+    print(f"\nMix multisalida – {pais}: MAE CV {metricas['MAE_CV']:.2%} "
+          f"(Dummy {metricas['MAE_Dummy']:.2%})"
+          + (f" | vs. anterior: {metricas['Dif_Media_pp']:.2f} pp en promedio, "
+             f"{metricas['Dif_Max_pp']:.2f} pp máx." if "Dif_Media_pp" in metricas else ""))
+    guardar_porcentajes(pais, porcentajes, total_2040)
+
+
+def run_porcentaje_categoria_clase(
+    df_paises: pd.DataFrame,
+    pais: str,
+    total_2040: float,
+    modo: str = "pares",
+) -> None:
+    """
+    Estima la composición porcentual (Categoría, Clase) del volumen total
+    **proyectado para 2040** y la traduce a litros.
+
+    modo
+    ----
+    "pares"        → un RF simple (con su búsqueda) por cada par (cat, clase);
+                     luego se normalizan los porcentajes para garantizar Σ = 1.
+    "multisalida"  → un solo `RandomForestSimplex` por país
+                     (`entrenar_mix_multisalida`); Σ = 1 por construcción.
+    """
+    if modo not in MODOS_MIX:
+        raise ValueError(f"Modo de mix desconocido: {modo!r}")
+    if total_2040 is None:
+        return
+    if modo == "multisalida":
+        resultado = entrenar_mix_multisalida(df_paises, pais)
+        if resultado is not None:
+            guardar_mix_multisalida(pais, *resultado, total_2040)
+        return
+
+    df_p = preparar_mix(df_paises, pais)
+    if df_p is None:
+        return
+
+    porcentajes: list[tuple[str, str, float]] = []
+    for (cat, cls), df_cc in df_p.groupby(["Categoria", "Clase"]):
+        if df_cc.shape[0] < 2 * N_SPLITS:
+            continue
+        porcentajes.append((cat, cls, entrenar_mix(df_cc)))
+
+    guardar_porcentajes(pais, porcentajes, total_2040)
+
+
+# ═════════════════════ MODELO GLOBAL (TODOS LOS PAÍSES) ═════════════════════
+# ── nombre del modelo global y columna con el código de país
+MODELO_GLOBAL = "global_paises"
+COL_PAIS = "Pais_Codigo"
+
+
+def codigos_pais(df_paises: pd.DataFrame) -> pd.Series:
+    """
+    Código de cada país para el modelo global: su rango por volumen histórico
+    (0 = mayor destino). Al ser ordinal por tamaño, pocos cortes del árbol
+    separan destinos grandes de chicos.
+    """
+    volumen = df_paises.groupby("NombrePais")["Total_Pais_Mes"].sum()
+    orden = volumen.sort_values(ascending=False, kind="stable").index
+    return pd.Series(np.arange(len(orden)), index=orden, name=COL_PAIS)
+
+
+def preparar_global(df_paises: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+    """
+    Histórico de todos los países con la limpieza de `entrenar_pais_total`
+    (≤ ANIO_CORTE, un registro por año, sin outliers IQR del propio país), en una
+    sola pasada con groupby en lugar de un filtro por país.
+
+    Retorna (df_hist, X, y) ordenados por (Year, código de país), de modo que
+    `TimeSeriesSplit` valide hacia adelante en el tiempo para todos a la vez.
+    X lleva `Year` y `COL_PAIS`.
+    """
+    codigos = codigos_pais(df_paises)
+    df = asegurar_columna_year(df_paises.copy())
+    df = df[df["Year"] <= ANIO_CORTE].drop_duplicates(subset=["NombrePais", "Year"])
+    outlier = df.groupby("NombrePais")["Total_Pais_Mes"].transform(detectar_outliers_iqr)
+    df = df[~outlier.astype(bool)]
+    df = (df.assign(**{COL_PAIS: df["NombrePais"].map(codigos).values})
+            .sort_values(["Year", COL_PAIS], kind="stable")
+            .reset_index(drop=True))
+
+    X, y = split_Xy(df, target="Total_Pais_Mes",
+                    drop_cols=["Year_Binned"] if "Year_Binned" in df else None)
+    X = X.assign(Year=df["Year"].values, **{COL_PAIS: df[COL_PAIS].values})
+    return df, X, y
+
+
+def mae_cv_por_grupo(
+    pipe: Pipeline,
+    X: pd.DataFrame,
+    y: pd.Series,
+    grupos: pd.Series,
+) -> pd.Series:
+    """
+    MAE de validación (predicciones fuera de muestra de los folds de
+    `TimeSeriesSplit`) desglosado por grupo, con los hiper-parámetros de *pipe*.
+
+    Los folds son los mismos de la búsqueda, así que salen de `cache_cv` sin
+    volver a entrenar. Los grupos que nunca caen en un fold de prueba no aparecen.
+    """
+    candidato = make_rf_pipeline().set_params(**_elegidos(pipe))
+    folds = list(TimeSeriesSplit(n_splits=N_SPLITS).split(X))
+    resultados = cache_cv.evaluar_folds([(candidato, tr, te) for tr, te in folds],
+                                        X, y, SCORING, n_jobs=N_JOBS)
+    errores = pd.Series(np.nan, index=X.index)
+    for (_, prueba), r in zip(folds, resultados):
+        errores.iloc[prueba] = np.abs(r["modelo"].predict(X.iloc[prueba]) - y.iloc[prueba].to_numpy())
+    return errores.groupby(np.asarray(grupos)).mean().dropna()
+
+
+def backcast_global(
+    pipe: Pipeline,
+    X: pd.DataFrame,
+    y: pd.Series,
+    df_hist: pd.DataFrame,
+    codigos: pd.Series,
+    years: List[int] = BACKCAST_YEARS,
+) -> pd.DataFrame:
+    """
+    `backcast_years` para todos los países con un solo `predict`: la fila de
+    (país, año) es su registro real (un registro por año tras la limpieza) o,
+    si no existe, el vector “cero” con `Year` y `COL_PAIS`.
+
+    Devuelve Pais | Year | Pred | Real | AbsPct.
+    """
+    llave = pd.MultiIndex.from_arrays([df_hist["NombrePais"], df_hist["Year"]], names=["Pais", "Year"])
+    combos = pd.MultiIndex.from_product([codigos.index, years], names=["Pais", "Year"])
+    X_back = X.set_axis(llave).reindex(combos).fillna(0)
+    X_back["Year"] = combos.get_level_values("Year")
+    X_back[COL_PAIS] = codigos.reindex(combos.get_level_values("Pais")).values
+
+    real = y.set_axis(llave).reindex(combos).to_numpy()
+    pred = pipe.predict(X_back.reset_index(drop=True))
+    return pd.DataFrame({
+        "Pais": combos.get_level_values("Pais"),
+        "Year": combos.get_level_values("Year"),
+        "Pred": pred,
+        "Real": real,
+        "AbsPct": np.abs(pred - real) / real * 100,
+    })
+
+
+def comparar_global(metricas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agrega a *metricas* el MAE CV y la proyección 2040 del último modelo
+    individual de cada país (`metricas_paises.csv`), si existe.
+    """
+    archivo = RESULT_PATH / "metricas_paises.csv"
+    if not archivo.exists():
+        return metricas
+    individual = (pd.read_csv(archivo)
+                    .drop_duplicates(subset=["Pais"], keep="last")
+                    .set_index("Pais")[["MAE_CV", "Pred_2040"]]
+                    .add_suffix("_Individual"))
+    return metricas.join(individual, on="Pais")
+
+
+def entrenar_global(
+    df_paises: pd.DataFrame,
+    reusar: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Un solo `RandomForest` para **todos** los destinos, con el país como feature
+    (`COL_PAIS`), en lugar de una búsqueda, curva y artefactos por país.
+
+    Etapas
+    ------
+    1.   `preparar_global` → histórico limpio de todos los países.
+    2.   Dummy-baseline y búsqueda (`ajustar_modelo`, admite `reusar`).
+    3.   MAE CV por país con las predicciones fuera de muestra de la búsqueda.
+    4.   Proyección 2040 y back-cast de todos los países (un `predict` cada uno).
+         La fila de 2040 de cada país es su último registro con `Year` = 2040:
+         el vector “cero” de `proyectar_anyo` borra las features que distinguen
+         a un país de otro y casi todos caerían en la misma hoja.
+    5.   Guarda `models/global_paises.*`, `metricas_global.csv` y
+         `backcast_global.csv` (gráficas bajo demanda con diagnosticos.py).
+
+    Returns
+    -------
+    DataFrame
+        Un renglón por país: Dataset, Pais, Pais_Codigo, Registros, MAE_CV,
+        Pred_2040, Backcast_AbsPct y, si hay modelos individuales en
+        metricas_paises.csv, MAE_CV_Individual / Pred_2040_Individual.
+    """
+    preparar_directorios()
+    inicio = time.perf_counter()
+
+    df_hist, X, y = preparar_global(df_paises)
+    mae_dummy = dummy_mae(X, y)
+    best_pipe, mae_cv, X, ajuste = ajustar_modelo(X, y, MODELO_GLOBAL, reusar)
+    save_pipeline(best_pipe, MODELO_GLOBAL, mae_cv, dataset="paises", **ajuste)
+
+    codigos = df_hist.groupby("NombrePais")[COL_PAIS].first().sort_values()
+    mae_pais = mae_cv_por_grupo(best_pipe, X, y, df_hist["NombrePais"])
+
+    futuro = X.set_axis(df_hist["NombrePais"]).groupby(level=0).tail(1).reindex(codigos.index)
+    futuro["Year"] = ANIO_PROYECCION
+    pred_2040 = best_pipe.predict(futuro.reset_index(drop=True))
+
+    back_df = backcast_global(best_pipe, X, y, df_hist, codigos)
+    back_df.to_csv(RESULT_PATH / "backcast_global.csv", index=False)
+
+    metricas = pd.DataFrame({
+        "Dataset": "paises",
+        "Pais": codigos.index,
+        COL_PAIS: codigos.values,
+        "Registros": df_hist.groupby("NombrePais").size().reindex(codigos.index).values,
+        "MAE_CV": mae_pais.reindex(codigos.index).values,
+        "Pred_2040": pred_2040,
+        "Backcast_AbsPct": back_df.groupby("Pais")["AbsPct"].mean().reindex(codigos.index).values,
+    })
+    metricas = comparar_global(metricas)
+    metricas.to_csv(RESULT_PATH / "metricas_global.csv", index=False)
+
+    print(f"\n{MODELO_GLOBAL}: {len(codigos)} países, {len(X):,} registros | MAE CV: {mae_cv:,.1f} "
+          f"(Dummy MAE: {mae_dummy:,.1f}) | {time.perf_counter() - inicio:,.1f} s")
+    if "MAE_CV_Individual" in metricas:
+        ambos = metricas.dropna(subset=["MAE_CV", "MAE_CV_Individual"])
+        mejores = int((ambos["MAE_CV"] < ambos["MAE_CV_Individual"]).sum())
+        print(f"MAE CV por país menor que el modelo individual en {mejores} de {len(ambos)}")
+    return metricas
+
+
+def run_consolidado(
+    nombre_archivo: str,
+    target: str,
+    nombre_modelo: str,
+    reusar: Optional[str] = None,
+) -> Optional[float]:
+    """
+    Entrena un modelo RandomForest para un archivo consolidado.
+
+    Con `reusar` ("refit" / "warm_start") parte del modelo guardado en vez de
+    repetir la búsqueda (ver `ajustar_modelo`).
+    """
+    print(f"\n↳ Procesando: {nombre_modelo}")
+    preparar_directorios()
+
+    # Carga, validación y división X/y
+    datos = preparar_consolidado(nombre_archivo, target)
+    if datos is None:
+        print(f"[skip] No hay datos válidos en {nombre_archivo}")
+        return None
+    df, X, y = datos
+
+    # Modelo base
+    mae_dummy = dummy_mae(X, y)
+
+    # RandomForest + GridSearchCV (o re-uso del modelo guardado)
+    best_pipe, mae_cv, X, ajuste = ajustar_modelo(X, y, nombre_modelo, reusar)
+
+    # Guardado
+    save_pipeline(best_pipe, nombre_modelo, mae_cv, dataset=nombre_archivo, **ajuste)
+
+    # Proyección 2040
+    pred_2040 = proyectar_anyo(best_pipe, X.columns.tolist(), future_year=ANIO_PROYECCION)
+    print(f"{nombre_modelo:30s} | MAE: {mae_cv:,.2f} | Pred 2040: {pred_2040:,.2f} (Dummy MAE: {mae_dummy:,.2f})")
+
+    # Backcast
+    back_df = backcast_years(best_pipe, X.columns.tolist(), df, target, BACKCAST_YEARS)
+    back_df.to_csv(RESULT_PATH / f"backcast_{nombre_modelo.lower().replace(' ', '_')}.csv", index=False)
+    return pred_2040
+
+
+# Datasets consolidados: (archivo, objetivo, nombre del modelo)
+CONSOLIDADOS = [
+    ("forma_features.csv",      "Valor", "Exportaciones Total Forma"),
+    ("categoria_features.csv",  "Valor", "Exportaciones Total Categoria"),
+    ("produccion_features.csv", "Valor", "Produccion Total Tequila"),
+    ("agave_features.csv",      "Valor", "Consumo de Agave Total"),
+]
+
+
+def ejecutar_modelos(
+    reusar: Optional[str] = None,
+    mix: str = "pares",
+    global_paises: bool = False,
+) -> None:
+    """
+    Orquesta todo el flujo en serie (ver orquestador.py para la versión en paralelo):
+
+    1. Carga features de países y selecciona los **10 mayores destinos**.
+    2. Ejecuta `run_pais_total`  → proyecciones y back-casting.
+    3. Ejecuta `run_porcentaje_categoria_clase`  → “mix” 2040.
+    4. Lanza `run_consolidado` sobre datasets globales (forma, categoría…).
+
+    `reusar` ("refit" / "warm_start") re-entrena a partir de los modelos guardados;
+    `mix` elige el modo de `run_porcentaje_categoria_clase`. Con `global_paises`
+    el paso 2 es un solo `entrenar_global` para todos los destinos, y el mix del
+    top-10 usa sus proyecciones.
+    """
+    print("\n===== PROYECCIONES FUTURAS =====")
+
+    df_paises = cargar_paises()
+    top10 = top_paises(df_paises)
+    print("Top-10 países:", ", ".join(top10))
+
+    proy_totales: Dict[str, float] = {}
+    if global_paises:
+        proy_totales = entrenar_global(df_paises, reusar).set_index("Pais")["Pred_2040"].to_dict()
+    for pais in top10:
+        tot = proy_totales.get(pais) if global_paises else run_pais_total(df_paises, pais, reusar)
+        proy_totales[pais] = tot
+        if tot:
+            run_porcentaje_categoria_clase(df_paises, pais, tot, mix)
+
+    for archivo, target, nombre in CONSOLIDADOS:
+        run_consolidado(archivo, target, nombre, reusar)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Entrenamiento en serie de todos los modelos")
+    parser.add_argument("--reusar", choices=["refit", "warm_start"], default=None,
+                        help="Re-entrena con los hiper-parámetros guardados (búsqueda sólo con deriva)")
+    parser.add_argument("--busqueda", choices=["grid", "halving"], default="grid",
+                        help="Malla PARAM_GRID_RF o successive halving sobre ESPACIO_RF")
+    parser.add_argument("--presupuesto-arboles", type=int, default=None,
+                        help="Árboles ajustados en CV por búsqueda halving (por omisión: costo de la malla)")
+    parser.add_argument("--presupuesto-segundos", type=float, default=None,
+                        help="Segundos de pared por búsqueda halving")
+    parser.add_argument("--mix", choices=MODOS_MIX, default="pares",
+                        help="Mix 2040: un RF por (Categoría, Clase) o uno multisalida por país")
+    parser.add_argument("--global", dest="global_paises", action="store_true",
+                        help="Un solo modelo para todos los países (país como feature)")
+    args = parser.parse_args()
+    configurar_busqueda(args.busqueda, args.presupuesto_arboles, args.presupuesto_segundos)
+    ejecutar_modelos(args.reusar, args.mix, args.global_paises)
+    print("\nProceso completado. Modelos y metricas guardados en:", RESULT_PATH)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+inferencia.py
+
+Predicción de los RandomForest entrenados sin pasar por `Pipeline.predict`.
+
+`Pipeline.predict` valida la entrada, aplica `SelectKBest` y luego recorre los
+árboles uno por uno desde Python (más hilos de joblib); con los lotes diminutos
+que sirve la API (unos cuantos años × meses) ese costo fijo domina. Aquí el
+pipeline `selector` + `rf` se compila a los arreglos contiguos de
+`almacen_modelos.aplanar_bosque` y todas las filas recorren todos los árboles a la
+vez, un nivel por iteración:
+
+    nodo[fila, árbol] ← hijos[nodo, X[fila, caracteristica[nodo]] > umbral[nodo]]
+
+Las hojas se convierten en lazos (umbral +inf, ambos hijos = la propia hoja), así
+que no hay que separar los pares que ya terminaron: se itera hasta que ningún nodo
+cambia. Las filas se procesan en bloques de BLOQUE_FILAS para que los índices
+quepan en caché.
+
+La predicción es el promedio de `valor[nodo]` sobre los árboles. Igual que sklearn,
+X se convierte a float32 antes de comparar contra los umbrales (float64), así que
+el resultado coincide con `pipe.predict` salvo redondeo en el promedio (~1e-12
+relativo). No se implementa el manejo de NaN de los árboles: la entrada debe venir
+completa, como en el entrenamiento.
+
+El recorrido en NumPy gana con lotes chicos (una fila: ~30×; 204 filas: ~4×), pero
+con miles de filas el ciclo en Cython de sklearn es más rápido; a partir de
+MAX_PARES pares (fila, árbol) se delega en el pipeline original cuando se compiló
+desde uno (ver benchmarks/bench_inferencia.py).
+
+Autor: Francisco Enríquez
+"""
+
+import numpy as np
+
+from pronosticos.almacen_modelos import ARREGLOS, aplanar_bosque
+
+BLOQUE_FILAS = 512
+MAX_PARES = 200_000
+
+# Cada cuántos niveles se revisa si todos los pares llegaron a una hoja
+_NIVELES_REVISION = 4
+
+
+class BosqueCompilado:
+    """
+    RandomForest aplanado con `predict` vectorizado.
+
+    Expone `feature_names_in_` y `predict` como el pipeline original, así que se puede
+    usar en su lugar para predecir.
+
+    :param arreglos: Diccionario de `aplanar_bosque` (arreglos en memoria o mapeados)
+    :param columnas: Nombres de las columnas de entrada, en orden
+    :param original: Pipeline del que se compiló, para los lotes de más de MAX_PARES
+    """
+
+    def __init__(self, arreglos, columnas=None, original=None):
+        for clave in ARREGLOS:
+            setattr(self, clave, arreglos[clave])
+        self.feature_names_in_ = np.asarray(columnas, dtype=object) if columnas is not None else None
+        self.n_arboles = len(self.raices)
+        self.original = original
+
+        # Hojas como lazos: caracteristica 0, umbral +inf e hijos = la propia hoja
+        hoja = np.asarray(self.caracteristica) < 0
+        nodos = np.arange(hoja.size)
+        self._caract = np.where(hoja, 0, self.caracteristica).astype(np.intp)
+        self._umbral = np.where(hoja, np.inf, self.umbral)
+        self._hijos = np.stack([np.where(hoja, nodos, self.izquierdo),
+                                np.where(hoja, nodos, self.derecho)], axis=1).ravel().astype(np.intp)
+        self._raices = np.asarray(self.raices, dtype=np.intp)
+
+    @classmethod
+    def compilar(cls, pipe):
+        """
+        Compila un pipeline `selector` + `rf` (o un RandomForest suelto).
+        """
+        columnas = getattr(pipe, "feature_names_in_", None)
+        return cls(aplanar_bosque(pipe), None if columnas is None else list(columnas), pipe)
+
+    @classmethod
+    def desde_almacen(cls, almacen, nombre):
+        """
+        Abre el bosque aplanado de `nombre` con memoria mapeada (sin des-serializar).
+
+        :param almacen: AlmacenModelos
+        """
+        arreglos = almacen.cargar_arboles(nombre)
+        return cls(arreglos, almacen.columnas(nombre))
+
+    def _matriz(self, X):
+        if self.feature_names_in_ is not None and hasattr(X, "columns"):
+            X = X[list(self.feature_names_in_)]
+        return np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+
+    def predict(self, X):
+        """
+        Promedio de los árboles para cada fila de X (DataFrame o arreglo 2-D).
+
+        :return: (n_filas,) con una salida, (n_filas, n_salidas) con varias
+        """
+        if self.original is not None and len(X) * self.n_arboles > MAX_PARES:
+            return self.original.predict(X)
+
+        X = self._matriz(X)
+        valor = np.asarray(self.valor)
+        prediccion = np.empty((X.shape[0], valor.shape[1]))
+        for inicio in range(0, X.shape[0], BLOQUE_FILAS):
+            bloque = X[inicio:inicio + BLOQUE_FILAS]
+            hojas = self._hojas(bloque)
+            prediccion[inicio:inicio + len(bloque)] = valor[hojas].reshape(len(bloque), self.n_arboles, -1).mean(axis=1)
+        return prediccion[:, 0] if prediccion.shape[1] == 1 else prediccion
+
+    def _hojas(self, X):
+        # Nodo de cada par (fila, árbol), en orden fila-mayor, y su posición en X plano
+        nodos = np.tile(self._raices, len(X))
+        base = np.repeat(np.arange(len(X)) * X.shape[1], self.n_arboles)
+        planos = X.ravel()
+
+        nivel = 0
+        while True:
+            siguientes = self._hijos[2 * nodos + (planos[base + self._caract[nodos]] > self._umbral[nodos])]
+            nivel += 1
+            if nivel % _NIVELES_REVISION == 0 and np.array_equal(siguientes, nodos):
+                return nodos
+            nodos = siguientes
+
+
+def compilar(pipe):
+    """
+    Atajo de `BosqueCompilado.compilar`; regresa `pipe` sin cambios si no es un
+    RandomForest (o pipeline con paso `rf`).
+    """
+    rf = pipe["rf"] if hasattr(pipe, "named_steps") and "rf" in pipe.named_steps else pipe
+    if not hasattr(rf, "estimators_") or not hasattr(rf.estimators_[0], "tree_"):
+        return pipe
+    return BosqueCompilado.compilar(pipe)
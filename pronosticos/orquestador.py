@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+orquestador.py
+
+Entrena en paralelo todos los modelos de entrenamiento.py: el total por país, el mix
+(Categoría, Clase) de cada país y los cuatro consolidados.
+
+- Cada modelo es una *unidad* independiente: los pares del mix no dependen del total
+  del país (sólo la normalización final, que se hace al terminar ambos). Con
+  `--mix multisalida` el mix de cada país es una sola unidad en vez de una por par.
+- Con `--global` los totales por país son una sola unidad (`entrenar_global`, todos
+  los destinos con el país como feature); el mix sigue siendo del top.
+- Las unidades se reparten en un pool de procesos con un presupuesto fijo de núcleos
+  por unidad: `procesos × nucleos_por_unidad <= os.cpu_count()`. Dentro de cada
+  proceso los árboles del RF corren con n_jobs=1 y la validación cruzada con
+  n_jobs=nucleos_por_unidad, y BLAS/OpenMP se limitan con threadpoolctl, así que no
+  hay sobre-suscripción.
+- Se despachan primero las unidades más largas (según los tiempos de la corrida
+  anterior, o una estimación por tipo) para que no quede una sola al final.
+- Si falta paises_features.csv se genera antes (caracteristicas.py).
+- Cada proceso carga paises_features.csv una sola vez; los archivos compartidos
+  (metricas_paises.csv, porcentaje_*_2040.csv, tiempos_entrenamiento.csv) los
+  escribe únicamente el proceso principal.
+
+Uso:
+    python -m pronosticos.orquestador [--procesos N] [--nucleos-por-unidad K] [--top 10]
+                                      [--reusar refit|warm_start] [--mix pares|multisalida]
+                                      [--global]
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from pronosticos import entrenamiento as ent
+from pronosticos.telemetria import tramo
+
+ARCHIVO_TIEMPOS = "tiempos_entrenamiento.csv"
+
+# Estimación relativa de costo cuando no hay tiempos previos: un consolidado hace
+# la búsqueda sobre más filas; un país repite la búsqueda tras depurar banderas; un
+# par del mix sólo hace una búsqueda.
+COSTO_TIPO = {"global": 8.0, "consolidado": 4.0, "pais": 3.0, "multisalida": 1.5, "mix": 1.0}
+
+# DataFrame de países cargado una vez por proceso
+_df_paises = None
+
+# Modo de re-entrenamiento del proceso (None, "refit" o "warm_start")
+_reusar = None
+
+
+def _paises():
+    global _df_paises
+    if _df_paises is None:
+        _df_paises = ent.cargar_paises()
+    return _df_paises
+
+
+def _inicializar(nucleos, reusar=None, busqueda=("grid", None, None)):
+    """
+    Inicializador de cada proceso del pool: fija el presupuesto de núcleos, el modo
+    de re-entrenamiento y la búsqueda (modo, árboles, segundos).
+    """
+    global _reusar
+    _reusar = reusar
+    ent.configurar_nucleos(nucleos)
+    ent.configurar_busqueda(*busqueda)
+    threadpool_limits(limits=nucleos)
+
+
+def _ejecutar(unidad):
+    """
+    Entrena una unidad y devuelve (unidad, resultado, segundos).
+    """
+    inicio = time.perf_counter()
+    tipo = unidad[0]
+    with tramo("entrenamiento.unidad", {"tipo": tipo}, unidad=etiqueta(unidad)):
+        if tipo == "pais":
+            resultado = ent.entrenar_pais_total(_paises(), unidad[1], _reusar)
+        elif tipo == "mix":
+            _, pais, cat, cls = unidad
+            df_p = ent.preparar_mix(_paises(), pais)
+            df_cc = df_p[(df_p["Categoria"] == cat) & (df_p["Clase"] == cls)]
+            resultado = ent.entrenar_mix(df_cc)
+        elif tipo == "global":
+            resultado = ent.entrenar_global(_paises(), _reusar)
+        elif tipo == "multisalida":
+            resultado = ent.entrenar_mix_multisalida(_paises(), unidad[1])
+        else:
+            resultado = ent.run_consolidado(*unidad[1:], _reusar)
+    return unidad, resultado, time.perf_counter() - inicio
+
+
+def etiqueta(unidad):
+    """
+    Nombre legible de una unidad (también es la llave en tiempos_entrenamiento.csv).
+    """
+    if unidad[0] == "consolidado":
+        return f"consolidado|{unidad[3]}"
+    return "|".join(unidad)
+
+
+def planear(top=10, mix="pares", global_paises=False):
+    """
+    Lista las unidades a entrenar: país, mix de cada país y consolidados.
+
+    :param top: Número de países (mayores destinos por volumen)
+    :param mix: "pares" (una unidad por par del mix) o "multisalida" (una por país)
+    :param global_paises: Una unidad "global" en lugar de una por país
+    :return: (países en orden, lista de unidades)
+    """
+    df_paises = _paises()
+    paises = ent.top_paises(df_paises, top)
+    unidades = [("global",)] if global_paises else [("pais", p) for p in paises]
+    for pais in paises:
+        if mix == "multisalida":
+            unidades.append(("multisalida", pais))
+        else:
+            unidades += [("mix", pais, cat, cls) for cat, cls in ent.pares_categoria_clase(df_paises, pais)]
+    unidades += [("consolidado", *c) for c in ent.CONSOLIDADOS]
+    return paises, unidades
+
+
+def ordenar_por_costo(unidades, ruta_tiempos):
+    """
+    Ordena las unidades de mayor a menor duración esperada.
+
+    Usa los segundos medidos en la corrida anterior cuando existen; las unidades
+    sin historial se ordenan por `COSTO_TIPO` y van antes que las medidas.
+    """
+    previos = {}
+    if os.path.exists(ruta_tiempos):
+        previos = pd.read_csv(ruta_tiempos).set_index("Unidad")["Segundos"].to_dict()
+
+    def costo(unidad):
+        return previos.get(etiqueta(unidad), COSTO_TIPO[unidad[0]] * 1e6)
+
+    return sorted(unidades, key=costo, reverse=True)
+
+
+def entrenar_todo(top=10, procesos=None, nucleos_por_unidad=1, reusar=None,
+                  busqueda=("grid", None, None), mix="pares", global_paises=False):
+    """
+    Entrena todas las unidades en paralelo y escribe las salidas compartidas.
+
+    :param top: Número de países a modelar
+    :param procesos: Procesos del pool; None = cpu_count // nucleos_por_unidad
+    :param nucleos_por_unidad: Núcleos que usa cada unidad (validación cruzada)
+    :param reusar: None, "refit" o "warm_start" (ver entrenamiento.ajustar_modelo)
+    :param busqueda: (modo, árboles, segundos) para entrenamiento.configurar_busqueda
+    :param mix: Modo del mix 2040, "pares" o "multisalida"
+    :param global_paises: Totales por país con el modelo global (todos los destinos)
+    :return: DataFrame con los tiempos por unidad
+    """
+    ent.preparar_directorios()
+    nucleos_por_unidad = max(1, nucleos_por_unidad)
+    procesos = procesos or max(1, (os.cpu_count() or 1) // nucleos_por_unidad)
+    ruta_tiempos = ent.RESULT_PATH / ARCHIVO_TIEMPOS
+
+    inicio = time.perf_counter()
+    ent.asegurar_features_paises()
+    paises, unidades = planear(top, mix, global_paises)
+    unidades = ordenar_por_costo(unidades, ruta_tiempos)
+    print(f"{len(unidades)} unidades | {procesos} procesos × {nucleos_por_unidad} núcleo(s)")
+
+    resultados, tiempos = {}, []
+
+    def registrar(unidad, resultado, segundos):
+        resultados[unidad] = resultado
+        tiempos.append({"Unidad": etiqueta(unidad), "Tipo": unidad[0], "Segundos": round(segundos, 3)})
+
+    if procesos == 1:
+        _inicializar(nucleos_por_unidad, reusar, busqueda)
+        for unidad in unidades:
+            registrar(*_ejecutar(unidad))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar,
+                                 initargs=(nucleos_por_unidad, reusar, busqueda)) as pool:
+            futuros = [pool.submit(_ejecutar, u) for u in unidades]
+            for futuro in as_completed(futuros):
+                registrar(*futuro.result())
+
+    # --- Salidas compartidas, en el orden del flujo en serie ---------------
+    totales = {}
+    if global_paises:
+        totales = resultados[("global",)].set_index("Pais")["Pred_2040"].to_dict()
+    for pais in paises:
+        if not global_paises:
+            metricas = resultados.get(("pais", pais))
+            if metricas is None:
+                continue
+            ent.guardar_metricas_csv(metricas, ent.RESULT_PATH / "metricas_paises.csv")
+            totales[pais] = metricas["Pred_2040"]
+        total = totales.get(pais)
+        if not total:
+            continue
+        if mix == "multisalida":
+            mix_pais = resultados.get(("multisalida", pais))
+            if mix_pais is not None:
+                ent.guardar_mix_multisalida(pais, *mix_pais, total)
+        else:
+            porcentajes = [(u[2], u[3], r) for u, r in resultados.items()
+                           if u[0] == "mix" and u[1] == pais]
+            ent.guardar_porcentajes(pais, sorted(porcentajes), total)
+
+    df_tiempos = pd.DataFrame(tiempos).sort_values("Segundos", ascending=False)
+    df_tiempos.to_csv(ruta_tiempos, index=False)
+
+    pared = time.perf_counter() - inicio
+    suma = df_tiempos["Segundos"].sum()
+    print(f"\nTiempo de pared: {pared:,.1f} s | suma de unidades: {suma:,.1f} s "
+          f"(×{suma / pared:.2f})")
+    return df_tiempos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entrenamiento en paralelo de todos los modelos")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos del pool (por omisión: núcleos / núcleos por unidad)")
+    parser.add_argument("--nucleos-por-unidad", type=int, default=1,
+                        help="Núcleos por modelo para la validación cruzada")
+    parser.add_argument("--top", type=int, default=10, help="Número de países a modelar")
+    parser.add_argument("--reusar", choices=["refit", "warm_start"], default=None,
+                        help="Re-entrena con los hiper-parámetros guardados (búsqueda sólo con deriva)")
+    parser.add_argument("--busqueda", choices=["grid", "halving"], default="grid",
+                        help="Malla PARAM_GRID_RF o successive halving sobre ESPACIO_RF")
+    parser.add_argument("--presupuesto-arboles", type=int, default=None,
+                        help="Árboles ajustados en CV por búsqueda halving (por omisión: costo de la malla)")
+    parser.add_argument("--presupuesto-segundos", type=float, default=None,
+                        help="Segundos de pared por búsqueda halving")
+    parser.add_argument("--mix", choices=ent.MODOS_MIX, default="pares",
+                        help="Mix 2040: un RF por (Categoría, Clase) o uno multisalida por país")
+    parser.add_argument("--global", dest="global_paises", action="store_true",
+                        help="Un solo modelo para todos los países (país como feature)")
+    args = parser.parse_args()
+    entrenar_todo(args.top, args.procesos, args.nucleos_por_unidad, args.reusar,
+                  (args.busqueda, args.presupuesto_arboles, args.presupuesto_segundos), args.mix,
+                  args.global_paises)
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+"""
+series.py
+
+Almacén en memoria de las series mensuales de exportaciones por país, para
+consultas de historia sin leer el consolidado en cada solicitud.
+
+- El consolidado (data/consolidado_exportaciones_pais.csv, o su Parquet si está al
+  día con el CSV) se carga una vez a una matriz contigua `valores[serie, mes]`
+  (float64), con una serie por combinación (país, categoría, clase) y una columna
+  por mes desde enero del primer año hasta diciembre del último. Un mes sin
+  reporte es NaN; un mes con reporte en el que la combinación no aparece es 0.
+- Cada serie se describe con tres arreglos de códigos (país, categoría, clase). Una
+  consulta puede omitir cualquiera de los tres: se suman las series que coinciden
+  (p. ej. sólo país = total del país; nada = total de exportaciones).
+- Recorte por rango de meses y remuestreo a trimestre o año con un `reshape` sobre
+  la matriz; un lote de series se resuelve de una vez.
+- La versión de los datos es la huella (mtime, tamaño) del consolidado. En cada
+  consulta se hace un `stat`: si la consolidación escribió un archivo nuevo, se
+  construye otra instantánea y se reemplaza la referencia. Las consultas en curso
+  terminan con la instantánea que tomaron; si el archivo cambia mientras se lee, se
+  descarta la lectura y se sigue sirviendo la anterior.
+
+Los nombres se comparan sin distinguir mayúsculas ("japon" = "JAPON").
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from pronosticos.almacenamiento import cargar_dataset
+from pronosticos.consolidacion import SALIDA_PAISES
+from pronosticos.telemetria import tramo
+
+FUENTE = os.getenv("PRONOSTICO_SERIES_FUENTE", SALIDA_PAISES)
+MAX_SERIES = int(os.getenv("PRONOSTICO_SERIES_MAX", "200"))
+
+DIMENSIONES = ("pais", "categoria", "clase")
+COLUMNAS = {"pais": "NombrePais", "categoria": "Categoria", "clase": "Clase"}
+COLUMNA_VALOR = "Litros 40 % Alc. Vol"
+
+# Meses por periodo de cada frecuencia
+FRECUENCIAS = {"mes": 1, "trimestre": 3, "anio": 12}
+
+
+class SerieNoEncontrada(KeyError):
+    """Un país, categoría o clase que no aparece en el consolidado."""
+
+
+def _normalizar(nombre):
+    return str(nombre).strip().upper()
+
+
+def _firma(ruta):
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+class Instantanea:
+    """
+    Arreglos de una versión del consolidado. No se modifica después de construirse.
+
+    :param valores: Matriz (series × meses), C-contigua
+    :param codigos: {dimensión: arreglo int32 con el código de cada serie}
+    :param catalogos: {dimensión: nombres, en el orden de sus códigos}
+    :param presentes: Máscara de los meses con reporte
+    :param anio0: Año de la primera columna
+    :param firma: (mtime_ns, tamaño) del archivo del que se leyó
+    """
+
+    def __init__(self, valores, codigos, catalogos, presentes, anio0, firma):
+        self.valores = valores
+        self.codigos = codigos
+        self.catalogos = catalogos
+        self.indices = {d: {_normalizar(n): i for i, n in enumerate(nombres)} for d, nombres in catalogos.items()}
+        self.anio0 = anio0
+        self.firma = firma
+        self.version = hashlib.sha1(repr(firma).encode()).hexdigest()[:16]
+        self.presentes = presentes
+
+    @property
+    def n_meses(self):
+        return self.valores.shape[1]
+
+    def rango(self):
+        """Primer y último mes con reporte ('AAAA-MM')."""
+        meses = np.flatnonzero(self.presentes)
+        if not meses.size:
+            return None, None
+        return self._etiqueta(meses[0], 1), self._etiqueta(meses[-1], 1)
+
+    def catalogo(self):
+        """
+        Países, categorías y clases disponibles, rango de meses y versión.
+        """
+        desde, hasta = self.rango()
+        return {"version": self.version, "desde": desde, "hasta": hasta, "series": len(self.valores),
+                "paises": self.catalogos["pais"], "categorias": self.catalogos["categoria"],
+                "clases": self.catalogos["clase"]}
+
+    def _etiqueta(self, mes, paso):
+        anio, resto = divmod(int(mes), 12)
+        anio += self.anio0
+        if paso == 12:
+            return str(anio)
+        if paso == 3:
+            return f"{anio}-T{resto // 3 + 1}"
+        return f"{anio}-{resto + 1:02d}"
+
+    def _mes(self, texto, fin=False):
+        # 'AAAA-MM' o 'AAAA' (enero o diciembre según el extremo) → índice de columna
+        partes = str(texto).split("-")
+        try:
+            anio = int(partes[0])
+            mes = int(partes[1]) if len(partes) > 1 else (12 if fin else 1)
+        except ValueError:
+            raise ValueError(f"Mes no válido: {texto!r} (usa AAAA-MM o AAAA)")
+        if len(partes) > 2 or not 1 <= mes <= 12:
+            raise ValueError(f"Mes no válido: {texto!r} (usa AAAA-MM o AAAA)")
+        return (anio - self.anio0) * 12 + mes - 1
+
+    def filas(self, pais=None, categoria=None, clase=None):
+        """
+        Índices de las series que coinciden con la consulta (las dimensiones omitidas no filtran).
+
+        :raises SerieNoEncontrada: si algún nombre no aparece en el consolidado
+        """
+        mascara = np.ones(len(self.valores), dtype=bool)
+        for dimension, nombre in zip(DIMENSIONES, (pais, categoria, clase)):
+            if nombre is None or nombre == "":
+                continue
+            codigo = self.indices[dimension].get(_normalizar(nombre))
+            if codigo is None:
+                raise SerieNoEncontrada(f"{dimension} {nombre!r}")
+            mascara &= self.codigos[dimension] == codigo
+        return np.flatnonzero(mascara)
+
+    def consultar(self, consultas, desde=None, hasta=None, frecuencia="mes"):
+        """
+        Resuelve un lote de series sobre el mismo rango y frecuencia.
+
+        El rango se amplía a periodos completos de la frecuencia pedida y se recorta a
+        los años del consolidado. Al remuestrear, el valor de un periodo es la suma de
+        sus meses con reporte (None si no tiene ninguno) y `meses` cuenta esos meses.
+
+        :param consultas: Lista de {pais, categoria, clase} (claves opcionales)
+        :param desde: Primer mes 'AAAA-MM' o 'AAAA' (por omisión, el primero con reporte)
+        :param hasta: Último mes 'AAAA-MM' o 'AAAA' (por omisión, el último con reporte)
+        :param frecuencia: 'mes', 'trimestre' o 'anio'
+        :return: {periodos, series: [{pais, categoria, clase, valores[, meses]}]}
+        """
+        if frecuencia not in FRECUENCIAS:
+            raise ValueError(f"Frecuencia no válida: {frecuencia!r} (usa {', '.join(FRECUENCIAS)})")
+        if len(consultas) > MAX_SERIES:
+            raise ValueError(f"Demasiadas series en el lote: {len(consultas)} (máximo {MAX_SERIES})")
+        paso = FRECUENCIAS[frecuencia]
+
+        meses_con_reporte = np.flatnonzero(self.presentes)
+        if not meses_con_reporte.size:
+            meses_con_reporte = np.zeros(1, dtype=int)
+        inicio = meses_con_reporte[0] if desde is None else self._mes(desde)
+        fin = meses_con_reporte[-1] if hasta is None else self._mes(hasta, fin=True)
+        inicio = max(0, inicio - inicio % paso)
+        fin = min(self.n_meses, max(inicio, fin + paso - fin % paso))
+        n_periodos = max(0, fin - inicio) // paso
+
+        matriz = np.empty((len(consultas), n_periodos * paso))
+        for i, consulta in enumerate(consultas):
+            matriz[i] = self.valores[self.filas(**consulta), inicio:fin].sum(axis=0)
+        matriz[:, ~self.presentes[inicio:fin]] = np.nan
+
+        bloques = matriz.reshape(len(consultas), n_periodos, paso)
+        meses = (~np.isnan(bloques)).sum(axis=2)
+        totales = np.where(meses > 0, np.nansum(bloques, axis=2), np.nan)
+
+        series = []
+        for consulta, fila, n in zip(consultas, totales, meses):
+            serie = {d: consulta.get(d) for d in DIMENSIONES}
+            serie["valores"] = np.where(np.isnan(fila), None, np.round(fila, 2)).tolist()
+            if paso > 1:
+                serie["meses"] = n.tolist()
+            series.append(serie)
+        return {
+            "periodos": [self._etiqueta(m, paso) for m in range(inicio, inicio + n_periodos * paso, paso)],
+            "series": series,
+        }
+
+
+def construir(df, firma=None):
+    """
+    Construye la instantánea a partir del consolidado por país.
+
+    Las filas repetidas de una misma combinación y mes se suman.
+    """
+    # El Parquet guarda año y mes en enteros angostos
+    anios = df["AñoArchivo"].to_numpy(dtype=np.int64)
+    anio0 = int(anios.min()) if len(df) else 0
+    n_meses = 12 * (int(anios.max()) - anio0 + 1) if len(df) else 0
+    mes = (anios - anio0) * 12 + df["Mes"].to_numpy(dtype=np.int64) - 1
+
+    codigos, catalogos = {}, {}
+    for dimension in DIMENSIONES:
+        codigo, nombres = pd.factorize(df[COLUMNAS[dimension]].astype(str), sort=True)
+        codigos[dimension], catalogos[dimension] = codigo, list(nombres)
+
+    # Una serie por combinación presente, en orden (país, categoría, clase)
+    combinaciones, serie = np.unique(np.column_stack([codigos[d] for d in DIMENSIONES]), axis=0,
+                                     return_inverse=True)
+    valores = np.zeros((len(combinaciones), n_meses))
+    np.add.at(valores, (serie.ravel(), mes), df[COLUMNA_VALOR].to_numpy(dtype=float))
+
+    presentes = np.zeros(n_meses, dtype=bool)
+    presentes[mes] = True
+    valores[:, ~presentes] = np.nan
+
+    codigos = {d: np.ascontiguousarray(combinaciones[:, j], dtype=np.int32) for j, d in enumerate(DIMENSIONES)}
+    return Instantanea(np.ascontiguousarray(valores), codigos, catalogos, presentes, anio0, firma)
+
+
+def cargar(ruta=FUENTE):
+    """
+    Lee el consolidado y construye su instantánea.
+
+    :return: Instantanea, o None si el archivo cambió durante la lectura
+    """
+    firma = _firma(ruta)
+    if firma is None:
+        raise FileNotFoundError(f"No existe el consolidado: {ruta}")
+    with tramo("series.carga") as t:
+        df = cargar_dataset(os.path.basename(ruta), [*COLUMNAS.values(), COLUMNA_VALOR, "AñoArchivo", "Mes"],
+                            directorio=os.path.dirname(os.path.abspath(ruta)))
+        if _firma(ruta) != firma:
+            t["estado"] = "cambio"
+            return None
+        instantanea = construir(df, firma)
+        t["filas"], t["series"] = len(df), len(instantanea.valores)
+    return instantanea
+
+
+class AlmacenSeries:
+    """
+    Instantánea vigente del consolidado, recargada cuando el archivo cambia.
+
+    :param ruta: Consolidado por país
+    """
+
+    def __init__(self, ruta=FUENTE):
+        self.ruta = ruta
+        self.recargas = 0
+        self._actual = None
+        self._lock = threading.Lock()
+
+    def instantanea(self):
+        """
+        Instantánea de la versión actual del archivo (la construye si cambió).
+
+        :raises FileNotFoundError: si el consolidado no existe y nunca se cargó
+        """
+        actual = self._actual
+        firma = _firma(self.ruta)
+        if actual is not None and (firma is None or firma == actual.firma):
+            return actual
+
+        # Una sola recarga a la vez; las demás solicitudes esperan y toman el resultado
+        with self._lock:
+            actual = self._actual
+            if actual is not None and _firma(self.ruta) in (None, actual.firma):
+                return actual
+            nueva = cargar(self.ruta)
+            if nueva is None:
+                if actual is None:
+                    raise FileNotFoundError(f"El consolidado se está escribiendo: {self.ruta}")
+                return actual
+            self._actual = nueva
+            self.recargas += 1
+            return nueva
+
+
+def etag(version, *partes):
+    """
+    ETag fuerte de una respuesta: versión de los datos + huella de la consulta.
+    """
+    huella = hashlib.sha1(repr(partes).encode("utf-8")).hexdigest()[:12]
+    return f'"{version}-{huella}"'
+
+
+def interpretar_serie(texto):
+    """
+    Interpreta 'PAIS|CATEGORIA|CLASE' (componentes vacíos u omitidos = todos).
+    """
+    partes = texto.split("|")
+    if len(partes) > len(DIMENSIONES):
+        raise ValueError(f"Serie no válida: {texto!r} (usa PAIS|CATEGORIA|CLASE)")
+    partes += [""] * (len(DIMENSIONES) - len(partes))
+    return {d: (p.strip() or None) for d, p in zip(DIMENSIONES, partes)}
+
+
+# Instancia compartida por la API
+almacen_series = AlmacenSeries()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+servicio.py
+
+Servicio de pronósticos sobre los pipelines entrenados en resultados/models/*.pkl.
+
+- Los modelos se cargan bajo demanda en un caché LRU de tamaño acotado
+  (PRONOSTICO_MAX_MODELOS) y, opcionalmente, se precargan al iniciar la API
+  (PRONOSTICO_PRECARGAR = "todos" o lista separada por comas).
+- Una solicitud por lote (varios modelos × años × meses) se resuelve con un único
+  `predict` vectorizado por modelo.
+- Los RandomForest se compilan al cargarse a arreglos de nodos
+  (pronosticos.inferencia) y se predicen sin `Pipeline.predict`; se desactiva con
+  PRONOSTICO_COMPILAR=0.
+- Se llevan estadísticas de aciertos/fallos del caché y latencias p50/p99.
+- El modelo global por país (MODELOS_SIN_SERVICIO) no se sirve: necesita el
+  código y la historia del país, no el vector de ceros de `construir_lote`.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Carpeta de modelos entrenados (pipeline .pkl + metadatos .json)
+MODELOS_DIR = os.getenv(
+    "PRONOSTICO_MODELOS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resultados", "models"),
+)
+MAX_MODELOS = int(os.getenv("PRONOSTICO_MAX_MODELOS", "8"))
+PRECARGAR = os.getenv("PRONOSTICO_PRECARGAR", "")
+COMPILAR = os.getenv("PRONOSTICO_COMPILAR", "1") != "0"
+
+# Modelos que no se pueden pronosticar con `construir_lote`. El global por país
+# (entrenamiento.MODELO_GLOBAL) tiene el país como feature `Pais_Codigo`: con 0
+# pronosticaría el país de rango 0. Sus proyecciones están en metricas_global.csv.
+MODELOS_SIN_SERVICIO = ("global_paises",)
+
+# Abreviaturas de mes tal como las genera strftime("%b") en la ingeniería de características
+MESES_ABREV = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+class ModeloNoEncontrado(KeyError):
+    """El modelo solicitado no existe en MODELOS_DIR."""
+
+
+def modelos_disponibles(directorio=MODELOS_DIR):
+    """
+    Lista los nombres de modelo (archivo .pkl sin extensión) disponibles, sin
+    MODELOS_SIN_SERVICIO.
+    """
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(f[:-4] for f in os.listdir(directorio)
+                  if f.endswith(".pkl") and f[:-4] not in MODELOS_SIN_SERVICIO)
+
+
+def existe_modelo(nombre, directorio=MODELOS_DIR):
+    """
+    Si `nombre` está en `modelos_disponibles`, sin listar la carpeta.
+    """
+    return (nombre not in MODELOS_SIN_SERVICIO and os.path.basename(nombre) == nombre
+            and os.path.isfile(os.path.join(directorio, f"{nombre}.pkl")))
+
+
+class CacheModelos:
+    """
+    Caché LRU de pipelines cargados con joblib.
+
+    :param directorio: Carpeta con los .pkl
+    :param max_modelos: Máximo de modelos en memoria; al superarlo se descarta el menos usado
+    :param compilar: Compila los RandomForest a arreglos de nodos al cargarlos
+    """
+
+    def __init__(self, directorio=MODELOS_DIR, max_modelos=MAX_MODELOS, compilar=COMPILAR):
+        self.directorio = directorio
+        self.max_modelos = max(1, max_modelos)
+        self.compilar = compilar
+        self._modelos = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks_carga = {}
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, nombre):
+        """
+        Devuelve el pipeline `nombre`, cargándolo si no está en memoria.
+
+        :raises ModeloNoEncontrado: si no existe el .pkl o está en MODELOS_SIN_SERVICIO
+        """
+        with self._lock:
+            if nombre in self._modelos:
+                self._modelos.move_to_end(nombre)
+                self.aciertos += 1
+                return self._modelos[nombre]
+            lock_carga = self._locks_carga.setdefault(nombre, threading.Lock())
+
+        # Un solo hilo carga cada modelo; los demás esperan y lo toman del caché
+        with lock_carga:
+            with self._lock:
+                if nombre in self._modelos:
+                    self._modelos.move_to_end(nombre)
+                    self.aciertos += 1
+                    return self._modelos[nombre]
+
+            if not existe_modelo(nombre, self.directorio):
+                # Los nombres desconocidos llegan de las solicitudes: su candado no se conserva
+                with self._lock:
+                    self._locks_carga.pop(nombre, None)
+                raise ModeloNoEncontrado(nombre)
+            pipe = joblib.load(os.path.join(self.directorio, f"{nombre}.pkl"))
+            if self.compilar:
+                from pronosticos.inferencia import compilar
+                pipe = compilar(pipe)
+
+            with self._lock:
+                self.fallos += 1
+                self._modelos[nombre] = pipe
+                while len(self._modelos) > self.max_modelos:
+                    self._modelos.popitem(last=False)
+            return pipe
+
+    def precargar(self, nombres):
+        """
+        Carga de antemano una lista de modelos (hasta llenar el caché).
+        """
+        for nombre in list(nombres)[:self.max_modelos]:
+            self.obtener(nombre)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "en_memoria": list(self._modelos),
+                "max_modelos": self.max_modelos,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
+
+
+class RegistroLatencias:
+    """
+    Ventana deslizante de latencias (ms) para reportar p50 / p99.
+    """
+
+    def __init__(self, ventana=1000):
+        self._latencias = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+        self.solicitudes = 0
+
+    def registrar(self, ms):
+        with self._lock:
+            self._latencias.append(ms)
+            self.solicitudes += 1
+
+    def resumen(self):
+        with self._lock:
+            datos = np.array(self._latencias)
+            total = self.solicitudes
+        if datos.size == 0:
+            return {"solicitudes": total, "p50_ms": None, "p99_ms": None}
+        return {
+            "solicitudes": total,
+            "p50_ms": round(float(np.percentile(datos, 50)), 3),
+            "p99_ms": round(float(np.percentile(datos, 99)), 3),
+        }
+
+
+def construir_lote(columnas, anios, meses=None, year_col="Year"):
+    """
+    Construye la matriz de entrada de un modelo para todas las combinaciones año × mes.
+
+    Igual que `proyectar_anyo`: todas las features en 0 salvo `Year`. Si se piden
+    meses y el modelo tiene la dummy `Mes_<abrev>`, ésta se pone en 1.
+
+    :param columnas: Features con las que se entrenó el pipeline
+    :param anios: Lista de años
+    :param meses: Lista opcional de meses (1-12)
+    :return: (DataFrame de entrada, lista de (anio, mes) por fila)
+    """
+    filas = [(a, m) for a in anios for m in (meses or [None])]
+    X = pd.DataFrame(np.zeros((len(filas), len(columnas))), columns=columnas)
+    if year_col in X.columns:
+        X[year_col] = [a for a, _ in filas]
+
+    for i, (_, mes) in enumerate(filas):
+        col = f"Mes_{MESES_ABREV[mes - 1]}" if mes else None
+        if col in X.columns:
+            X.iat[i, X.columns.get_loc(col)] = 1
+    return X, filas
+
+
+def pronosticar(cache, modelos, anios, meses=None):
+    """
+    Resuelve una solicitud por lote con un `predict` por modelo.
+
+    :param cache: CacheModelos
+    :param modelos: Nombres de modelo
+    :param anios: Años a pronosticar
+    :param meses: Meses opcionales (1-12)
+    :return: Lista de {modelo, anio, mes, valor}
+    """
+    resultados = []
+    for nombre in modelos:
+        pipe = cache.obtener(nombre)
+        X, filas = construir_lote(list(pipe.feature_names_in_), anios, meses)
+        preds = pipe.predict(X)
+        resultados.extend(
+            {"modelo": nombre, "anio": a, "mes": m, "valor": float(v)}
+            for (a, m), v in zip(filas, preds)
+        )
+    return resultados
+
+
+def modelos_a_precargar(valor=PRECARGAR, directorio=MODELOS_DIR):
+    """
+    Interpreta PRONOSTICO_PRECARGAR: "" (ninguno), "todos" o nombres separados por comas.
+    """
+    if not valor:
+        return []
+    if valor.strip().lower() == "todos":
+        return modelos_disponibles(directorio)
+    return [n.strip() for n in valor.split(",") if n.strip()]
+
+
+# Instancias compartidas por la API
+cache_modelos = CacheModelos()
+latencias = RegistroLatencias()
+
+
+def medir(funcion, *args, **kwargs):
+    """
+    Ejecuta `funcion` y registra su latencia en milisegundos.
+
+    :return: (resultado, latencia_ms)
+    """
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    ms = (time.perf_counter() - inicio) * 1000
+    latencias.registrar(ms)
+    return resultado, ms
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+"""
+telemetria.py
+
+Tramos de tiempo alrededor de las etapas del flujo (pasos de cada mes de la
+descarga, parseo de cada archivo, pasos de la ingeniería de características, cada
+ajuste y fold de validación cruzada) y su agregación para /metrics.
+
+    with tramo("consolidacion.parseo", {"limpiar": "limpiar_csv"}, archivo=nombre) as t:
+        ...
+        t["filas"] = len(df)
+
+    pasos = Cronometro("descarga.paso", {"backend": "selenium"}, mes="2024-03")
+    ...                    # navegar
+    pasos.marca("navegar")
+    ...                    # seleccionar
+    pasos.marca("seleccionar")
+
+Cada tramo se escribe al terminar como una línea JSON en ARCHIVO_LOG
+(PRONOSTICO_TELEMETRIA_LOG): hora, nombre, segundos, estado ("ok", "error" si el
+bloque lanzó una excepción, o el que fije el bloque), etiquetas, pid y campos de
+contexto. Todos los procesos (API, trabajador de descargas, pools de parseo y de
+entrenamiento, workers de joblib) agregan al mismo archivo con O_APPEND y una sola
+escritura por línea, así que las líneas de procesos distintos no se mezclan.
+
+Las etiquetas deben tener pocos valores posibles (paso, reporte, backend, tipo):
+identifican la serie en /metrics. Los campos de contexto (archivo, mes, unidad)
+sólo van al log.
+
+`Agregador` lee el log de forma incremental (desde el último byte leído) y lleva por
+serie un contador de tramos por estado y un histograma de duraciones, que
+`exposicion` devuelve en el formato de texto de Prometheus. Si el log se rota o se
+trunca, vuelve a leer desde el inicio del archivo nuevo sin reiniciar los contadores.
+
+Con PRONOSTICO_TELEMETRIA=0 no se escribe nada.
+
+Autor: Francisco Enríquez
+"""
+
+import os
+import re
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Misma carpeta /data que consolidacion.py (que importa este módulo)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+ACTIVO = os.getenv("PRONOSTICO_TELEMETRIA", "1") != "0"
+ARCHIVO_LOG = os.getenv("PRONOSTICO_TELEMETRIA_LOG", os.path.join(DATA_DIR, "telemetria.jsonl"))
+
+# Límites (segundos) de las cubetas del histograma: del parseo de un archivo a un mes de Selenium
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+PREFIJO = "pronostico"
+
+
+def registrar(nombre, segundos, etiquetas=None, estado="ok", **campos):
+    """
+    Escribe un tramo ya medido en el log (una línea JSON).
+
+    Nunca lanza: si el log no se puede escribir, el tramo se pierde.
+    """
+    if not ACTIVO:
+        return
+    evento = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "tramo": nombre,
+        "segundos": round(segundos, 6),
+        "estado": estado,
+        "etiquetas": etiquetas or {},
+        "pid": os.getpid(),
+        **campos,
+    }
+    linea = (json.dumps(evento, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    try:
+        _agregar_linea(ARCHIVO_LOG, linea)
+    except FileNotFoundError:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(ARCHIVO_LOG)), exist_ok=True)
+            _agregar_linea(ARCHIVO_LOG, linea)
+        except OSError:
+            pass
+    except OSError:
+        pass
+
+
+def _agregar_linea(ruta, linea):
+    # Se abre en cada tramo: sobrevive a fork y a la rotación del archivo
+    fd = os.open(ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, linea)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def tramo(nombre, etiquetas=None, **campos):
+    """
+    Mide el bloque y lo registra al salir.
+
+    Entrega el diccionario de campos: el bloque puede agregar contexto (p. ej.
+    `t["filas"] = n`) o fijar `t["estado"]` (p. ej. "fallo" o "vacio").
+
+    :param nombre: Etapa, con punto como separador ("descarga.mes")
+    :param etiquetas: Dimensiones de la serie en /metrics (pocos valores posibles)
+    """
+    inicio = time.perf_counter()
+    estado = "ok"
+    try:
+        yield campos
+    except BaseException:
+        estado = "error"
+        raise
+    finally:
+        fijado = campos.pop("estado", None)
+        if fijado and estado == "ok":
+            estado = fijado
+        registrar(nombre, time.perf_counter() - inicio, etiquetas, estado, **campos)
+
+
+class Cronometro:
+    """
+    Pasos consecutivos de una etapa: cada `marca(paso)` registra el tiempo desde la
+    marca anterior (o desde la creación) como un tramo con la etiqueta `paso`.
+
+    :param nombre: Nombre común de los tramos ("caracteristicas.paso")
+    :param etiquetas: Etiquetas comunes; se agrega `paso`
+    """
+
+    def __init__(self, nombre, etiquetas=None, **campos):
+        self.nombre = nombre
+        self.etiquetas = dict(etiquetas or {})
+        self.campos = campos
+        self._ultima = time.perf_counter()
+
+    def marca(self, paso, **campos):
+        ahora = time.perf_counter()
+        registrar(self.nombre, ahora - self._ultima, {**self.etiquetas, "paso": paso},
+                  **{**self.campos, **campos})
+        self._ultima = ahora
+
+
+# ─────────────────────────── Agregación ───────────────────────────
+
+def _nombre_etiqueta(nombre):
+    nombre = re.sub(r"[^a-zA-Z0-9_]", "_", str(nombre))
+    return nombre if re.match(r"[a-zA-Z_]", nombre) else f"_{nombre}"
+
+
+def _valor_etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _serie(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{_valor_etiqueta(v)}"' for k, v in etiquetas) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Agregador:
+    """
+    Contadores e histogramas de los tramos del log, leídos de forma incremental.
+
+    :param ruta: Log JSON (por omisión ARCHIVO_LOG)
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        self.conteos = {}
+        self.histogramas = {}
+        self.lineas_invalidas = 0
+        self._posicion = 0
+        self._inodo = None
+        self._lock = threading.Lock()
+
+    def actualizar(self):
+        """
+        Agrega las líneas completas escritas desde la última lectura.
+
+        :return: Número de tramos nuevos
+        """
+        ruta = self.ruta or ARCHIVO_LOG
+        with self._lock:
+            try:
+                info = os.stat(ruta)
+            except FileNotFoundError:
+                return 0
+            if info.st_ino != self._inodo or info.st_size < self._posicion:
+                self._inodo, self._posicion = info.st_ino, 0
+
+            nuevos = 0
+            with open(ruta, "rb") as f:
+                f.seek(self._posicion)
+                for linea in f:
+                    # Una línea sin salto aún se está escribiendo: se lee en la próxima vuelta
+                    if not linea.endswith(b"\n"):
+                        break
+                    self._posicion += len(linea)
+                    nuevos += self._agregar(linea)
+            return nuevos
+
+    def _agregar(self, linea):
+        try:
+            evento = json.loads(linea)
+            nombre, segundos = evento["tramo"], float(evento["segundos"])
+        except (ValueError, KeyError, TypeError):
+            self.lineas_invalidas += 1
+            return 0
+        etiquetas = tuple(sorted((_nombre_etiqueta(k), str(v))
+                                 for k, v in (evento.get("etiquetas") or {}).items()
+                                 if _nombre_etiqueta(k) not in ("tramo", "estado", "le")))
+        serie = (("tramo", nombre),) + etiquetas
+
+        clave = serie + (("estado", str(evento.get("estado", "ok"))),)
+        self.conteos[clave] = self.conteos.get(clave, 0) + 1
+
+        histograma = self.histogramas.setdefault(serie, [[0] * (len(CUBETAS) + 1), 0.0])
+        histograma[0][bisect.bisect_left(CUBETAS, segundos)] += 1
+        histograma[1] += segundos
+        return 1
+
+    def exposicion(self):
+        """
+        Contadores e histogramas en el formato de texto de Prometheus (0.0.4).
+        """
+        self.actualizar()
+        with self._lock:
+            conteos = sorted(self.conteos.items())
+            histogramas = sorted((serie, ([*cubetas], suma)) for serie, (cubetas, suma) in self.histogramas.items())
+
+        lineas = [
+            f"# HELP {PREFIJO}_tramos_total Tramos terminados, por etapa y estado.",
+            f"# TYPE {PREFIJO}_tramos_total counter",
+        ]
+        lineas += [f"{PREFIJO}_tramos_total{_serie(clave)} {n}" for clave, n in conteos]
+
+        lineas += [
+            f"# HELP {PREFIJO}_tramo_segundos Duración de los tramos, por etapa.",
+            f"# TYPE {PREFIJO}_tramo_segundos histogram",
+        ]
+        for serie, (cubetas, suma) in histogramas:
+            acumulado = 0
+            for limite, n in zip(list(CUBETAS) + ["+Inf"], cubetas):
+                acumulado += n
+                lineas.append(f"{PREFIJO}_tramo_segundos_bucket{_serie(serie + (('le', str(limite)),))} {acumulado}")
+            lineas.append(f"{PREFIJO}_tramo_segundos_sum{_serie(serie)} {_numero(suma)}")
+            lineas.append(f"{PREFIJO}_tramo_segundos_count{_serie(serie)} {acumulado}")
+
+        lineas += [
+            f"# HELP {PREFIJO}_telemetria_lineas_invalidas_total Líneas del log que no se pudieron leer.",
+            f"# TYPE {PREFIJO}_telemetria_lineas_invalidas_total counter",
+            f"{PREFIJO}_telemetria_lineas_invalidas_total {self.lineas_invalidas}",
+        ]
+        return "\n".join(lineas) + "\n"
+
+
+def contador(nombre, valor, ayuda, etiquetas=None):
+    """
+    Un contador suelto en formato Prometheus (para estadísticas que viven en memoria
+    del proceso, como las del caché de modelos de la API).
+    """
+    serie = _serie(tuple(sorted((etiquetas or {}).items())))
+    return (f"# HELP {PREFIJO}_{nombre} {ayuda}\n# TYPE {PREFIJO}_{nombre} counter\n"
+            f"{PREFIJO}_{nombre}{serie} {_numero(valor)}\n")
@@ -10,104 +10,34 @@ Para cada archivo:
 - Agrega columnas de Año y Mes extraídas del nombre del archivo.
 - Guarda un CSV consolidado por cada carpeta en la raíz de /data.
 
+El parseo se reparte entre un pool de procesos (ver pronosticos/consolidacion.py)
+y los archivos se unen en orden de año y nombre. Las filas parseadas de cada archivo
+se guardan en data/.cache_consolidacion, así que en las corridas siguientes sólo se
+parsean los archivos nuevos o modificados.
+
+Uso:
+    python scripts/consolidado_categorias.py [--procesos N] [--completo] [--parquet]
+    python -m pronosticos consolidate --reporte categorias [...]  (equivalente)
+
 Autor: Francisco Enríquez
 """
 
 import os
-import pandas as pd
-
-# === Configuración de rutas ===
-
-# Directorio base donde están las subcarpetas con los CSV por año
-BASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-
-# Nombres de carpetas a procesar dentro de /data
-CARPETAS = [
-    "ConsumodeAgaveTotal",
-    "ProduccionTotalTequila",
-    "ExportacionesTotalCategoria",
-    "ExportacionesTotalForma"
-]
-
-
-def limpiar_csv(ruta_csv):
-    """
-    Limpia y transforma un archivo CSV con columnas SubCategoria, Year y Valor.
-
-    Parámetros:
-        ruta_csv (str): Ruta al archivo CSV individual.
-
-    Retorna:
-        pd.DataFrame | None: DataFrame limpio o None si el archivo no es válido.
-    """
-    try:
-        # Leer el archivo ignorando comentarios y líneas vacías
-        with open(ruta_csv, encoding="utf-8") as f:
-            lineas = [l.strip() for l in f if l.strip() and not l.startswith("#")]
-
-        for i, linea in enumerate(lineas):
-            columnas = linea.split(",")
-            if columnas == ["SubCategoria", "Year", "Valor"]:
-                # Extraer los datos válidos desde esa línea en adelante
-                datos = [l.split(",") for l in lineas[i + 1:] if len(l.split(",")) == 3]
-                if not datos:
-                    print(f" Archivo sin datos válidos: {ruta_csv}")
-                    return None
-
-                df = pd.DataFrame(datos, columns=columnas)
-
-                # Limpieza de columna Valor
-                df["Valor"] = df["Valor"].str.replace(",", "")
-                df = df[df["Valor"].str.strip() != ""]  # eliminar vacíos
-                df["Valor"] = df["Valor"].astype(float)
-
-                # Extraer Año y Mes del nombre del archivo
-                nombre_archivo = os.path.basename(ruta_csv)
-                año, mes, *_ = nombre_archivo.split("-")
-                df["AñoArchivo"] = int(año)
-                df["Mes"] = int(mes)
-
-                return df
-
-        print(f" Encabezado no encontrado en: {ruta_csv}")
-        return None
-
-    except Exception as e:
-        print(f" Error leyendo {ruta_csv}: {e}")
-        return None
-
+import sys
+import argparse
 
-# === Procesamiento por carpeta ===
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-for carpeta in CARPETAS:
-    print(f"\n=== Procesando carpeta: {carpeta} ===")
-    BASE_DIR = os.path.join(BASE_PATH, carpeta)
-    dataframes = []
+from pronosticos.consolidacion import consolidar_categorias
 
-    # Iterar sobre años posibles
-    for año in range(1995, 2026):
-        carpeta_año = os.path.join(BASE_DIR, f"{año}-{carpeta}")
-        if not os.path.exists(carpeta_año):
-            print(f" Carpeta no encontrada: {carpeta_año}")
-            continue
+# La lógica vive en pronosticos/consolidacion.py (la usa también `python -m pronosticos consolidate`)
+main = consolidar_categorias
 
-        # Procesar todos los archivos .csv del año
-        for archivo in os.listdir(carpeta_año):
-            if archivo.endswith(".csv"):
-                ruta_csv = os.path.join(carpeta_año, archivo)
-                print(f" Leyendo: {ruta_csv}")
-                df = limpiar_csv(ruta_csv)
-                if df is not None:
-                    print(f"  Archivo válido: {archivo} ({len(df)} filas)")
-                    dataframes.append(df)
-                else:
-                    print(f"  Saltado: {archivo}")
 
-    # Consolidar y guardar CSV por carpeta
-    if dataframes:
-        df_final = pd.concat(dataframes, ignore_index=True)
-        output_file = os.path.join(BASE_PATH, f"consolidado_{carpeta.lower()}.csv")
-        df_final.to_csv(output_file, index=False, encoding="utf-8-sig")
-        print(f"\n Consolidado guardado como '{output_file}' ({len(df_final)} filas)")
-    else:
-        print(" No se encontraron archivos válidos para combinar.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consolida los CSV de categorías del CRT")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (por defecto, todos los núcleos)")
+    parser.add_argument("--completo", action="store_true", help="Ignora el caché y vuelve a parsear todo")
+    parser.add_argument("--parquet", action="store_true", help="Guarda también el consolidado en Parquet")
+    args = parser.parse_args()
+    main(args.procesos, args.completo, args.parquet)